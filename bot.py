@@ -4,15 +4,24 @@
 """
 
 import asyncio
+import hashlib
+import random
+import re
+import secrets
+import time
+from bisect import bisect_right
 from datetime import datetime
+from functools import lru_cache, partial
 from typing import Optional, Tuple
 
-from aiogram import Bot, Dispatcher, types
+from aiogram import Bot, Dispatcher, F, types
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
-# ContentTypesFilter не нужен, используем lambda
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
 from config import config
 from logger import log_info, log_error, log_warning
@@ -24,9 +33,347 @@ from keyboards import keyboard_manager
 from database import get_db_manager
 
 
+# Сколько последних состояний сообщений помнить для проверки "уже открыто"
+_LAST_VIEW_LIMIT = 10000
+
+# Максимальная длина текста callback.answer в Telegram
+_CALLBACK_ALERT_LIMIT = 200
+
+# Повторяющиеся сообщения об ошибках
+_ERR_FILE_TOO_LARGE = f"❌ Файл слишком большой. Максимальный размер: {config.MAX_FILE_SIZE // (1024 * 1024)}MB"
+_ERR_GAME_DATA = "❌ Ошибка данных игры!"
+_ERR_QUIZ_INACTIVE = "❌ Викторина не активна"
+_ERR_STATS_UNAVAILABLE = "❌ Не удалось получить статистику"
+_ERR_MEMORY_CLEAR = "❌ Не удалось очистить память"
+_ERR_RECOGNIZED_TEXT = "❌ Не удалось обработать распознанный текст."
+
+# Эмодзи для ходов КНБ и результатов игр
+_CHOICE_EMOJI = {'камень': '🪨', 'ножницы': '✂️', 'бумага': '📄'}
+_RESULT_EMOJI = {'user_win': '🏆', 'bot_win': '😢', 'draw': '🤝'}
+_DICE_FACES = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}
+# Значки мест в топ-10 пользователей
+_TOP_MEDALS = ("🥇", "🥈", "🥉") + ("⭐",) * 7
+
+# Запросы перевода текстом: "переведи на [язык] [текст]" / "translate to [язык] [текст]"
+_RU_TRANSLATE_RE = re.compile(r'переведи\s+на\s+(\w+)\s+(.+)', re.IGNORECASE | re.DOTALL)
+_EN_TRANSLATE_RE = re.compile(r'translate\s+to\s+(\w+)\s+(.+)', re.IGNORECASE | re.DOTALL)
+
+# Ключевые слова запросов к инструментам -> категория запроса
+_TOOL_KEYWORDS = {
+    'погода': 'weather', 'погодка': 'weather', 'какая погода': 'weather',
+    'weather': 'weather', 'температура': 'weather', 'прогноз': 'weather',
+    'переведи': 'translate', 'перевод': 'translate', 'translate': 'translate', 'translation': 'translate',
+    'шутка': 'joke', 'joke': 'joke',
+    'факт': 'fact', 'fact': 'fact', 'интересное': 'fact', 'интересный факт': 'fact',
+    'цитата': 'quote', 'quote': 'quote',
+}
+# Символы математических операторов для распознавания выражений
+_MATH_OPERATORS = frozenset('+-*/^()')
+
+# Слова запроса погоды, которые не относятся к названию города
+_WEATHER_STOPWORDS = frozenset(('погода', 'погодка', 'какая', 'weather', 'температура', 'прогноз', 'в', 'на', 'во', 'in'))
+
+# Все ключевые слова одним проходом по тексту (длинные варианты проверяются первыми)
+_TOOL_KEYWORDS_RE = re.compile("|".join(map(re.escape, sorted(_TOOL_KEYWORDS, key=len, reverse=True))))
+
+# Запросы развлечений в порядке приоритета: категория -> (генератор, шаблон ответа, запись в лог, тип сообщения, поле статистики)
+_FUN_REQUESTS = {
+    'joke': (fun_service.get_random_joke, "😂 <b>Шутка:</b>\n\n{}", "Отправлена шутка", "joke", "total_jokes"),
+    'fact': (fun_service.get_random_fact, "🧠 <b>Интересный факт:</b>\n\n{}", "Отправлен факт", "fact", "total_facts"),
+    'quote': (fun_service.get_motivational_quote, "💭 <b>Цитата:</b>\n\n{}", "Отправлена цитата", "quote", "total_quotes"),
+}
+
+def _short_time(timestamp: Optional[str]) -> str:
+    """Возвращает время ЧЧ:ММ из ISO-строки (без полного разбора в типичном случае)."""
+    if not timestamp:
+        return ""
+    if len(timestamp) >= 16 and timestamp[10] == 'T':
+        return timestamp[11:16]
+    try:
+        return datetime.fromisoformat(timestamp).strftime("%H:%M")
+    except ValueError:
+        return ""
+
+
+def _time_suffix(timestamp: Optional[str]) -> str:
+    """Возвращает « (ЧЧ:ММ)» для строк истории или пустую строку."""
+    short = _short_time(timestamp)
+    return f" ({short})" if short else ""
+
+
+# Статические тексты /start и /help собираются один раз при импорте
+_WELCOME_TEMPLATE = (
+    "🤖 <b>Привет! Я ИИ-бот, созданный Javohir Zokirjonov</b>\n\n"
+    "🎭 <b>Текущий режим:</b> {persona_name}\n\n"
+    "🚀 <b>Что умею:</b>\n"
+    "💬 Разговоры с ИИ\n"
+    "🖼️ Анализ изображений\n"
+    "🎵 Распознавание речи\n"
+    "🎮 Игры и развлечения\n\n"
+    "🎯 <b>Просто пишите естественно!</b>\n"
+    "🧮 <i>5+3*2</i>\n"
+    "🌐 <i>Кнопки выбора языков в меню</i>\n"
+    "🧠 <i>интересный факт</i>\n\n"
+    "🌤️ <b>Погода по областям Узбекистана</b>\n"
+    "<i>В меню инструментов → Погода</i>"
+)
+
+_HELP_TEMPLATE = (
+    "📚 <b>Справка по использованию</b>\n\n"
+    "🎭 <b>Текущий режим:</b> {persona_name}\n\n"
+    "<b>Основные функции:</b>\n"
+    "💬 Отправьте текст - получите умный ответ\n"
+    "🖼️ Отправьте фото - анализ изображения\n"
+    "🎵 Отправьте голосовое - распознавание речи\n\n"
+    "<b>🎯 Естественный язык (ПРОСТО ПИШИТЕ!):</b>\n"
+    "🧮 <i>2+2*5</i> - калькулятор\n"
+    "🌐 <i>Кнопки выбора языков в меню</i> - перевод\n"
+    "🧠 <i>интересный факт</i> - факты, шутки, цитаты\n\n"
+    "<b>🌤️ Погода по областям Узбекистана:</b>\n"
+    "• Кнопки в меню инструментов\n"
+    "• 12 областей + Ташкент\n\n"
+    "<b>Игры без команд:</b>\n"
+    "🔢 Просто пиши числа в 'Угадай число'\n"
+    "🧠 Пиши номера в 'Викторине'\n"
+    "🪨 Пиши 'камень', 'ножницы', 'бумага'\n"
+    "❓ Задавай вопросы 'Волшебному шару'\n\n"
+    "<b>Режимы общения:</b>\n"
+)
+
+_HELP_STATIC_SUFFIX = "".join(
+    f"{cmd} - {desc}\n" for cmd, desc in persona_manager.get_available_commands().items()
+) + (
+    "\n<b>Команды (если нужно):</b>\n"
+    "/start - главное меню\n"
+    "/help - эта справка\n"
+    "/clear - очистить память\n\n"
+    "🎯 <b>Главное:</b> Просто пишите естественно!\n"
+    "Бот сам поймет что вы хотите:\n"
+    "• Математика → калькулятор\n"
+    "• Погода → прогноз\n"
+    "• Перевод → переводчик\n"
+    "• Факт/шутка → развлечения\n\n"
+    "🚀 <b>Наслаждайтесь общением!</b>\n\n"
+    "🤖 <i>Создан Javohir Zokirjonov</i>"
+)
+
+_HELP_BUTTONS_TEMPLATE = (
+    "📚 <b>Справка по использованию</b>\n\n"
+    "🎭 <b>Текущий режим:</b> {persona_name}\n\n"
+    "<b>🎮 Кнопки:</b>\n"
+    "• Режимы общения - выбор стиля разговора\n"
+    "• Игры - просто нажимай и играй!\n"
+    "• Инструменты - калькулятор, погода, перевод\n\n"
+    "<b>🎯 Удобство:</b>\n"
+    "• В играх просто пиши ответы (числа, слова)\n"
+    "• Для общения просто пиши сообщения\n"
+    "• Все интуитивно и без лишних команд!\n\n"
+    "<b>🎮 Игры без команд:</b>\n"
+    "• Угадай число - просто пиши числа\n"
+    "• Викторина - пиши номер ответа (1-4)\n"
+    "• КНБ - пиши: камень, ножницы, бумага\n"
+    "• Волшебный шар - просто задай вопрос\n\n"
+    "🤖 <i>Создан Javohir Zokirjonov</i>"
+)
+
+
+_MAIN_MENU_TEMPLATE = (
+    "🤖 <b>Главное меню</b>\n\n"
+    "🎭 <b>Текущий режим:</b> {persona_name}\n\n"
+    "🎮 <b>Выбери, чем займемся:</b>"
+)
+
+_BACK_TO_MAIN_TEMPLATE = (
+    "🤖 <b>Привет! Я ИИ-бот, созданный Javohir Zokirjonov</b>\n\n"
+    "🎭 <b>Текущий режим:</b> {persona_name}\n\n"
+    "🎮 <b>Выбери, чем займемся:</b>"
+)
+
+
+@lru_cache(maxsize=32)
+def _welcome_text(persona_name: str) -> str:
+    """Возвращает приветствие /start для режима (строится один раз на режим)."""
+    return _WELCOME_TEMPLATE.format(persona_name=persona_name)
+
+
+@lru_cache(maxsize=32)
+def _main_menu_text(persona_name: str) -> str:
+    """Возвращает текст главного меню для режима (строится один раз на режим)."""
+    return _MAIN_MENU_TEMPLATE.format(persona_name=persona_name)
+
+
+@lru_cache(maxsize=32)
+def _back_to_main_text(persona_name: str) -> str:
+    """Возвращает текст возврата в главное меню для режима (строится один раз на режим)."""
+    return _BACK_TO_MAIN_TEMPLATE.format(persona_name=persona_name)
+
+
+@lru_cache(maxsize=32)
+def _help_text(persona_name: str) -> str:
+    """Возвращает текст /help для режима (строится один раз на режим)."""
+    return _HELP_TEMPLATE.format(persona_name=persona_name) + _HELP_STATIC_SUFFIX
+
+
+@lru_cache(maxsize=32)
+def _help_buttons_text(persona_name: str) -> str:
+    """Возвращает справку по кнопкам для режима (строится один раз на режим)."""
+    return _HELP_BUTTONS_TEMPLATE.format(persona_name=persona_name)
+
+
+# Статические тексты меню викторины и инструментов
+_QUIZ_SETTINGS_TEXT = (
+    "🧠 <b>Настройки викторины</b>\n\n"
+    "🎯 Выберите параметры для игры:\n\n"
+    "• Отрасль знаний\n"
+    "• Количество вопросов\n"
+    "• Режим игры\n\n"
+    "📚 <b>Рекомендации:</b>\n"
+    "• Для новичков: 5-10 вопросов\n"
+    "• Для опытных: 15-20 вопросов\n"
+    "• Для экспертов: 25-30 вопросов"
+)
+
+_QUIZ_INDUSTRY_TEXT = (
+    "🎯 <b>Выберите отрасль знаний</b>\n\n"
+    "📚 <b>Доступные отрасли:</b>\n"
+    "• Наука и техника\n"
+    "• Искусство и культура\n"
+    "• История и география\n"
+    "• Спорт и развлечения\n\n"
+    "🎲 <b>Случайная отрасль</b> - выберет случайную тему"
+)
+
+_QUIZ_COUNT_TEXT = (
+    "🔢 <b>Выберите количество вопросов</b>\n\n"
+    "📊 <b>Рекомендации:</b>\n"
+    "• 🔸 <b>5 вопросов</b> - быстрый тест (2-3 мин)\n"
+    "• 🔹 <b>10 вопросов</b> - стандартная игра (5-7 мин)\n"
+    "• 🔸 <b>15 вопросов</b> - расширенная игра (8-10 мин)\n"
+    "• 🔹 <b>20 вопросов</b> - для любителей (12-15 мин)\n"
+    "• 🔸 <b>25 вопросов</b> - экспертный уровень (15-18 мин)\n"
+    "• 🔹 <b>30 вопросов</b> - максимальный челлендж (18-20 мин)\n\n"
+    "✏️ <b>Свое количество</b> - введите любое число от 1 до 50"
+)
+
+_CALC_TEXT = (
+    "🧮 <b>Калькулятор</b>\n\n"
+    "Используй команду: /calc &lt;выражение&gt;\n\n"
+    "Примеры:\n"
+    "• /calc 2 + 2\n"
+    "• /calc 5 * (3 + 2)\n"
+    "• /calc 2^8"
+)
+
+_INDUSTRY_NAMES = {
+    'биология': '🧬 Биология',
+    'химия': '⚗️ Химия',
+    'математика': '🧮 Математика',
+    'физика': '⚡ Физика',
+    'география': '🗺️ География',
+    'история': '📜 История',
+    'искусство': '🎨 Искусство',
+    'спорт': '⚽ Спорт',
+    'кино': '🎬 Кино',
+    'литература': '📚 Литература',
+    'музыка': '🎵 Музыка',
+    'психология': '🧠 Психология',
+    'экономика': '💰 Экономика',
+    'программирование': '💻 Программирование',
+    'искусственный интеллект': '🤖 ИИ',
+    'кибербезопасность': '🔒 Кибербезопасность',
+    'медицина': '🩺 Медицина',
+    'астрономия': '🌌 Астрономия',
+    'случайная': '🎲 Случайная отрасль'
+}
+
+# Отрасли, из которых выбирается вопрос в режиме "случайная"
+_RANDOM_QUIZ_INDUSTRIES = (
+    "программирование", "искусственный интеллект", "кибербезопасность",
+    "история", "наука", "география", "искусство", "спорт", "кино",
+    "литература", "музыка", "философия", "психология", "экономика",
+    "биология", "физика", "химия", "математика", "медицина"
+)
+
+# Области Узбекистана (суффикс weather_*) -> город для запроса погоды
+_WEATHER_REGIONS = {
+    "tashkent": "Ташкент",
+    "andijan": "Андижан",
+    "bukhara": "Бухара",
+    "jizzakh": "Джизак",
+    "karakalpakstan": "Нукус",  # Столица Каракалпакстана
+    "kashkadarya": "Карши",
+    "namangan": "Наманган",
+    "navoi": "Навои",
+    "samarkand": "Самарканд",
+    "surkhondarya": "Термез",
+    "syrdarya": "Гулистан",
+    "tashkent_region": "Чирчик",  # Крупный город Ташкентской области
+    "fergana": "Фергана",
+    "khorezm": "Ургенч"
+}
+
+# Языки перевода (суффикс lang_*) -> готовый текст подтверждения выбора
+_TRANSLATION_SELECTED_TEXT = {
+    code: f"🌐 <b>Выбран язык:</b> {name}\n\n<i>Теперь просто введите текст для перевода!</i>\n\nПример: Привет мир"
+    for code, name in (
+        ("uz", "🇺🇿 узбекский"),
+        ("ru", "🇷🇺 русский"),
+        ("en", "🇺🇸 английский"),
+        ("es", "🇪🇸 испанский"),
+        ("fr", "🇫🇷 французский"),
+        ("de", "🇩🇪 немецкий"),
+        ("it", "🇮🇹 итальянский"),
+        ("pt", "🇵🇹 португальский"),
+        ("zh", "🇨🇳 китайский"),
+        ("ja", "🇯🇵 японский"),
+        ("ko", "🇰🇷 корейский"),
+    )
+}
+
+# Список доступных языков для сообщения о неподдерживаемом языке
+_SUPPORTED_LANGUAGES_TEXT = ', '.join(translator.SUPPORTED_LANGUAGES)
+
+# Оценки викторины по возрастанию порога: (оценка в ответе на последний вопрос, оценка в итогах, эмодзи);
+# _QUIZ_GRADE_KEYS - минимальные проценты для оценок начиная со второй
+_QUIZ_GRADES = (
+    ("Нужно подучить материал! 📚", "📚 Нужно подучить материал!", "📖"),
+    ("Неплохо! Можно лучше! 💪", "🤔 Неплохо! Можно лучше!", "💪"),
+    ("Хорошо! Продолжай в том же духе! 👏", "👍 Хорошо! Продолжай в том же духе!", "👏"),
+    ("Отлично! Ты эксперт! 🏆", "🎓 Отлично! Ты эксперт!", "🏆"),
+)
+_QUIZ_GRADE_KEYS = (50, 75, 90)
+
+
+def _quiz_grade(percentage: float) -> Tuple[str, str, str]:
+    """Возвращает оценки и эмодзи для процента правильных ответов."""
+    return _QUIZ_GRADES[bisect_right(_QUIZ_GRADE_KEYS, percentage)]
+
+
+def _quiz_max_hints(total_questions: int) -> int:
+    """Число подсказок: 5 вопросов = 0 подсказок, 10 = 1, 15 = 2, 20 = 3, 25 = 4, 30 = 5."""
+    return max(0, (total_questions - 5) // 5)
+
+
+@lru_cache(maxsize=None)
+def _persona_switch_text(persona_type: PersonaType, emoji: str) -> str:
+    """Возвращает текст о смене режима (строится один раз на персону)."""
+    persona = persona_manager.get_persona(persona_type)
+    return f"{emoji} Переключен в режим: <b>{persona.name}</b>\n\n{persona.description}"
+
+
 class AIBot:
     """Основной класс Telegram бота с ИИ."""
 
+    __slots__ = (
+        "bot", "dp", "db",
+        "_bg_tasks", "_db_sema", "_gemini_sema",
+        "_pending_edits", "_edit_interval", "_next_edit_at", "_next_chat_edit_at",
+        "_last_view", "_guess_targets", "_rng",
+        "_main_menu", "_main_menu_admin", "_menu_button",
+        "_cb_exact", "_cb_prefix", "_admin_routes", "_game_text_routes",
+        "_stats_cache", "_db_write_queue", "_db_writer_task",
+    )
+
     def __init__(self):
         """Инициализирует бота."""
         self.bot = Bot(
@@ -36,78 +383,307 @@ class AIBot:
         self.dp = Dispatcher()
         self.db = get_db_manager()
 
+        # Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+        self._bg_tasks: set[asyncio.Task] = set()
+
+        # Ограничиваем число одновременных обращений к БД и Gemini
+        self._db_sema = asyncio.Semaphore(config.DB_CONCURRENCY or 16)
+        self._gemini_sema = asyncio.Semaphore(config.GEMINI_CONCURRENCY or 8)
+
+        # Последние ожидающие правки по (chat_id, message_id) и общий темп правок
+        self._pending_edits: dict[tuple[int, int], tuple[str, Optional[InlineKeyboardMarkup]]] = {}
+        self._edit_interval = 1.0 / (config.EDIT_RATE_LIMIT or 30)
+        self._next_edit_at = 0.0
+        self._next_chat_edit_at: dict[int, float] = {}
+
+        # Загаданные числа для команды /guess по user_id
+        self._guess_targets: dict[int, int] = {}
+
+        # Собственный генератор случайных чисел бота
+        self._rng = random.Random()
+
+        # Очередь записей статистики для пакетной записи в БД и задача, которая ее разбирает
+        self._db_write_queue: asyncio.Queue = asyncio.Queue()
+        self._db_writer_task: Optional[asyncio.Task] = None
+
+        # Сигнал остановки webhook-сервера
+        self._stop_event = asyncio.Event()
+
+        # Кэш статистики/истории игр: ключ -> (момент истечения, значение)
+        self._stats_cache: dict[tuple, tuple[float, object]] = {}
+
+        # Что показано в сообщении (chat_id, message_id): хэш текста и клавиатуры (_view_digest)
+        self._last_view: dict[tuple[int, int], bytes] = {}
+
+        # Главное меню и кнопка "в меню" не меняются, строим их один раз
+        self._main_menu = keyboard_manager.get_main_menu(is_admin=False)
+        self._main_menu_admin = keyboard_manager.get_main_menu(is_admin=True)
+        self._menu_button = keyboard_manager.get_menu_button()
+
+        # Таблицы маршрутизации inline кнопок
+        self._build_callback_routes()
+
+        # Ответы текстом в активных играх: тип игры -> обработчик
+        self._game_text_routes = {
+            "guess_number": self._game_text_guess_number,
+            "quiz": self._game_text_quiz,
+            "dice_waiting": self._game_text_dice_waiting,
+            "rps": self._game_text_rps,
+            "magic_ball": self._game_text_magic_ball,
+            "quiz_custom_count": self._game_text_quiz_custom_count,
+        }
+
         # Регистрируем обработчики
         self._register_handlers()
 
+    async def _db_call(self, fn, *args, **kwargs):
+        """Выполняет синхронный вызов БД в потоке с ограничением параллелизма."""
+        async with self._db_sema:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def _gemini_call(self, fn, *args, **kwargs):
+        """Выполняет синхронный запрос к Gemini в потоке с ограничением параллелизма."""
+        async with self._gemini_sema:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def _run_background(self, coro):
+        """Запускает корутину в фоне и держит ссылку на задачу до ее завершения."""
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+
+    def _queue_db_write(self, user_id: int, message_type: Optional[str], stat_type: Optional[str] = None,
+                        content: Optional[str] = None, response: Optional[str] = None):
+        """Ставит запись сообщения и/или счетчика статистики в очередь пакетной записи в БД."""
+        if self._db_writer_task is None:
+            self._db_writer_task = asyncio.create_task(self._db_writer_loop())
+        self._db_write_queue.put_nowait((user_id, message_type, stat_type, content, response))
+
+    async def _db_writer_loop(self):
+        """Забирает накопившиеся записи из очереди и пишет их в БД одной транзакцией."""
+        queue = self._db_write_queue
+        while True:
+            batch = [await queue.get()]
+            try:
+                # Даем накопиться записям от других обработчиков
+                await asyncio.sleep(config.DB_BATCH_WINDOW)
+            finally:
+                # При остановке бота уже собранная пачка тоже записывается
+                while len(batch) < config.DB_BATCH_SIZE and not queue.empty():
+                    batch.append(queue.get_nowait())
+                await self._flush_db_writes(batch)
+
+    async def _flush_db_writes(self, batch: list):
+        """Записывает пачку записей статистики в БД и логирует ошибки."""
+        try:
+            await self._db_call(self.db.log_messages_with_stats, batch)
+            return
+        except Exception as e:
+            log_error("Ошибка пакетной записи в БД (%d записей), записываем по одной: %s", len(batch), e)
+
+        # Одна некорректная запись откатывает всю пачку - повторяем поштучно,
+        # чтобы потерялась только она
+        for entry in batch:
+            try:
+                await self._db_call(self.db.log_messages_with_stats, [entry])
+            except Exception as e:
+                log_error("Ошибка записи в БД: %s", e, user_id=entry[0])
+
+    async def _cached_game_data(self, key: tuple, fn, *args, **kwargs):
+        """Возвращает результат запроса статистики из кэша или из БД (с TTL)."""
+        now = time.monotonic()
+        entry = self._stats_cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        value = await self._db_call(fn, *args, **kwargs)
+
+        if len(self._stats_cache) >= config.STATS_CACHE_SIZE:
+            # Вытесняем самую старую запись
+            self._stats_cache.pop(next(iter(self._stats_cache)))
+        self._stats_cache[key] = (now + config.STATS_CACHE_TTL, value)
+        return value
+
+    async def _log_dice_game(self, user_id: int, content: str, response: str):
+        """Записывает игру в кости в БД и сбрасывает кэш статистики (в фоне)."""
+        try:
+            await self._db_call(self.db.log_message_with_stat, user_id, "game_dice", "total_rps_games", content=content, response=response)  # Используем существующее поле
+        except Exception as e:
+            log_error("Ошибка логирования игры в кости пользователя %s: %s", user_id, e)
+        finally:
+            self._invalidate_dice_cache(user_id)
+
+    def _invalidate_dice_cache(self, user_id: int):
+        """Сбрасывает кэш статистики и истории костей пользователя после новой игры."""
+        self._stats_cache.pop((user_id, "dice_stats"), None)
+        self._stats_cache.pop((user_id, "dice_history", 10), None)
+
+    def _persona_handler(self, persona_type: PersonaType, emoji: str):
+        """Создает обработчик команды переключения на конкретную персону."""
+        return partial(self._switch_persona, persona_type=persona_type, emoji=emoji)
+
+    def _build_callback_routes(self):
+        """Строит таблицы маршрутизации callback_data -> обработчик.
+
+        Обработчики возвращают True, если уже ответили на callback сами.
+        """
+        self._cb_exact = {
+            # Меню
+            "menu_personas": self._cb_menu_personas,
+            "menu_games": self._cb_menu_games,
+            "menu_tools": self._cb_menu_tools,
+            "back_to_main": self._cb_back_to_main,
+            "menu_main": self._cb_back_to_main,
+            "show_main_menu": self._cb_show_main_menu,
+
+            # Игры
+            "game_rps": self._cb_game_rps,
+            "rps_stats": self._cb_rps_stats,
+            "rps_history": self._cb_rps_history,
+            "game_dice": self._cb_game_dice,
+            "dice_throw_again": self._cb_dice_throw_again,
+            "dice_stats": self._cb_dice_stats,
+            "dice_history": self._cb_dice_history,
+            "game_guess": self._cb_game_guess,
+            "game_ball": self._cb_game_ball,
+
+            # Викторина
+            "game_quiz": self._cb_game_quiz,
+            "quiz_hint": self._cb_quiz_hint,
+            "quiz_settings": self._cb_quiz_settings,
+            "quiz_select_industry": self._cb_quiz_select_industry,
+            "quiz_select_count": self._cb_quiz_select_count,
+            "quiz_start": self._cb_quiz_start,
+            "quiz_finish": self._cb_quiz_finish,
+
+            # Инструменты и развлечения
+            "tool_calc": self._cb_tool_calc,
+            "tool_weather": self._cb_tool_weather,
+            "tool_translate": self._cb_tool_translate,
+            "fun_joke": self._cb_fun_joke,
+            "fun_quote": self._cb_fun_quote,
+            "fun_fact": self._cb_fun_fact,
+
+            # Служебные функции
+            "stats": self._cb_stats,
+            "clear_memory": self._cb_clear_memory,
+            "confirm_clear_memory": self._cb_confirm_clear_memory,
+            "help": self._cb_help,
+            "cancel": self._cb_cancel,
+
+            # Админ-панель: admin_* идут через семейство "admin", здесь только исключение
+            "confirm_clear_all": self._cb_confirm_clear_all,
+        }
+
+        # Семейство (текст до первого "_") -> пары (префикс, обработчик суффикса)
+        self._cb_prefix = {
+            "persona": (("persona_", self._cb_persona),),
+            "rps": (("rps_", self._cb_rps_play),),
+            "dice": (
+                ("dice_user_throw_", self._cb_dice_user_throw),
+                ("dice_auto_throw_", self._cb_dice_auto_throw),
+                ("dice_manual_throw_", self._cb_dice_manual_throw),
+            ),
+            "guess": (("guess_", self._cb_guess_difficulty),),
+            "quiz": (
+                ("quiz_answer_", self._cb_quiz_answer),
+                ("quiz_industry_", self._cb_quiz_industry),
+                ("quiz_count_", self._cb_quiz_count),
+            ),
+            "weather": (("weather_", self._cb_weather_region),),
+            "lang": (("lang_", self._cb_translation_language),),
+            "admin": (("admin_", self._cb_admin),),
+        }
+
+        # Админские действия: точное совпадение callback_data -> обработчик
+        # (доступ проверяется один раз в _cb_admin)
+        admin_panel = partial(
+            self._show_admin_menu,
+            "👑 <b>Админ-панель</b>\n\nВыберите действие для управления ботом:",
+            keyboard_manager.get_admin_menu,
+        )
+        self._admin_routes = {
+            "admin_panel": admin_panel,
+            "admin_main": admin_panel,
+            "admin_users": partial(
+                self._show_admin_menu,
+                "👥 <b>Управление пользователями</b>\n\nВыберите действие:",
+                keyboard_manager.get_admin_users_menu,
+            ),
+            "admin_stats": partial(
+                self._show_admin_menu,
+                "📊 <b>Просмотр статистики</b>\n\nВыберите тип статистики:",
+                keyboard_manager.get_admin_stats_menu,
+            ),
+            "admin_search": partial(
+                self._show_admin_menu,
+                "🔍 <b>Поиск пользователей</b>\n\nВыберите способ поиска:",
+                keyboard_manager.get_admin_search_menu,
+            ),
+            "admin_users_list": self._show_users_list,
+            "admin_top_users": self._show_top_users,
+            "admin_stats_general": self._show_general_stats,
+            "admin_stats_games": self._show_games_stats,
+            "admin_stats_messages": self._show_messages_stats,
+            "admin_clear_user": self._handle_clear_user,
+            "admin_clear_all": self._handle_clear_all_users,
+            "confirm_clear_all": self._confirm_clear_all_users,
+            "admin_ban_user": self._handle_ban_user,
+            "admin_unban_user": self._handle_unban_user,
+        }
+
     def _register_handlers(self):
         """Регистрирует все обработчики сообщений."""
-        # Обработчик команды /start
-        self.dp.message.register(self.cmd_start, Command("start"))
-
-        # Обработчик команды /help
-        self.dp.message.register(self.cmd_help, Command("help"))
-
-        # Команды смены режимов
-        self.dp.message.register(self.cmd_friendly, Command("friendly"))
-        self.dp.message.register(self.cmd_friendly, Command("дружелюбный"))
-        self.dp.message.register(self.cmd_programmer, Command("programmer"))
-        self.dp.message.register(self.cmd_programmer, Command("программист"))
-        self.dp.message.register(self.cmd_programmer, Command("code"))
-        self.dp.message.register(self.cmd_programmer, Command("код"))
-        self.dp.message.register(self.cmd_expert, Command("expert"))
-        self.dp.message.register(self.cmd_expert, Command("эксперт"))
-        self.dp.message.register(self.cmd_creative, Command("creative"))
-        self.dp.message.register(self.cmd_creative, Command("креатив"))
-        self.dp.message.register(self.cmd_creative, Command("идеи"))
-        self.dp.message.register(self.cmd_professional, Command("professional"))
-        self.dp.message.register(self.cmd_professional, Command("профессионал"))
-        self.dp.message.register(self.cmd_professional, Command("бизнес"))
-        self.dp.message.register(self.cmd_current_mode, Command("mode"))
-        self.dp.message.register(self.cmd_current_mode, Command("режим"))
-
-        # Команды дополнительных функций
-        self.dp.message.register(self.cmd_calculate, Command("calc"))
-        self.dp.message.register(self.cmd_calculate, Command("калькулятор"))
-        self.dp.message.register(self.cmd_calculate, Command("calculate"))
-        self.dp.message.register(self.cmd_game_rps, Command("rps"))
-        self.dp.message.register(self.cmd_game_rps, Command("камень"))
-        self.dp.message.register(self.cmd_game_guess, Command("guess"))
-        self.dp.message.register(self.cmd_game_guess, Command("угадай"))
-        self.dp.message.register(self.cmd_fun_fact, Command("fact"))
-        self.dp.message.register(self.cmd_fun_fact, Command("факт"))
-        self.dp.message.register(self.cmd_fun_quote, Command("quote"))
-        self.dp.message.register(self.cmd_fun_quote, Command("цитата"))
-        self.dp.message.register(self.cmd_fun_joke, Command("joke"))
-        self.dp.message.register(self.cmd_fun_joke, Command("шутка"))
-
-        # Новые игры и развлечения
-        self.dp.message.register(self.cmd_game_dice, Command("dice"))
-        self.dp.message.register(self.cmd_game_dice, Command("кости"))
-        self.dp.message.register(self.handle_dice_message, lambda message: message.dice is not None)
-        self.dp.message.register(self.cmd_game_quiz, Command("quiz"))
-        self.dp.message.register(self.cmd_game_quiz, Command("викторина"))
-        self.dp.message.register(self.cmd_magic_ball, Command("ball"))
-        self.dp.message.register(self.cmd_magic_ball, Command("шар"))
-        self.dp.message.register(self.cmd_magic_ball, Command("волшебный"))
-        self.dp.message.register(self.cmd_memory_clear, Command("clear"))
-        self.dp.message.register(self.cmd_memory_clear, Command("очистить"))
-        self.dp.message.register(self.cmd_memory_stats, Command("stats"))
-        self.dp.message.register(self.cmd_memory_stats, Command("статистика"))
-
-        # Добавляем команду для меню
-        self.dp.message.register(self.show_main_menu, Command("menu"))
-
-        # Обработчик текстовых сообщений
-        self.dp.message.register(self.handle_text_message, lambda msg: msg.text and not msg.text.startswith('/'))
+        # Обработчик текстовых сообщений - самый частый, поэтому проверяется первым
+        # (команды он не перехватывает: текст с '/' отсекается фильтром)
+        self.dp.message.register(self.handle_text_message, F.text & ~F.text.startswith('/'))
+
+        # Команды и их алиасы: один обработчик - один фильтр Command
+        command_table = (
+            (self.cmd_start, ("start",)),
+            (self.cmd_help, ("help",)),
+
+            # Команды смены режимов
+            (self._persona_handler(PersonaType.FRIENDLY, "🤗"), ("friendly", "дружелюбный")),
+            (self._persona_handler(PersonaType.PROGRAMMER, "💻"), ("programmer", "программист", "code", "код")),
+            (self._persona_handler(PersonaType.EXPERT, "🎓"), ("expert", "эксперт")),
+            (self._persona_handler(PersonaType.CREATIVE, "🎨"), ("creative", "креатив", "идеи")),
+            (self._persona_handler(PersonaType.PROFESSIONAL, "💼"), ("professional", "профессионал", "бизнес")),
+            (self.cmd_current_mode, ("mode", "режим")),
+
+            # Команды дополнительных функций
+            (self.cmd_calculate, ("calc", "калькулятор", "calculate")),
+            (self.cmd_game_rps, ("rps", "камень")),
+            (self.cmd_game_guess, ("guess", "угадай")),
+            (self.cmd_fun_fact, ("fact", "факт")),
+            (self.cmd_fun_quote, ("quote", "цитата")),
+            (self.cmd_fun_joke, ("joke", "шутка")),
+
+            # Новые игры и развлечения
+            (self.cmd_game_dice, ("dice", "кости")),
+            (self.cmd_game_quiz, ("quiz", "викторина")),
+            (self.cmd_magic_ball, ("ball", "шар", "волшебный")),
+            (self.cmd_memory_clear, ("clear", "очистить")),
+            (self.cmd_memory_stats, ("stats", "статистика")),
+
+            # Команда для меню
+            (self.show_main_menu, ("menu",)),
+        )
+
+        for handler, aliases in command_table:
+            self.dp.message.register(handler, Command(*aliases))
+
+        # Обработчик отправки dice эмодзи
+        self.dp.message.register(self.handle_dice_message, F.dice)
 
         # Обработчик изображений
-        self.dp.message.register(self.handle_photo_message, lambda msg: msg.photo)
+        self.dp.message.register(self.handle_photo_message, F.photo)
 
         # Обработчик голосовых сообщений
-        self.dp.message.register(self.handle_voice_message, lambda msg: msg.voice)
+        self.dp.message.register(self.handle_voice_message, F.voice)
 
         # Обработчик аудио файлов
-        self.dp.message.register(self.handle_audio_message, lambda msg: msg.audio)
+        self.dp.message.register(self.handle_audio_message, F.audio)
 
         # Обработчик callback query для кнопок
         self.dp.callback_query.register(self.handle_callback)
@@ -115,151 +691,56 @@ class AIBot:
     async def cmd_start(self, message: types.Message):
         """Обработчик команды /start."""
         user_id = message.from_user.id
-        log_info("Получена команда /start", user_id)
-
-        # Сохраняем/обновляем пользователя в БД
-        try:
-            user_data = {
-                'username': message.from_user.username,
-                'first_name': message.from_user.first_name,
-                'last_name': message.from_user.last_name,
-                'language_code': message.from_user.language_code,
-                'is_premium': message.from_user.is_premium or False
-            }
-            self.db.get_or_create_user(user_id, **user_data)
-        except Exception as e:
-            log_error(f"Ошибка сохранения пользователя {user_id}: {str(e)}")
+        log_info("Получена команда /start", user_id=user_id)
 
         current_persona = persona_manager.get_current_persona()
         is_admin = user_id == config.ADMIN_USER_ID
 
-        welcome_text = (
-            "🤖 <b>Привет! Я ИИ-бот, созданный Javohir Zokirjonov</b>\n\n"
-            f"🎭 <b>Текущий режим:</b> {current_persona.name}\n\n"
-            "🚀 <b>Что умею:</b>\n"
-            "💬 Разговоры с ИИ\n"
-            "🖼️ Анализ изображений\n"
-            "🎵 Распознавание речи\n"
-            "🎮 Игры и развлечения\n\n"
-            "🎯 <b>Просто пишите естественно!</b>\n"
-            "🧮 <i>5+3*2</i>\n"
-            "🌐 <i>Кнопки выбора языков в меню</i>\n"
-            "🧠 <i>интересный факт</i>\n\n"
-            "🌤️ <b>Погода по областям Узбекистана</b>\n"
-            "<i>В меню инструментов → Погода</i>"
-        )
+        welcome_text = _welcome_text(current_persona.name)
 
-        # Отправляем приветствие с клавиатурой
-        await message.reply(
-            welcome_text,
-            reply_markup=keyboard_manager.get_main_menu(is_admin)
+        # Приветствие не зависит от записи в БД: сохраняем пользователя и отвечаем одновременно
+        await asyncio.gather(
+            self._save_user(message.from_user),
+            message.reply(
+                welcome_text,
+                reply_markup=self._main_menu_admin if is_admin else self._main_menu
+            ),
         )
 
+    async def _save_user(self, user: types.User):
+        """Сохраняет/обновляет пользователя в БД (ошибки только логируются)."""
+        try:
+            user_data = {
+                'username': user.username,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+                'language_code': user.language_code,
+                'is_premium': user.is_premium or False
+            }
+            await self._db_call(self.db.get_or_create_user, user.id, **user_data)
+        except Exception as e:
+            log_error("Ошибка сохранения пользователя %s: %s", user.id, e)
+
     async def cmd_help(self, message: types.Message):
         """Обработчик команды /help."""
         user_id = message.from_user.id
-        log_info("Получена команда /help", user_id)
+        log_info("Получена команда /help", user_id=user_id)
 
         current_persona = persona_manager.get_current_persona()
-        available_commands = persona_manager.get_available_commands()
-
-        help_text = (
-            "📚 <b>Справка по использованию</b>\n\n"
-            f"🎭 <b>Текущий режим:</b> {current_persona.name}\n\n"
-            "<b>Основные функции:</b>\n"
-            "💬 Отправьте текст - получите умный ответ\n"
-            "🖼️ Отправьте фото - анализ изображения\n"
-            "🎵 Отправьте голосовое - распознавание речи\n\n"
-            "<b>🎯 Естественный язык (ПРОСТО ПИШИТЕ!):</b>\n"
-            "🧮 <i>2+2*5</i> - калькулятор\n"
-            "🌐 <i>Кнопки выбора языков в меню</i> - перевод\n"
-            "🧠 <i>интересный факт</i> - факты, шутки, цитаты\n\n"
-            "<b>🌤️ Погода по областям Узбекистана:</b>\n"
-            "• Кнопки в меню инструментов\n"
-            "• 12 областей + Ташкент\n\n"
-            "<b>Игры без команд:</b>\n"
-            "🔢 Просто пиши числа в 'Угадай число'\n"
-            "🧠 Пиши номера в 'Викторине'\n"
-            "🪨 Пиши 'камень', 'ножницы', 'бумага'\n"
-            "❓ Задавай вопросы 'Волшебному шару'\n\n"
-            "<b>Режимы общения:</b>\n"
-        )
-
-        for cmd, desc in available_commands.items():
-            help_text += f"{cmd} - {desc}\n"
-
-        help_text += (
-            "\n<b>Команды (если нужно):</b>\n"
-            "/start - главное меню\n"
-            "/help - эта справка\n"
-            "/clear - очистить память\n\n"
-            "🎯 <b>Главное:</b> Просто пишите естественно!\n"
-            "Бот сам поймет что вы хотите:\n"
-            "• Математика → калькулятор\n"
-            "• Погода → прогноз\n"
-            "• Перевод → переводчик\n"
-            "• Факт/шутка → развлечения\n\n"
-            "🚀 <b>Наслаждайтесь общением!</b>\n\n"
-            "🤖 <i>Создан Javohir Zokirjonov</i>"
-        )
+        help_text = _help_text(current_persona.name)
 
         await message.reply(help_text)
 
-    async def cmd_friendly(self, message: types.Message):
-        """Переключение в дружелюбный режим."""
-        user_id = message.from_user.id
-        if persona_manager.set_persona(PersonaType.FRIENDLY):
-            current = persona_manager.get_current_persona()
-            log_info(f"Пользователь переключился в режим: {current.name}", user_id)
-
-            # Сохраняем выбранную персону в память пользователя
-            memory_manager.update_user_persona(user_id, current.name)
-
-            await message.reply(f"🤗 Переключен в режим: <b>{current.name}</b>\n\n{current.description}")
-        else:
-            await message.reply("❌ Не удалось переключить режим")
-
-    async def cmd_programmer(self, message: types.Message):
-        """Переключение в режим программиста."""
+    async def _switch_persona(self, message: types.Message, persona_type: PersonaType, emoji: str):
+        """Переключение в указанный режим (персону)."""
         user_id = message.from_user.id
-        if persona_manager.set_persona(PersonaType.PROGRAMMER):
-            current = persona_manager.get_current_persona()
-            log_info(f"Пользователь переключился в режим: {current.name}", user_id)
+        if (current := persona_manager.set_persona(persona_type)) is not None:
+            log_info("Пользователь переключился в режим: %s", current.name, user_id=user_id)
 
             # Сохраняем выбранную персону в память пользователя
             memory_manager.update_user_persona(user_id, current.name)
 
-            await message.reply(f"💻 Переключен в режим: <b>{current.name}</b>\n\n{current.description}")
-        else:
-            await message.reply("❌ Не удалось переключить режим")
-
-    async def cmd_expert(self, message: types.Message):
-        """Переключение в экспертный режим."""
-        user_id = message.from_user.id
-        if persona_manager.set_persona(PersonaType.EXPERT):
-            current = persona_manager.get_current_persona()
-            log_info(f"Пользователь переключился в режим: {current.name}", user_id)
-            await message.reply(f"🎓 Переключен в режим: <b>{current.name}</b>\n\n{current.description}")
-        else:
-            await message.reply("❌ Не удалось переключить режим")
-
-    async def cmd_creative(self, message: types.Message):
-        """Переключение в креативный режим."""
-        user_id = message.from_user.id
-        if persona_manager.set_persona(PersonaType.CREATIVE):
-            current = persona_manager.get_current_persona()
-            log_info(f"Пользователь переключился в режим: {current.name}", user_id)
-            await message.reply(f"🎨 Переключен в режим: <b>{current.name}</b>\n\n{current.description}")
-        else:
-            await message.reply("❌ Не удалось переключить режим")
-
-    async def cmd_professional(self, message: types.Message):
-        """Переключение в профессиональный режим."""
-        user_id = message.from_user.id
-        if persona_manager.set_persona(PersonaType.PROFESSIONAL):
-            current = persona_manager.get_current_persona()
-            log_info(f"Пользователь переключился в режим: {current.name}", user_id)
-            await message.reply(f"💼 Переключен в режим: <b>{current.name}</b>\n\n{current.description}")
+            await message.reply(_persona_switch_text(persona_type, emoji))
         else:
             await message.reply("❌ Не удалось переключить режим")
 
@@ -267,7 +748,7 @@ class AIBot:
         """Показать текущий режим."""
         user_id = message.from_user.id
         current = persona_manager.get_current_persona()
-        log_info(f"Пользователь запросил текущий режим: {current.name}", user_id)
+        log_info("Пользователь запросил текущий режим: %s", current.name, user_id=user_id)
 
         mode_text = (
             f"🎭 <b>Текущий режим:</b> {current.name}\n\n"
@@ -292,14 +773,14 @@ class AIBot:
             return
 
         expression = args[1].strip()
-        result = calculator.evaluate_expression(expression)
+        result = await asyncio.to_thread(calculator.evaluate_expression, expression)
 
         if result is not None:
             await message.reply(f"🧮 <b>Результат:</b>\n<code>{expression}</code> = <b>{result}</b>")
-            log_info(f"Вычислено выражение: {expression} = {result}", user_id)
+            log_info("Вычислено выражение: %s = %s", expression, result, user_id=user_id)
         else:
             await message.reply("❌ Не удалось вычислить выражение. Проверьте синтаксис.")
-            log_error(f"Ошибка вычисления выражения: {expression}", user_id)
+            log_error("Ошибка вычисления выражения: %s", expression, user_id=user_id)
 
 
     async def cmd_game_rps(self, message: types.Message):
@@ -316,14 +797,14 @@ class AIBot:
                               "• /камень ножницы\n"
                               "• /rps бумага\n\n"
                               "💡 Или используй кнопки в меню '🎮 Игры'!",
-                              reply_markup=keyboard_manager.get_menu_button())
+                              reply_markup=self._menu_button)
             return
 
         user_choice = args[1].strip().lower()
         result_text, game_data = game_service.play_rps(user_choice, user_id)
 
-        await message.reply(result_text, reply_markup=keyboard_manager.get_menu_button())
-        log_info(f"Игра КНБ: пользователь выбрал {user_choice}", user_id)
+        await message.reply(result_text, reply_markup=self._menu_button)
+        log_info("Игра КНБ: пользователь выбрал %s", user_choice, user_id=user_id)
 
     async def cmd_game_guess(self, message: types.Message):
         """Игра угадай число."""
@@ -333,21 +814,28 @@ class AIBot:
         if len(args) == 1:
             # Начинаем новую игру
             message_text, target_number = game_service.guess_number_game()
-            # В реальном приложении нужно сохранить target_number для пользователя
+            self._guess_targets[user_id] = target_number
             await message.reply(f"{message_text}\n\nИспользуй: /guess <число>")
-            log_info("Начата игра угадай число", user_id)
+            log_info("Начата игра угадай число", user_id=user_id)
 
         elif len(args) == 2:
             # Проверяем угаданное число
+            target_number = self._guess_targets.get(user_id)
+            if target_number is None:
+                await message.reply("🎮 Сначала начни игру: /guess")
+                return
+
             try:
                 guess = int(args[1])
-                # В реальном приложении нужно получить сохраненное число для пользователя
-                target_number = random.randint(1, 100)  # Заглушка
-                result = game_service.check_guess(guess, target_number)
-                await message.reply(result)
-                log_info(f"Игра угадай число: {guess}", user_id)
             except ValueError:
                 await message.reply("❌ Введите число!")
+                return
+
+            result = game_service.check_guess(guess, target_number)
+            if guess == target_number:
+                del self._guess_targets[user_id]
+            await message.reply(result)
+            log_info("Игра угадай число: %s", guess, user_id=user_id)
 
         else:
             await message.reply("🎮 <b>Угадай число</b>\n\n"
@@ -357,23 +845,23 @@ class AIBot:
     async def cmd_fun_fact(self, message: types.Message):
         """Интересный факт."""
         user_id = message.from_user.id
-        fact = fun_service.get_random_fact()
-        await message.reply(fact)
-        log_info("Отправлен интересный факт", user_id)
+        fact = await self._gemini_call(fun_service.get_random_fact)
+        log_info("Отправлен интересный факт", user_id=user_id)
+        return message.reply(fact)
 
     async def cmd_fun_quote(self, message: types.Message):
         """Мотивационная цитата."""
         user_id = message.from_user.id
-        quote = fun_service.get_motivational_quote()
-        await message.reply(quote)
-        log_info("Отправлена мотивационная цитата", user_id)
+        quote = await self._gemini_call(fun_service.get_motivational_quote)
+        log_info("Отправлена мотивационная цитата", user_id=user_id)
+        return message.reply(quote)
 
     async def cmd_fun_joke(self, message: types.Message):
         """Шутка."""
         user_id = message.from_user.id
-        joke = fun_service.get_random_joke()
-        await message.reply(joke)
-        log_info("Отправлена шутка", user_id)
+        joke = await self._gemini_call(fun_service.get_random_joke)
+        log_info("Отправлена шутка", user_id=user_id)
+        return message.reply(joke)
 
     async def cmd_game_dice(self, message: types.Message):
         """Игра в кости с настоящими бросками :game_die:."""
@@ -389,7 +877,7 @@ class AIBot:
                           "Отправь: 🎲 (или просто брось кубик)"
 
         await message.reply(instruction_text, reply_markup=keyboard_manager.get_dice_start_menu())
-        log_info("Начата игра в кости", user_id)
+        log_info("Начата игра в кости", user_id=user_id)
 
     async def handle_dice_message(self, message: types.Message):
         """Обработка отправки dice эмодзи пользователем."""
@@ -409,11 +897,9 @@ class AIBot:
 
                 if bot_dice_value > 0:
                     # Показываем что получили бросок пользователя
-                    dice_emojis = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}
-                    user_emoji = dice_emojis.get(user_dice_value, '🎲')
+                    user_emoji = _DICE_FACES.get(user_dice_value, '🎲')
 
                     # Ждем немного чтобы пользователь увидел анимацию
-                    import asyncio
                     await asyncio.sleep(2)
 
                     # Показываем результат броска пользователя
@@ -423,20 +909,17 @@ class AIBot:
                     await asyncio.sleep(1.5)
 
                     # Эмодзи для кубиков
-                    bot_emoji = dice_emojis.get(bot_dice_value, '🎲')
+                    bot_emoji = _DICE_FACES.get(bot_dice_value, '🎲')
 
                     # Определяем победителя
                     if user_dice_value > bot_dice_value:
                         result = "🏆 <b>Ты победил!</b>"
-                        winner = "user"
                         extra_msg = "🎯 Отличный бросок!"
                     elif user_dice_value < bot_dice_value:
                         result = "😎 <b>Я выиграл!</b>"
-                        winner = "bot"
                         extra_msg = "🤖 Я был лучше!"
                     else:
                         result = "🤝 <b>Ничья!</b>"
-                        winner = "draw"
                         extra_msg = "⚖️ Равные силы!"
 
                     result_text = f"🎲 <b>Результаты бросков:</b>\n\n" \
@@ -449,27 +932,20 @@ class AIBot:
                     memory_manager.clear_user_active_game(user_id)
 
                     # Показываем результат
-                    continue_menu = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="🎲 Сыграть еще", callback_data="dice_throw_again")],
-                        [InlineKeyboardButton(text="⬅️ В меню", callback_data="menu_main")]
-                    ])
+                    continue_menu = keyboard_manager.get_dice_result_menu()
 
                     await message.reply(f"🎯 <b>Результат игры в кости:</b>\n\n{result_text}\n\nХочешь сыграть еще?", reply_markup=continue_menu)
 
-                    # Логируем статистику
-                    try:
-                        self.db.log_message(user_id, "game_dice", content=f"user:{user_dice_value}_bot:{bot_dice_value}", response=result_text)
-                        self.db.update_user_stats(user_id, "total_rps_games")  # Используем существующее поле
-                    except Exception as e:
-                        log_error(f"Ошибка логирования игры в кости пользователя {user_id}: {str(e)}")
+                    # Логируем статистику в фоне
+                    self._run_background(self._log_dice_game(user_id, f"user:{user_dice_value}_bot:{bot_dice_value}", result_text))
 
                     return True
                 else:
                     # Нет сохраненного броска бота - начинаем новую игру
-                    await message.reply("🎲 <b>Начинаем новую игру в кости!</b>\n\nИспользуй команду /dice или кнопку в меню!", reply_markup=keyboard_manager.get_menu_button())
+                    await message.reply("🎲 <b>Начинаем новую игру в кости!</b>\n\nИспользуй команду /dice или кнопку в меню!", reply_markup=self._menu_button)
             else:
                 # Пользователь отправил dice не в игре - начинаем новую игру
-                await message.reply("🎲 <b>Начинаем игру в кости!</b>\n\nПросто отправь 🎲 еще раз, чтобы бросить кубик!", reply_markup=keyboard_manager.get_menu_button())
+                await message.reply("🎲 <b>Начинаем игру в кости!</b>\n\nПросто отправь 🎲 еще раз, чтобы бросить кубик!", reply_markup=self._menu_button)
 
                 # Устанавливаем режим ожидания
                 memory_manager.set_user_active_game(user_id, "dice_waiting", {"waiting_for_dice": True})
@@ -478,26 +954,20 @@ class AIBot:
         """Завершение игры в кости."""
         user_id = message.from_user.id
 
-        # Эмодзи для кубиков
-        dice_emojis = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}
-
         # Определяем победителя
         if user_dice > bot_dice:
             result = "🏆 <b>Ты победил!</b>"
-            winner = "user"
             extra_msg = "🎯 Отличный бросок!"
         elif user_dice < bot_dice:
             result = "😎 <b>Я выиграл!</b>"
-            winner = "bot"
             extra_msg = "🤖 Я был лучше!"
         else:
             result = "🤝 <b>Ничья!</b>"
-            winner = "draw"
             extra_msg = "⚖️ Равные силы!"
 
         result_text = f"🎲 <b>Результаты бросков:</b>\n\n" \
-                     f"🎯 <b>Твой кубик:</b> {dice_emojis.get(user_dice, '🎲')} <b>({user_dice})</b>\n" \
-                     f"🤖 <b>Мой кубик:</b> {dice_emojis.get(bot_dice, '🎲')} <b>({bot_dice})</b>\n\n" \
+                     f"🎯 <b>Твой кубик:</b> {_DICE_FACES.get(user_dice, '🎲')} <b>({user_dice})</b>\n" \
+                     f"🤖 <b>Мой кубик:</b> {_DICE_FACES.get(bot_dice, '🎲')} <b>({bot_dice})</b>\n\n" \
                      f"{result}\n" \
                      f"<i>{extra_msg}</i>"
 
@@ -505,25 +975,19 @@ class AIBot:
         memory_manager.clear_user_active_game(user_id)
 
         # Показываем результат
-        continue_menu = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🎲 Сыграть еще", callback_data="dice_throw_again")],
-            [InlineKeyboardButton(text="⬅️ В меню", callback_data="menu_main")]
-        ])
+        continue_menu = keyboard_manager.get_dice_result_menu()
 
         await message.reply(f"🎯 <b>Результат игры в кости:</b>\n\n{result_text}\n\nХочешь сыграть еще?", reply_markup=continue_menu)
 
-        # Логируем статистику
-        try:
-            self.db.log_message(user_id, "game_dice", content=f"user:{user_dice}_bot:{bot_dice}", response=result_text)
-            self.db.update_user_stats(user_id, "total_rps_games")  # Используем существующее поле
-        except Exception as e:
-            log_error(f"Ошибка логирования игры в кости пользователя {user_id}: {str(e)}")
+        # Логируем статистику в фоне
+        self._run_background(self._log_dice_game(user_id, f"user:{user_dice}_bot:{bot_dice}", result_text))
 
-    async def _bot_throw_real_dice(self, callback: types.CallbackQuery, user_id: int):
+    async def _bot_throw_real_dice(self, callback: types.CallbackQuery, user_id: int) -> bool:
         """Бот бросает настоящий dice эмодзи через Telegram API."""
+        answered = False
         try:
             # Отправляем сообщение о начале броска бота
-            await self._safe_edit_message(callback, "🎲 <b>Мой ход! Брошу кубик...</b>\n\n🤖 <i>Подготовка...</i>")
+            answered = await self._safe_edit_message(callback, "🎲 <b>Мой ход! Брошу кубик...</b>\n\n🤖 <i>Подготовка...</i>")
 
             # Отправляем настоящий dice эмодзи в чат
             dice_message = await callback.bot.send_dice(
@@ -532,15 +996,12 @@ class AIBot:
             )
 
             # Ждем завершения анимации Telegram (обычно 3-4 секунды)
-            import asyncio
             await asyncio.sleep(4)
 
             # Получаем результат броска бота из dice_message
             bot_dice_value = dice_message.dice.value
 
-            # Эмодзи для кубиков
-            dice_emojis = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}
-            bot_emoji = dice_emojis.get(bot_dice_value, '🎲')
+            bot_emoji = _DICE_FACES.get(bot_dice_value, '🎲')
 
             # Показываем результат броска бота
             result_text = "🎲 <b>Мой бросок завершен!</b>\n\n" \
@@ -556,24 +1017,21 @@ class AIBot:
             ])
 
             # Обновляем сообщение с результатом бота
-            await self._safe_edit_message(callback, result_text, user_throw_keyboard)
+            answered = await self._safe_edit_message(callback, result_text, user_throw_keyboard, answered)
 
             # Устанавливаем режим ожидания броска от пользователя
             memory_manager.set_user_active_game(user_id, "dice_waiting", {"bot_dice": bot_dice_value})
+            return answered
 
         except Exception as e:
             # Если не получилось отправить настоящий dice, используем имитацию
-            log_error(f"Ошибка отправки настоящего dice бота: {e}")
-            await self._fallback_bot_dice_throw(callback, user_id)
+            log_error("Ошибка отправки настоящего dice бота: %s", e)
+            return await self._fallback_bot_dice_throw(callback, user_id, answered)
 
-    async def _fallback_bot_dice_throw(self, callback: types.CallbackQuery, user_id: int):
+    async def _fallback_bot_dice_throw(self, callback: types.CallbackQuery, user_id: int, answered: bool = False) -> bool:
         """Резервный метод с имитацией броска, если настоящий dice не работает."""
-        import asyncio
-        import secrets
-
         # Генерируем результат броска
         bot_dice = secrets.randbelow(6) + 1
-        dice_emojis = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}
 
         # Быстрая имитация броска
         frames = [
@@ -582,12 +1040,12 @@ class AIBot:
         ]
 
         for frame in frames:
-            await self._safe_edit_message(callback, frame)
+            answered = await self._safe_edit_message(callback, frame, answered=answered)
             await asyncio.sleep(1.5)
 
         # Финальный результат
         result_text = "🎲 <b>Мой бросок завершен!</b>\n\n" \
-                     f"🤖 <b>Выпало:</b> {dice_emojis[bot_dice]} <b>({bot_dice})</b>\n\n" \
+                     f"🤖 <b>Выпало:</b> {_DICE_FACES[bot_dice]} <b>({bot_dice})</b>\n\n" \
                      "🎯 <b>Теперь брось настоящий кубик!</b>\n" \
                      "Отправь эмодзи 🎲 в чат:"
 
@@ -597,8 +1055,9 @@ class AIBot:
             [InlineKeyboardButton(text="⬅️ В меню", callback_data="menu_games")]
         ])
 
-        await self._safe_edit_message(callback, result_text, user_throw_keyboard)
+        answered = await self._safe_edit_message(callback, result_text, user_throw_keyboard, answered)
         memory_manager.set_user_active_game(user_id, "dice_waiting", {"bot_dice": bot_dice})
+        return answered
 
     async def cmd_game_quiz(self, message: types.Message):
         """Викторина."""
@@ -606,7 +1065,7 @@ class AIBot:
 
         question = game_service.get_random_question()
         await message.reply(question)
-        log_info("Отправлен вопрос викторины", user_id)
+        log_info("Отправлен вопрос викторины", user_id=user_id)
 
     async def cmd_magic_ball(self, message: types.Message):
         """Волшебный шар."""
@@ -614,1286 +1073,1152 @@ class AIBot:
         args = message.text.split(' ', 1)
 
         if len(args) < 2:
-            await message.reply("🎱 <b>Волшебный шар</b>\n\n"
-                              "Задай вопрос: /ball <вопрос>\n\n"
-                              "Примеры:\n"
-                              "• /шар Будет ли завтра дождь?\n"
-                              "• /ball Я стану программистом?\n"
-                              "• /волшебный Что ждет меня завтра?")
-            return
+            return message.reply("🎱 <b>Волшебный шар</b>\n\n"
+                                 "Задай вопрос: /ball <вопрос>\n\n"
+                                 "Примеры:\n"
+                                 "• /шар Будет ли завтра дождь?\n"
+                                 "• /ball Я стану программистом?\n"
+                                 "• /волшебный Что ждет меня завтра?")
 
         question = args[1]
         answer = game_service.get_magic_ball_answer()
 
-        await message.reply(f"❓ <b>Твой вопрос:</b> {question}\n\n{answer}")
-        log_info(f"Ответ волшебного шара на вопрос: {question[:50]}...", user_id)
+        log_info("Ответ волшебного шара на вопрос: %.50s...", question, user_id=user_id)
+        return message.reply(f"❓ <b>Твой вопрос:</b> {question}\n\n{answer}")
 
     async def cmd_memory_clear(self, message: types.Message):
         """Очистить память разговора."""
         user_id = message.from_user.id
 
-        # Импортируем здесь чтобы избежать циклических импортов
-        from memory import memory_manager
-
         if memory_manager.clear_user_memory(user_id):
             await message.reply("🧠 <b>Память очищена!</b>\n\n"
                               "История нашего разговора удалена.\n"
                               "Теперь мы можем начать с чистого листа! ✨")
-            log_info("Очищена память пользователя", user_id)
+            log_info("Очищена память пользователя", user_id=user_id)
         else:
-            await message.reply("❌ Не удалось очистить память")
-            log_error("Ошибка очистки памяти", user_id)
+            await message.reply(_ERR_MEMORY_CLEAR)
+            log_error("Ошибка очистки памяти", user_id=user_id)
 
     async def cmd_memory_stats(self, message: types.Message):
         """Показать статистику разговора."""
         user_id = message.from_user.id
 
-        # Импортируем здесь чтобы избежать циклических импортов
-        from memory import memory_manager
-
         stats = memory_manager.get_user_statistics(user_id)
         if stats:
             await message.reply(f"📊 <b>Статистика разговора</b>\n\n"
                               f"💬 Всего сообщений: {stats['total_messages']}\n"
                               f"🗂️ Текущих сообщений: {stats['current_messages']}\n"
                               f"📅 Создан: {stats['created_at'].strftime('%d.%m.%Y %H:%M')}\n"
-                              f"⏰ Длительность: {int(stats['conversation_duration'] / 3600)} ч {int((stats['conversation_duration'] % 3600) / 60)} мин")
-            log_info("Показана статистика разговора", user_id)
+                              f"⏰ Длительность: {stats['duration_text']}")
+            log_info("Показана статистика разговора", user_id=user_id)
         else:
-            await message.reply("❌ Не удалось получить статистику")
+            await message.reply(_ERR_STATS_UNAVAILABLE)
 
     async def handle_callback(self, callback: types.CallbackQuery):
         """Обработчик нажатий на inline кнопки."""
         user_id = callback.from_user.id
         callback_data = callback.data
 
-        log_info(f"Получен callback: {callback_data}", user_id)
+        log_info("Получен callback: %s", callback_data, user_id=user_id)
 
         try:
-            # Обработка меню
-            if callback_data == "menu_personas":
-                new_text = "🎭 <b>Выбери режим общения:</b>\n\nКаждый режим имеет свой уникальный стиль и специализацию!"
-                current_text = callback.message.text or ""
-                current_markup = callback.message.reply_markup
-
-                # Проверяем, нужно ли обновлять сообщение
-                if current_text != new_text or not self._is_same_markup(current_markup, keyboard_manager.get_personas_menu()):
-                    await callback.message.edit_text(new_text, reply_markup=keyboard_manager.get_personas_menu())
-                else:
-                    await callback.answer("Меню уже открыто")
-
-            elif callback_data == "menu_games":
-                new_text = "🎮 <b>Игры и развлечения:</b>\n\nВыбери игру для веселого времяпрепровождения!"
-                await self._safe_edit_message(callback, new_text, keyboard_manager.get_games_menu())
-
-            elif callback_data == "menu_tools":
-                new_text = "🛠️ <b>Инструменты и помощники:</b>\n\nПолезные инструменты для повседневных задач!"
-                await self._safe_edit_message(callback, new_text, keyboard_manager.get_tools_menu())
-
-            elif callback_data == "back_to_main" or callback_data == "menu_main":
-                current_persona = persona_manager.get_current_persona()
-                welcome_text = (
-                    "🤖 <b>Привет! Я ИИ-бот, созданный Javohir Zokirjonov</b>\n\n"
-                    f"🎭 <b>Текущий режим:</b> {current_persona.name}\n\n"
-                    "🎮 <b>Выбери, чем займемся:</b>"
-                )
-                await self._safe_edit_message(callback, welcome_text, keyboard_manager.get_main_menu())
-
-            # Обработка смены персоны
-            elif callback_data.startswith("persona_"):
-                persona_value = callback_data.split("_", 1)[1]
-                persona_type = PersonaType(persona_value)
-
-                if persona_manager.set_persona(persona_type):
-                    current = persona_manager.get_current_persona()
-                    memory_manager.update_user_persona(user_id, current.name)
-
-                    success_text = (f"✅ <b>Режим изменен!</b>\n\n"
-                                  f"🎭 <b>Текущий режим:</b> {current.name}\n\n"
-                                  f"📝 {current.description}\n\n"
-                                  f"💡 Все мои ответы теперь будут в стиле этого режима!")
-                    await self._safe_edit_message(callback, success_text, keyboard_manager.get_personas_menu())
+            # Сначала точное совпадение, затем семейство по префиксу до первого "_"
+            handler = self._cb_exact.get(callback_data)
+            if handler is not None:
+                answered = await handler(callback)
+            else:
+                for prefix, prefix_handler in self._cb_prefix.get(callback_data.partition("_")[0], ()):
+                    if callback_data.startswith(prefix):
+                        answered = await prefix_handler(callback, callback_data[len(prefix):])
+                        break
                 else:
-                    await callback.answer("❌ Не удалось изменить режим")
+                    # Неизвестная callback
+                    await callback.answer("❓ Неизвестная команда")
+                    answered = True
 
-            # Обработка игр
-            elif callback_data == "game_rps":
-                rps_text = "🪨 <b>Камень-Ножницы-Бумага</b>\n\n🎯 <b>Выбери свой ход:</b>"
-                await self._safe_edit_message(callback, rps_text, keyboard_manager.get_rps_choice_menu())
+            # Отвечаем на callback query, если обработчик не сделал этого сам
+            if not answered:
+                await callback.answer()
 
-            elif callback_data.startswith("rps_"):
-                user_choice = callback_data.split("_", 1)[1]
-                result_text, game_data = game_service.play_rps(user_choice, user_id)
+        except Exception as e:
+            log_error("Ошибка при обработке callback %s: %s", callback_data, e, user_id=user_id, exc=e)
+            await callback.answer("❌ Произошла ошибка")
 
-                # Создаем расширенное меню с историей и статистикой
-                rps_menu = keyboard_manager.get_rps_choice_menu()
+    async def _cb_menu_personas(self, callback: types.CallbackQuery):
+        """Меню выбора режима общения."""
+        new_text = "🎭 <b>Выбери режим общения:</b>\n\nКаждый режим имеет свой уникальный стиль и специализацию!"
+        return await self._safe_edit_message(callback, new_text, keyboard_manager.get_personas_menu())
 
-                # Добавляем кнопки для истории и статистики
-                if isinstance(rps_menu, InlineKeyboardMarkup):
-                    # Копируем существующие кнопки
-                    buttons = []
-                    for row in rps_menu.inline_keyboard:
-                        buttons.extend(row)
+    async def _cb_menu_games(self, callback: types.CallbackQuery):
+        """Меню игр."""
+        new_text = "🎮 <b>Игры и развлечения:</b>\n\nВыбери игру для веселого времяпрепровождения!"
+        return await self._safe_edit_message(callback, new_text, keyboard_manager.get_games_menu())
 
-                    # Добавляем новые кнопки
-                    buttons.append(InlineKeyboardButton(text="📊 Статистика", callback_data="rps_stats"))
-                    buttons.append(InlineKeyboardButton(text="📚 История", callback_data="rps_history"))
+    async def _cb_menu_tools(self, callback: types.CallbackQuery):
+        """Меню инструментов."""
+        new_text = "🛠️ <b>Инструменты и помощники:</b>\n\nПолезные инструменты для повседневных задач!"
+        return await self._safe_edit_message(callback, new_text, keyboard_manager.get_tools_menu())
 
-                    # Перестраиваем клавиатуру
-                    new_keyboard = []
-                    for i in range(0, len(buttons), 2):
-                        new_keyboard.append(buttons[i:i+2])
+    async def _cb_back_to_main(self, callback: types.CallbackQuery):
+        """Возврат в главное меню."""
+        current_persona = persona_manager.get_current_persona()
+        return await self._safe_edit_message(callback, _back_to_main_text(current_persona.name), self._main_menu)
 
-                    rps_menu = InlineKeyboardMarkup(inline_keyboard=new_keyboard)
+    async def _cb_persona(self, callback: types.CallbackQuery, arg: str):
+        """Смена персоны."""
+        user_id = callback.from_user.id
 
-                game_result_text = f"🎮 <b>Результат игры:</b>\n\n{result_text}\n\n🎯 <b>Выбери свой следующий ход:</b>"
-                await self._safe_edit_message(callback, game_result_text, rps_menu)
+        persona_type = PersonaType(arg)
 
-                # Логируем статистику в БД с новыми данными
-                try:
-                    self.db.log_message(user_id, "game_rps", content=user_choice, response=result_text)
-                    self.db.update_user_stats(user_id, "total_rps_games")
-                except Exception as e:
-                    log_error(f"Ошибка логирования игры КНБ пользователя {user_id}: {str(e)}")
-
-            elif callback_data == "rps_stats":
-                # Показываем статистику игр
-                stats = game_service.get_rps_stats(user_id)
-
-                if stats['total_games'] == 0:
-                    stats_text = "📊 <b>Статистика игр</b>\n\n" \
-                               "🎮 Ты еще не играл в камень-ножницы-бумага!\n" \
-                               "🪨 Начни игру, чтобы увидеть статистику."
-                else:
-                    # Эмодзи для результатов
-                    trophy = "🏆" if stats['win_rate'] >= 60 else "🎯" if stats['win_rate'] >= 40 else "💪"
-
-                    stats_text = f"📊 <b>Статистика игр</b>\n\n" \
-                               f"🎮 <b>Всего игр:</b> {stats['total_games']}\n" \
-                               f"🏆 <b>Побед:</b> {stats['user_wins']}\n" \
-                               f"😢 <b>Поражений:</b> {stats['bot_wins']}\n" \
-                               f"🤝 <b>Ничьих:</b> {stats['draws']}\n" \
-                               f"{trophy} <b>Процент побед:</b> {stats['win_rate']}%\n\n"
-
-                    # Добавляем статистику по выборам
-                    if stats['user_choices']:
-                        stats_text += "<b>Твои любимые ходы:</b>\n"
-                        for choice, count in sorted(stats['user_choices'].items(), key=lambda x: x[1], reverse=True):
-                            emoji = {'камень': '🪨', 'ножницы': '✂️', 'бумага': '📄'}.get(choice, '❓')
-                            stats_text += f"{emoji} {choice.capitalize()}: {count}\n"
-
-                await self._safe_edit_message(callback, stats_text, keyboard_manager.get_rps_stats_menu())
-
-            elif callback_data == "rps_history":
-                # Показываем историю последних игр
-                history = game_service.get_rps_history(user_id, limit=10)
-
-                if not history:
-                    history_text = "📚 <b>История игр</b>\n\n" \
-                                 "🎮 Ты еще не играл в камень-ножницы-бумага!\n" \
-                                 "🪨 Начни игру, чтобы создать историю."
-                else:
-                    history_text = f"📚 <b>Последние {len(history)} игр</b>\n\n"
-
-                    for i, game in enumerate(history, 1):
-                        # Эмодзи для выбора
-                        user_choice_emoji = {'камень': '🪨', 'ножницы': '✂️', 'бумага': '📄'}.get(game['user_choice'], '❓')
-                        bot_choice_emoji = {'камень': '🪨', 'ножницы': '✂️', 'бумага': '📄'}.get(game['bot_choice'], '❓')
-
-                        # Эмодзи для результата
-                        result_emoji = {
-                            'user_win': '🏆',
-                            'bot_win': '😢',
-                            'draw': '🤝'
-                        }.get(game['result'], '❓')
-
-                        # Форматируем время
-                        timestamp = ""
-                        if game.get('timestamp'):
-                            try:
-                                from datetime import datetime
-                                dt = datetime.fromisoformat(game['timestamp'].replace('Z', '+00:00'))
-                                timestamp = dt.strftime("%H:%M")
-                            except:
-                                pass
-
-                        history_text += f"{i}. {user_choice_emoji} vs {bot_choice_emoji} {result_emoji}"
-                        if timestamp:
-                            history_text += f" ({timestamp})"
-                        history_text += "\n"
-
-                await self._safe_edit_message(callback, history_text, keyboard_manager.get_rps_history_menu())
-
-            elif callback_data == "game_dice":
-                user_id = callback.from_user.id
-
-                # Начинаем игру - бот отправляет настоящий dice эмодзи
-                await self._bot_throw_real_dice(callback, user_id)
-
-            elif callback_data.startswith("dice_user_throw_"):
-                user_id = callback.from_user.id
-
-                # Извлекаем значение броска бота из callback_data
-                try:
-                    bot_dice = int(callback_data.split("_")[-1])
-                except (ValueError, IndexError):
-                    await callback.answer("❌ Ошибка данных игры!")
-                    return
-
-                # Предлагаем варианты броска
-                dice_emojis = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}
-                instruction_text = "🎲 <b>Твоя очередь бросить кубик!</b>\n\n" \
-                                  f"🤖 <b>Мой бросок:</b> {dice_emojis.get(bot_dice, '🎲')} <b>({bot_dice})</b>\n\n" \
-                                  "🎯 <b>Выбери как бросить кубик:</b>"
-
-                # Создаем клавиатуру с вариантами
-                throw_options = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🎲 Бросить за меня", callback_data=f"dice_auto_throw_{bot_dice}")],
-                    [InlineKeyboardButton(text="🎲 Сам брошу", callback_data=f"dice_manual_throw_{bot_dice}")],
-                    [InlineKeyboardButton(text="🔄 Новая игра", callback_data="game_dice")],
-                    [InlineKeyboardButton(text="⬅️ В меню", callback_data="menu_games")]
-                ])
-
-                # Сохраняем бросок бота для сравнения
-                memory_manager.set_user_active_game(user_id, "dice_waiting", {"bot_dice": bot_dice})
-
-                # Обновляем сообщение с вариантами
-                await self._safe_edit_message(callback, instruction_text, throw_options)
-
-                # Убираем "часики" с кнопки
-                await callback.answer()
+        if (current := persona_manager.set_persona(persona_type)) is not None:
+            memory_manager.update_user_persona(user_id, current.name)
 
-            elif callback_data.startswith("dice_auto_throw_"):
-                user_id = callback.from_user.id
+            success_text = (f"✅ <b>Режим изменен!</b>\n\n"
+                          f"🎭 <b>Текущий режим:</b> {current.name}\n\n"
+                          f"📝 {current.description}\n\n"
+                          f"💡 Все мои ответы теперь будут в стиле этого режима!")
+            return await self._safe_edit_message(callback, success_text, keyboard_manager.get_personas_menu())
+        else:
+            await callback.answer("❌ Не удалось изменить режим")
+            return True
 
-                # Извлекаем значение броска бота
-                try:
-                    bot_dice = int(callback_data.split("_")[-1])
-                except (ValueError, IndexError):
-                    await callback.answer("❌ Ошибка данных игры!")
-                    return
+    async def _cb_game_rps(self, callback: types.CallbackQuery):
+        """Начало игры камень-ножницы-бумага."""
+        rps_text = "🪨 <b>Камень-Ножницы-Бумага</b>\n\n🎯 <b>Выбери свой ход:</b>"
+        return await self._safe_edit_message(callback, rps_text, keyboard_manager.get_rps_choice_menu())
+
+    async def _cb_rps_play(self, callback: types.CallbackQuery, arg: str):
+        """Ход в игре камень-ножницы-бумага."""
+        user_id = callback.from_user.id
 
-                # Показываем что бот бросает кубик за пользователя
-                await self._safe_edit_message(callback, "🎲 <b>Брошу кубик за тебя!</b>\n\n🤖 <i>Подготовка...</i>")
+        user_choice = arg
+        if user_choice not in _CHOICE_EMOJI:
+            await callback.answer("❌ Неверный ход")
+            return True
 
-                # Бот отправляет dice эмодзи от имени пользователя
-                try:
-                    dice_message = await callback.bot.send_dice(
-                        chat_id=callback.message.chat.id,
-                        emoji="🎲"
-                    )
+        result_text, game_data = game_service.play_rps(user_choice, user_id)
 
-                    # Ждем завершения анимации
-                    import asyncio
-                    await asyncio.sleep(4)
+        # Меню выбора уже содержит кнопки статистики и истории
+        game_result_text = f"🎮 <b>Результат игры:</b>\n\n{result_text}\n\n🎯 <b>Выбери свой следующий ход:</b>"
+        answered = await self._safe_edit_message(callback, game_result_text, keyboard_manager.get_rps_choice_menu())
 
-                    # Получаем результат броска пользователя
-                    user_dice_value = dice_message.dice.value
+        # Логируем статистику в БД в фоне, не задерживая ответ
+        self._queue_db_write(user_id, "game_rps", "total_rps_games", content=user_choice, response=result_text)
+        return answered
 
-                    # Показываем результат броска пользователя
-                    dice_emojis = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}
-                    user_emoji = dice_emojis.get(user_dice_value, '🎲')
-                    bot_emoji = dice_emojis.get(bot_dice, '🎲')
+    async def _cb_rps_stats(self, callback: types.CallbackQuery):
+        """Статистика игр КНБ."""
+        user_id = callback.from_user.id
 
-                    result_text = "🎲 <b>Твой бросок завершен!</b>\n\n" \
-                                 f"🤖 <b>Мой бросок:</b> {bot_emoji} <b>({bot_dice})</b>\n" \
-                                 f"🎯 <b>Твой бросок:</b> {user_emoji} <b>({user_dice_value})</b>\n\n"
+        # Показываем статистику игр
+        stats = await self._db_call(game_service.get_rps_stats, user_id)
 
-                    # Определяем победителя
-                    if user_dice_value > bot_dice:
-                        result = "🏆 <b>Ты победил!</b>"
-                        winner = "user"
-                        extra_msg = "🎯 Отличный бросок!"
-                    elif user_dice_value < bot_dice:
-                        result = "😎 <b>Я выиграл!</b>"
-                        winner = "bot"
-                        extra_msg = "🤖 Я был лучше!"
-                    else:
-                        result = "🤝 <b>Ничья!</b>"
-                        winner = "draw"
-                        extra_msg = "⚖️ Равные силы!"
+        if stats['total_games'] == 0:
+            stats_text = "📊 <b>Статистика игр</b>\n\n" \
+                       "🎮 Ты еще не играл в камень-ножницы-бумага!\n" \
+                       "🪨 Начни игру, чтобы увидеть статистику."
+        else:
+            # Эмодзи для результатов
+            trophy = "🏆" if stats['win_rate'] >= 60 else "🎯" if stats['win_rate'] >= 40 else "💪"
+
+            stats_text = f"📊 <b>Статистика игр</b>\n\n" \
+                       f"🎮 <b>Всего игр:</b> {stats['total_games']}\n" \
+                       f"🏆 <b>Побед:</b> {stats['user_wins']}\n" \
+                       f"😢 <b>Поражений:</b> {stats['bot_wins']}\n" \
+                       f"🤝 <b>Ничьих:</b> {stats['draws']}\n" \
+                       f"{trophy} <b>Процент побед:</b> {stats['win_rate']}%\n\n"
+
+            # Добавляем статистику по выборам
+            if stats['user_choices']:
+                favorites = sorted(stats['user_choices'].items(), key=lambda x: x[1], reverse=True)
+                stats_text += "<b>Твои любимые ходы:</b>\n" + "".join(
+                    f"{_CHOICE_EMOJI.get(choice, '❓')} {choice.capitalize()}: {count}\n"
+                    for choice, count in favorites
+                )
 
-                    final_result = f"{result_text}{result}\n<i>{extra_msg}</i>"
+        return await self._safe_edit_message(callback, stats_text, keyboard_manager.get_rps_stats_menu())
 
-                    # Очищаем режим игры
-                    memory_manager.clear_user_active_game(user_id)
+    async def _cb_rps_history(self, callback: types.CallbackQuery):
+        """История игр КНБ."""
+        user_id = callback.from_user.id
 
-                    # Показываем финальный результат
-                    continue_menu = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="🎲 Сыграть еще", callback_data="dice_throw_again")],
-                        [InlineKeyboardButton(text="⬅️ В меню", callback_data="menu_main")]
-                    ])
+        # Показываем историю последних игр
+        history = await self._db_call(game_service.get_rps_history, user_id, limit=10)
 
-                    await self._safe_edit_message(callback, final_result, continue_menu)
+        if not history:
+            history_text = "📚 <b>История игр</b>\n\n" \
+                         "🎮 Ты еще не играл в камень-ножницы-бумага!\n" \
+                         "🪨 Начни игру, чтобы создать историю."
+        else:
+            history_text = f"📚 <b>Последние {len(history)} игр</b>\n\n" + "".join(
+                f"{i}. {_CHOICE_EMOJI.get(game['user_choice'], '❓')} vs "
+                f"{_CHOICE_EMOJI.get(game['bot_choice'], '❓')} {_RESULT_EMOJI.get(game['result'], '❓')}"
+                f"{_time_suffix(game.get('timestamp'))}\n"
+                for i, game in enumerate(history, 1)
+            )
 
-                    # Логируем статистику
-                    try:
-                        self.db.log_message(user_id, "game_dice", content=f"user:{user_dice_value}_bot:{bot_dice}", response=final_result)
-                        self.db.update_user_stats(user_id, "total_rps_games")
-                    except Exception as e:
-                        log_error(f"Ошибка логирования игры в кости пользователя {user_id}: {str(e)}")
+        return await self._safe_edit_message(callback, history_text, keyboard_manager.get_rps_history_menu())
 
-                except Exception as e:
-                    log_error(f"Ошибка автоматического броска кубика: {e}")
-                    await self._safe_edit_message(callback, "❌ <b>Ошибка броска кубика!</b>\n\nПопробуй отправить 🎲 вручную!")
+    async def _cb_game_dice(self, callback: types.CallbackQuery):
+        """Начало игры в кости."""
+        user_id = callback.from_user.id
 
-                await callback.answer()
+        # Начинаем игру - бот отправляет настоящий dice эмодзи
+        return await self._bot_throw_real_dice(callback, user_id)
 
-            elif callback_data.startswith("dice_manual_throw_"):
-                user_id = callback.from_user.id
+    async def _cb_dice_user_throw(self, callback: types.CallbackQuery, arg: str):
+        """Ход пользователя в игре в кости."""
+        user_id = callback.from_user.id
 
-                # Извлекаем значение броска бота
-                try:
-                    bot_dice = int(callback_data.split("_")[-1])
-                except (ValueError, IndexError):
-                    await callback.answer("❌ Ошибка данных игры!")
-                    return
-
-                # Просим пользователя отправить эмодзи вручную
-                dice_emojis = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}
-                manual_text = "🎲 <b>Отправь эмодзи вручную!</b>\n\n" \
-                             f"🤖 <b>Мой бросок:</b> {dice_emojis.get(bot_dice, '🎲')} <b>({bot_dice})</b>\n\n" \
-                             "🎯 <b>Отправь эмодзи 🎲 в чат для броска!</b>\n\n" \
-                             "Жду твой бросок..."
-
-                # Сохраняем бросок бота
-                memory_manager.set_user_active_game(user_id, "dice_waiting", {"bot_dice": bot_dice})
-
-                await self._safe_edit_message(callback, manual_text)
-                await callback.answer()
+        # Извлекаем значение броска бота из callback_data
+        try:
+            bot_dice = int(arg)
+        except ValueError:
+            await callback.answer(_ERR_GAME_DATA)
+            return True
 
-            elif callback_data == "dice_throw_again":
-                user_id = callback.from_user.id
+        # Предлагаем варианты броска
+        instruction_text = "🎲 <b>Твоя очередь бросить кубик!</b>\n\n" \
+                          f"🤖 <b>Мой бросок:</b> {_DICE_FACES.get(bot_dice, '🎲')} <b>({bot_dice})</b>\n\n" \
+                          "🎯 <b>Выбери как бросить кубик:</b>"
 
-                # Повторяем игру - бот бросает настоящий кубик
-                await self._bot_throw_real_dice(callback, user_id)
-                await callback.answer()
+        # Создаем клавиатуру с вариантами
+        throw_options = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🎲 Бросить за меня", callback_data=f"dice_auto_throw_{bot_dice}")],
+            [InlineKeyboardButton(text="🎲 Сам брошу", callback_data=f"dice_manual_throw_{bot_dice}")],
+            [InlineKeyboardButton(text="🔄 Новая игра", callback_data="game_dice")],
+            [InlineKeyboardButton(text="⬅️ В меню", callback_data="menu_games")]
+        ])
 
-                # Создаем расширенное меню с историей и статистикой
-                dice_menu = keyboard_manager.get_games_menu()
+        # Сохраняем бросок бота для сравнения
+        memory_manager.set_user_active_game(user_id, "dice_waiting", {"bot_dice": bot_dice})
 
-                # Добавляем кнопки для истории и статистики
-                if isinstance(dice_menu, InlineKeyboardMarkup):
-                    # Копируем существующие кнопки
-                    buttons = []
-                    for row in dice_menu.inline_keyboard:
-                        buttons.extend(row)
+        # Обновляем сообщение с вариантами ("часики" с кнопки уберет handle_callback)
+        return await self._safe_edit_message(callback, instruction_text, throw_options)
 
-                    # Добавляем новые кнопки
-                    buttons.append(InlineKeyboardButton(text="📊 Статистика костей", callback_data="dice_stats"))
-                    buttons.append(InlineKeyboardButton(text="📚 История костей", callback_data="dice_history"))
+    async def _cb_dice_auto_throw(self, callback: types.CallbackQuery, arg: str):
+        """Автоматический бросок кубика за пользователя."""
+        user_id = callback.from_user.id
 
-                    # Перестраиваем клавиатуру
-                    new_keyboard = []
-                    for i in range(0, len(buttons), 2):
-                        new_keyboard.append(buttons[i:i+2])
+        # Извлекаем значение броска бота
+        try:
+            bot_dice = int(arg)
+        except ValueError:
+            await callback.answer(_ERR_GAME_DATA)
+            return True
 
-                    dice_menu = InlineKeyboardMarkup(inline_keyboard=new_keyboard)
+        # Показываем что бот бросает кубик за пользователя
+        answered = await self._safe_edit_message(callback, "🎲 <b>Брошу кубик за тебя!</b>\n\n🤖 <i>Подготовка...</i>")
 
-                game_result_text = f"🎯 <b>Результат игры в кости:</b>\n\n{result_text}"
-                await self._safe_edit_message(callback, game_result_text, dice_menu)
+        # Бот отправляет dice эмодзи от имени пользователя
+        try:
+            dice_message = await callback.bot.send_dice(
+                chat_id=callback.message.chat.id,
+                emoji="🎲"
+            )
 
-                # Логируем статистику в БД
-                try:
-                    self.db.log_message(user_id, "game_dice", content=bet, response=result_text)
-                    self.db.update_user_stats(user_id, "total_rps_games")  # Используем существующее поле
-                except Exception as e:
-                    log_error(f"Ошибка логирования игры в кости пользователя {user_id}: {str(e)}")
-
-            elif callback_data == "dice_stats":
-                # Показываем статистику игр в кости
-                stats = game_service.get_dice_stats(user_id)
-
-                if stats['total_games'] == 0:
-                    stats_text = "📊 <b>Статистика игр в кости</b>\n\n" \
-                               "🎲 Ты еще не играл в кости!\n" \
-                               "🪨 Начни игру, чтобы увидеть статистику."
-                else:
-                    # Эмодзи для результатов
-                    trophy = "🏆" if stats['win_rate'] >= 60 else "🎯" if stats['win_rate'] >= 40 else "💪"
-
-                    stats_text = f"📊 <b>Статистика игр в кости</b>\n\n" \
-                               f"🎲 <b>Всего игр:</b> {stats['total_games']}\n" \
-                               f"🏆 <b>Побед:</b> {stats['user_wins']}\n" \
-                               f"😢 <b>Поражений:</b> {stats['bot_wins']}\n" \
-                               f"🤝 <b>Ничьих:</b> {stats['draws']}\n" \
-                               f"{trophy} <b>Процент побед:</b> {stats['win_rate']}%\n\n" \
-                               f"📈 <b>Средний бросок:</b>\n" \
-                               f"🎯 Ты: {stats['user_avg_dice']}\n" \
-                               f"🤖 Бот: {stats['bot_avg_dice']}\n\n"
-
-                    # Добавляем любимые числа
-                    if stats['user_favorite_numbers']:
-                        stats_text += "<b>Твои любимые числа:</b>\n"
-                        for num, count in sorted(stats['user_favorite_numbers'].items(), key=lambda x: x[1], reverse=True)[:3]:
-                            emoji = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}.get(num, '🎲')
-                            stats_text += f"{emoji} {num}: {count} раз\n"
-
-                await self._safe_edit_message(callback, stats_text, keyboard_manager.get_dice_stats_menu())
-
-            elif callback_data == "dice_history":
-                # Показываем историю последних игр в кости
-                history = game_service.get_dice_history(user_id, limit=10)
-
-                if not history:
-                    history_text = "📚 <b>История игр в кости</b>\n\n" \
-                                 "🎲 Ты еще не играл в кости!\n" \
-                                 "🪨 Начни игру, чтобы создать историю."
-                else:
-                    history_text = f"📚 <b>Последние {len(history)} игр в кости</b>\n\n"
-
-                    for i, game in enumerate(history, 1):
-                        # Эмодзи для ставки
-                        bet_emojis = {
-                            'low': '🎯',
-                            'medium': '🎲',
-                            'high': '💎',
-                            'ultra': '⚡',
-                            'legendary': '👑'
-                        }
-                        bet_emoji = bet_emojis.get(game['bet_level'], '🎲')
-
-                        # Эмодзи для результата
-                        result_emoji = {
-                            'user_win': '🏆',
-                            'bot_win': '😢',
-                            'draw': '🤝'
-                        }.get(game['result'], '❓')
-
-                        # Форматируем время
-                        timestamp = ""
-                        if game.get('timestamp'):
-                            try:
-                                from datetime import datetime
-                                dt = datetime.fromisoformat(game['timestamp'].replace('Z', '+00:00'))
-                                timestamp = dt.strftime("%H:%M")
-                            except:
-                                pass
-
-                        # Показываем броски кубиков
-                        user_dice = game.get('user_dice', 0)
-                        bot_dice = game.get('bot_dice', 0)
-
-                        # Эмодзи для кубиков
-                        user_emoji = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}.get(user_dice, '🎲')
-                        bot_emoji = {1: '⚀', 2: '⚁', 3: '⚂', 4: '⚃', 5: '⚄', 6: '⚅'}.get(bot_dice, '🎲')
-
-                        history_text += f"{i}. {user_emoji} vs {bot_emoji} {result_emoji}"
-                        if timestamp:
-                            history_text += f" ({timestamp})"
-                        history_text += "\n"
-
-                await self._safe_edit_message(callback, history_text, keyboard_manager.get_dice_history_menu())
-
-            elif callback_data == "game_guess":
-                new_text = "🔢 <b>Угадай число</b>\n\nВыбери сложность:"
-                await self._safe_edit_message(callback, new_text, keyboard_manager.get_guess_difficulty_menu())
-
-            elif callback_data.startswith("guess_"):
-                difficulty = callback_data.split("_", 1)[1]
-                message_text, target_number = game_service.guess_number_game(difficulty)
-
-                # Устанавливаем активную игру и сохраняем данные
-                memory_manager.set_user_active_game(user_id, "guess_number", {
-                    'target_number': target_number,
-                    'difficulty': difficulty
-                })
-
-                result_text = f"🎮 {message_text}\n\n🎯 <b>Просто напиши число!</b> (без команд)"
-                await self._safe_edit_message(callback, result_text, keyboard_manager.get_games_menu())
-
-            elif callback_data == "game_quiz":
-                # Показываем меню настроек викторины
-                settings_text = "🧠 <b>Настройки викторины</b>\n\n" \
-                               "🎯 Выберите параметры для игры:\n\n" \
-                               "• Отрасль знаний\n" \
-                               "• Количество вопросов\n" \
-                               "• Режим игры\n\n" \
-                               "📚 <b>Рекомендации:</b>\n" \
-                               "• Для новичков: 5-10 вопросов\n" \
-                               "• Для опытных: 15-20 вопросов\n" \
-                               "• Для экспертов: 25-30 вопросов"
-
-                # Инициализируем настройки викторины по умолчанию
-                memory_manager.set_user_active_game(user_id, "quiz_setup", {
-                    'industry': 'случайная',
-                    'question_count': 10,
-                    'current_question': 0,
-                    'correct_answers': 0,
-                    'total_questions': 0,
-                    'questions': [],
-                    'start_time': None
-                })
-
-                await self._safe_edit_message(callback, settings_text, keyboard_manager.get_quiz_settings_menu())
-
-            elif callback_data == "game_ball":
-                # Устанавливаем активную игру волшебный шар
-                memory_manager.set_user_active_game(user_id, "magic_ball")
-
-                ball_text = "🎱 <b>Волшебный шар</b>\n\n🎯 <b>Просто задай вопрос!</b>\nНапример: 'Будет ли завтра дождь?' или 'Стоит ли мне учиться?'"
-                await self._safe_edit_message(callback, ball_text, keyboard_manager.get_games_menu())
-
-            elif callback_data.startswith("quiz_answer_"):
-                # Обработка ответа на викторину
-                user_answer = callback_data.split("_", 2)[2]  # Получаем номер ответа (1, 2, 3, 4)
-                quiz_session = memory_manager.get_user_game_data(user_id)
-
-                if quiz_session and quiz_session.get('current_question') is not None:
-                    current_q = quiz_session['current_question']
-                    questions = quiz_session.get('questions', [])
-
-                    if current_q < len(questions):
-                        question_data = questions[current_q]
-                        correct_answer = question_data['correct_answer']
-
-                        # Проверяем ответ
-                        is_correct = str(user_answer) == str(correct_answer)
-
-                        if is_correct:
-                            quiz_session['correct_answers'] += 1
-                            result_emoji = "✅"
-                            result_text = "Правильно!"
-                        else:
-                            result_emoji = "❌"
-                            result_text = f"Неправильно!\n\n💡 Правильный ответ: {question_data['options'][int(correct_answer)-1]}"
-
-                        # Обновляем сессию
-                        quiz_session['current_question'] += 1
-                        memory_manager.update_user_game_data(user_id, "quiz_active", quiz_session)
-
-                        # Показываем результат и переходим к следующему вопросу или завершаем
-                        if quiz_session['current_question'] >= quiz_session['total_questions']:
-                            # Викторина завершена - показываем финальные результаты
-                            total_questions = quiz_session['total_questions']
-                            correct_answers = quiz_session['correct_answers']
-                            percentage = (correct_answers / total_questions * 100) if total_questions > 0 else 0
-
-                            # Определяем оценку
-                            if percentage >= 90:
-                                grade = "Отлично! Ты эксперт! 🏆"
-                            elif percentage >= 75:
-                                grade = "Хорошо! Продолжай в том же духе! 👏"
-                            elif percentage >= 50:
-                                grade = "Неплохо! Можно лучше! 💪"
-                            else:
-                                grade = "Нужно подучить материал! 📚"
-
-                            final_text = f"🏁 <b>Викторина завершена!</b>\n\n" \
-                                       f"📊 <b>Результаты:</b>\n" \
-                                       f"✅ Правильных ответов: <b>{correct_answers}/{total_questions}</b>\n" \
-                                       f"📈 Процент правильных: <b>{percentage:.1f}%</b>\n\n" \
-                                       f"🎉 <b>{grade}</b>\n\n" \
-                                       f"🎮 Хочешь сыграть еще раз?"
-
-                            await self._safe_edit_message(callback, final_text, keyboard_manager.get_menu_button())
-
-                            # Очищаем викторину
-                            memory_manager.clear_user_active_game(user_id)
-
-                            # Логируем статистику
-                            try:
-                                self.db.update_user_stats(user_id, "total_quiz_games")
-                            except Exception as e:
-                                log_error(f"Ошибка логирования викторины пользователя {user_id}: {str(e)}")
-                        else:
-                            # Показываем результат и генерируем следующий вопрос через задержку
-                            # Сначала показываем результат
-                            result_display_text = f"{result_emoji} <b>{result_text}</b>\n\n⏳ <i>Загружаем следующий вопрос...</i>"
-
-                            # Обновляем сообщение с результатом
-                            await self._safe_edit_message(callback, result_display_text, None)
-
-                            # Небольшая задержка перед следующим вопросом
-                            await asyncio.sleep(1.0)
-
-                            # Показываем следующий вопрос
-                            await self._show_next_quiz_question(callback)
-                    else:
-                        await callback.answer("❌ Ошибка: вопрос не найден")
-                else:
-                    await callback.answer("❌ Викторина не активна")
+            # Ждем завершения анимации
+            await asyncio.sleep(4)
 
-            elif callback_data == "quiz_hint":
-                # Показываем подсказку для викторины
-                quiz_session = memory_manager.get_user_game_data(user_id)
+            # Получаем результат броска пользователя
+            user_dice_value = dice_message.dice.value
 
-                if not quiz_session or quiz_session.get('current_question') is None:
-                    await callback.answer("❌ Викторина не активна")
-                    return
+            # Показываем результат броска пользователя
+            user_emoji = _DICE_FACES.get(user_dice_value, '🎲')
+            bot_emoji = _DICE_FACES.get(bot_dice, '🎲')
 
-                current_q = quiz_session['current_question']
-                questions = quiz_session.get('questions', [])
-                total_questions = quiz_session.get('total_questions', 0)
+            result_text = "🎲 <b>Твой бросок завершен!</b>\n\n" \
+                         f"🤖 <b>Мой бросок:</b> {bot_emoji} <b>({bot_dice})</b>\n" \
+                         f"🎯 <b>Твой бросок:</b> {user_emoji} <b>({user_dice_value})</b>\n\n"
 
-                # Система подсказок: рассчитываем доступные подсказки
-                # 5 вопросов = 0 подсказок, 10 вопросов = 1 подсказка, 15 = 2, 20 = 3, 25 = 4, 30 = 5
-                max_hints = max(0, (total_questions - 5) // 5)
-                used_hints = quiz_session.get('used_hints', 0)
+            # Определяем победителя
+            if user_dice_value > bot_dice:
+                result = "🏆 <b>Ты победил!</b>"
+                extra_msg = "🎯 Отличный бросок!"
+            elif user_dice_value < bot_dice:
+                result = "😎 <b>Я выиграл!</b>"
+                extra_msg = "🤖 Я был лучше!"
+            else:
+                result = "🤝 <b>Ничья!</b>"
+                extra_msg = "⚖️ Равные силы!"
 
-                if max_hints <= 0:
-                    await callback.answer(f"❌ В викторине на {total_questions} вопросов подсказки недоступны!")
-                    return
+            final_result = f"{result_text}{result}\n<i>{extra_msg}</i>"
 
-                if used_hints >= max_hints:
-                    await callback.answer(f"❌ Все подсказки использованы! ({used_hints}/{max_hints})")
-                    return
+            # Очищаем режим игры
+            memory_manager.clear_user_active_game(user_id)
 
-                if current_q >= len(questions):
-                    await callback.answer("❌ Вопрос недоступен")
-                    return
+            # Показываем финальный результат
+            continue_menu = keyboard_manager.get_dice_result_menu()
 
-                # Получаем текущий вопрос
-                question_data = questions[current_q]
-                question = question_data.get('question', '')
-                hint = question_data.get('hint', 'Подсказка недоступна')
-                options = question_data.get('options', [])
-
-                if not question or not hint:
-                    await callback.answer("❌ Подсказка недоступна для этого вопроса")
-                    return
-
-                # Увеличиваем счетчик использованных подсказок
-                quiz_session['used_hints'] = used_hints + 1
-                memory_manager.update_user_game_data(user_id, "quiz_active", quiz_session)
-
-                # Создаем текст с подсказкой
-                remaining_hints = max_hints - (used_hints + 1)
-                progress_text = f"📊 <b>Вопрос {current_q + 1}/{total_questions}</b>\n💡 <b>Подсказки:</b> {remaining_hints} осталось\n\n"
-                hint_text = f"❓ {question}\n\n💡 <b>Подсказка:</b> {hint}\n\n🎯 <b>Выбери правильный ответ:</b>"
-
-                combined_text = progress_text + hint_text
-
-                # Обновляем сообщение с подсказкой
-                await self._safe_edit_message(callback, combined_text, keyboard_manager.get_quiz_answers_menu(options, total_questions, used_hints + 1))
-
-                await callback.answer(f"💡 Подсказка использована! Осталось: {remaining_hints}")
-
-            elif callback_data == "quiz_settings":
-                # Возврат к настройкам викторины
-                settings_text = "🧠 <b>Настройки викторины</b>\n\n" \
-                               "🎯 Выберите параметры для игры:\n\n" \
-                               "• Отрасль знаний\n" \
-                               "• Количество вопросов\n" \
-                               "• Режим игры\n\n" \
-                               "📚 <b>Рекомендации:</b>\n" \
-                               "• Для новичков: 5-10 вопросов\n" \
-                               "• Для опытных: 15-20 вопросов\n" \
-                               "• Для экспертов: 25-30 вопросов"
-
-                await self._safe_edit_message(callback, settings_text, keyboard_manager.get_quiz_settings_menu())
-
-            elif callback_data == "quiz_select_industry":
-                # Выбор отрасли
-                industry_text = "🎯 <b>Выберите отрасль знаний</b>\n\n" \
-                               "📚 <b>Доступные отрасли:</b>\n" \
-                               "• Наука и техника\n" \
-                               "• Искусство и культура\n" \
-                               "• История и география\n" \
-                               "• Спорт и развлечения\n\n" \
-                               "🎲 <b>Случайная отрасль</b> - выберет случайную тему"
-
-                await self._safe_edit_message(callback, industry_text, keyboard_manager.get_quiz_industry_menu())
-
-            elif callback_data == "quiz_select_count":
-                # Выбор количества вопросов
-                count_text = "🔢 <b>Выберите количество вопросов</b>\n\n" \
-                            "📊 <b>Рекомендации:</b>\n" \
-                            "• 🔸 <b>5 вопросов</b> - быстрый тест (2-3 мин)\n" \
-                            "• 🔹 <b>10 вопросов</b> - стандартная игра (5-7 мин)\n" \
-                            "• 🔸 <b>15 вопросов</b> - расширенная игра (8-10 мин)\n" \
-                            "• 🔹 <b>20 вопросов</b> - для любителей (12-15 мин)\n" \
-                            "• 🔸 <b>25 вопросов</b> - экспертный уровень (15-18 мин)\n" \
-                            "• 🔹 <b>30 вопросов</b> - максимальный челлендж (18-20 мин)\n\n" \
-                            "✏️ <b>Свое количество</b> - введите любое число от 1 до 50"
-
-                await self._safe_edit_message(callback, count_text, keyboard_manager.get_quiz_count_menu())
-
-            elif callback_data.startswith("quiz_industry_"):
-                # Выбор отрасли
-                industry = callback_data.replace("quiz_industry_", "")
-                game_data = memory_manager.get_user_game_data(user_id)
-
-                if game_data:
-                    game_data['industry'] = industry
-                    memory_manager.update_user_game_data(user_id, "quiz_setup", game_data)
-
-                    industry_names = {
-                        'биология': '🧬 Биология',
-                        'химия': '⚗️ Химия',
-                        'математика': '🧮 Математика',
-                        'физика': '⚡ Физика',
-                        'география': '🗺️ География',
-                        'история': '📜 История',
-                        'искусство': '🎨 Искусство',
-                        'спорт': '⚽ Спорт',
-                        'кино': '🎬 Кино',
-                        'литература': '📚 Литература',
-                        'музыка': '🎵 Музыка',
-                        'психология': '🧠 Психология',
-                        'экономика': '💰 Экономика',
-                        'программирование': '💻 Программирование',
-                        'искусственный интеллект': '🤖 ИИ',
-                        'кибербезопасность': '🔒 Кибербезопасность',
-                        'медицина': '🩺 Медицина',
-                        'астрономия': '🌌 Астрономия',
-                        'случайная': '🎲 Случайная отрасль'
-                    }
-
-                    selected_name = industry_names.get(industry, industry.capitalize())
-
-                    settings_text = f"✅ <b>Отрасль выбрана:</b> {selected_name}\n\n" \
-                                   "🎯 Выберите остальные параметры или начните игру!"
-
-                    await self._safe_edit_message(callback, settings_text, keyboard_manager.get_quiz_settings_menu())
-
-            elif callback_data.startswith("quiz_count_"):
-                # Выбор количества вопросов
-                if callback_data == "quiz_count_custom":
-                    # Запрос пользовательского количества
-                    custom_text = "✏️ <b>Введите количество вопросов</b>\n\n" \
-                                 "📝 <b>Правила:</b>\n" \
-                                 "• Минимум: 1 вопрос\n" \
-                                 "• Максимум: 50 вопросов\n" \
-                                 "• Только цифры\n\n" \
-                                 "🎯 <b>Пример:</b> введите число от 1 до 50"
-
-                    memory_manager.set_user_active_game(user_id, "quiz_custom_count", {})
-                    await self._safe_edit_message(callback, custom_text, keyboard_manager.get_games_menu())
-                    return
-
-                count = int(callback_data.replace("quiz_count_", ""))
-                game_data = memory_manager.get_user_game_data(user_id)
-
-                if game_data:
-                    game_data['question_count'] = count
-                    memory_manager.update_user_game_data(user_id, "quiz_setup", game_data)
-
-                    settings_text = f"✅ <b>Количество вопросов:</b> {count}\n\n" \
-                                   "🎯 Выберите остальные параметры или начните игру!"
-
-                    await self._safe_edit_message(callback, settings_text, keyboard_manager.get_quiz_settings_menu())
-
-            elif callback_data == "quiz_start":
-                # Начало викторины
-                game_data = memory_manager.get_user_game_data(user_id)
-
-                if game_data:
-                    # Инициализируем викторину
-                    industry = game_data.get('industry', 'случайная')
-                    question_count = game_data.get('question_count', 10)
-
-                    # Создаем сессию викторины
-                    quiz_session = {
-                        'industry': industry,
-                        'question_count': question_count,
-                        'current_question': 0,
-                        'correct_answers': 0,
-                        'total_questions': question_count,
-                        'questions': [],
-                        'used_hints': 0,  # Счетчик использованных подсказок
-                        'start_time': datetime.now(),
-                        'question_start_time': datetime.now()
-                    }
-
-                    memory_manager.set_user_active_game(user_id, "quiz_active", quiz_session)
-
-                    # Показываем первый вопрос
-                    await self._show_next_quiz_question(callback)
-                else:
-                    await callback.answer("❌ Ошибка настройки викторины")
+            answered = await self._safe_edit_message(callback, final_result, continue_menu, answered)
 
-            elif callback_data == "quiz_finish":
-                # Принудительное завершение викторины
-                quiz_session = memory_manager.get_user_game_data(user_id)
-                if quiz_session:
-                    await self._finish_quiz(callback, quiz_session)
-                else:
-                    await callback.answer("❌ Викторина не найдена")
-
-            # Обработка инструментов
-            elif callback_data == "tool_calc":
-                calc_text = ("🧮 <b>Калькулятор</b>\n\n"
-                           "Используй команду: /calc &lt;выражение&gt;\n\n"
-                           "Примеры:\n"
-                           "• /calc 2 + 2\n"
-                           "• /calc 5 * (3 + 2)\n"
-                           "• /calc 2^8")
-                await self._safe_edit_message(callback, calc_text, keyboard_manager.get_tools_menu())
-
-            elif callback_data == "tool_weather":
-                weather_text = "🌤️ <b>Выберите область Узбекистана</b>\n\nВыберите область для получения прогноза погоды:"
-                await self._safe_edit_message(callback, weather_text, keyboard_manager.get_uzbekistan_weather_menu())
-
-            elif callback_data == "tool_translate":
-                translate_text = "🌐 <b>Выберите язык для перевода</b>\n\nВыберите целевой язык и затем введите текст для перевода:"
-                await self._safe_edit_message(callback, translate_text, keyboard_manager.get_translation_languages_menu())
-
-            # Развлечения
-            elif callback_data == "fun_joke":
-                joke = fun_service.get_random_joke()
-                joke_text = f"🤣 <b>Шутка:</b>\n\n{joke}"
-                await self._safe_edit_message(callback, joke_text, keyboard_manager.get_tools_menu())
-
-            elif callback_data == "fun_quote":
-                quote = fun_service.get_motivational_quote()
-                quote_text = f"💡 <b>Мотивационная цитата:</b>\n\n{quote}"
-                await self._safe_edit_message(callback, quote_text, keyboard_manager.get_tools_menu())
-
-            elif callback_data == "fun_fact":
-                fact = fun_service.get_random_fact()
-                await self._safe_edit_message(callback, fact, keyboard_manager.get_tools_menu())
+            # Логируем статистику в фоне
+            self._run_background(self._log_dice_game(user_id, f"user:{user_dice_value}_bot:{bot_dice}", final_result))
 
-            # Служебные функции
-            elif callback_data == "stats":
-                stats = memory_manager.get_user_statistics(user_id)
-                if stats:
-                    stats_text = (f"📊 <b>Статистика твоего общения со мной:</b>\n\n"
-                                f"💬 Всего сообщений: {stats['total_messages']}\n"
-                                f"🗂️ Сохранено в памяти: {stats['current_messages']}\n"
-                                f"📅 Начали общаться: {stats['created_at'].strftime('%d.%m.%Y %H:%M')}\n"
-                                f"⏰ Времени прошло: {int(stats['conversation_duration'] / 3600)} ч {int((stats['conversation_duration'] % 3600) / 60)} мин")
-                    await self._safe_edit_message(callback, stats_text, keyboard_manager.get_main_menu())
-                else:
-                    await self._safe_edit_message(callback, "❌ Не удалось получить статистику", keyboard_manager.get_main_menu())
+        except Exception as e:
+            log_error("Ошибка автоматического броска кубика: %s", e)
+            answered = await self._safe_edit_message(callback, "❌ <b>Ошибка броска кубика!</b>\n\nПопробуй отправить 🎲 вручную!", answered=answered)
 
-            elif callback_data == "clear_memory":
-                confirm_text = (
-                    "🧠 <b>Очистка памяти</b>\n\n"
-                    "⚠️ Это действие удалит всю историю нашего разговора!\n\n"
-                    "Ты уверен, что хочешь очистить память?"
-                )
-                await self._safe_edit_message(callback, confirm_text, keyboard_manager.get_confirmation_menu("clear_memory", "confirm_clear_memory"))
-
-            elif callback_data == "confirm_clear_memory":
-                if memory_manager.clear_user_memory(user_id):
-                    success_text = ("🧠 <b>Память очищена!</b>\n\n"
-                                  "✅ История нашего разговора удалена\n"
-                                  "🔄 Теперь мы можем начать с чистого листа!\n\n"
-                                  "Используй /start для главного меню")
-                    await self._safe_edit_message(callback, success_text, keyboard_manager.get_main_menu())
-                else:
-                    await self._safe_edit_message(callback, "❌ Не удалось очистить память", keyboard_manager.get_main_menu())
-
-            elif callback_data == "help":
-                current_persona = persona_manager.get_current_persona()
-                available_commands = persona_manager.get_available_commands()
-
-                help_text = (
-                    "📚 <b>Справка по использованию</b>\n\n"
-                    f"🎭 <b>Текущий режим:</b> {current_persona.name}\n\n"
-                    "<b>🎮 Кнопки:</b>\n"
-                    "• Режимы общения - выбор стиля разговора\n"
-                    "• Игры - просто нажимай и играй!\n"
-                    "• Инструменты - калькулятор, погода, перевод\n\n"
-                    "<b>🎯 Удобство:</b>\n"
-                    "• В играх просто пиши ответы (числа, слова)\n"
-                    "• Для общения просто пиши сообщения\n"
-                    "• Все интуитивно и без лишних команд!\n\n"
-                    "<b>🎮 Игры без команд:</b>\n"
-                    "• Угадай число - просто пиши числа\n"
-                    "• Викторина - пиши номер ответа (1-4)\n"
-                    "• КНБ - пиши: камень, ножницы, бумага\n"
-                    "• Волшебный шар - просто задай вопрос\n\n"
-                    "🤖 <i>Создан Javohir Zokirjonov</i>"
-                )
+        return answered
+
+    async def _cb_dice_manual_throw(self, callback: types.CallbackQuery, arg: str):
+        """Ручной бросок кубика пользователем."""
+        user_id = callback.from_user.id
+
+        # Извлекаем значение броска бота
+        try:
+            bot_dice = int(arg)
+        except ValueError:
+            await callback.answer(_ERR_GAME_DATA)
+            return True
+
+        # Просим пользователя отправить эмодзи вручную
+        manual_text = "🎲 <b>Отправь эмодзи вручную!</b>\n\n" \
+                     f"🤖 <b>Мой бросок:</b> {_DICE_FACES.get(bot_dice, '🎲')} <b>({bot_dice})</b>\n\n" \
+                     "🎯 <b>Отправь эмодзи 🎲 в чат для броска!</b>\n\n" \
+                     "Жду твой бросок..."
+
+        # Сохраняем бросок бота
+        memory_manager.set_user_active_game(user_id, "dice_waiting", {"bot_dice": bot_dice})
+
+        return await self._safe_edit_message(callback, manual_text)
 
-                await self._safe_edit_message(callback, help_text, keyboard_manager.get_main_menu())
+    async def _cb_dice_throw_again(self, callback: types.CallbackQuery):
+        """Повтор игры в кости."""
+        user_id = callback.from_user.id
 
-            elif callback_data == "cancel":
-                await self._safe_edit_message(callback, "❌ Действие отменено", keyboard_manager.get_main_menu())
+        # Повторяем игру - бот бросает настоящий кубик
+        return await self._bot_throw_real_dice(callback, user_id)
 
-            # Обработка областей Узбекистана для погоды
-            elif callback_data.startswith("weather_"):
-                await self._handle_weather_region_callback(callback, callback_data)
+    async def _cb_dice_stats(self, callback: types.CallbackQuery):
+        """Статистика игр в кости."""
+        user_id = callback.from_user.id
 
-            # Обработка выбора языков для перевода
-            elif callback_data.startswith("lang_"):
-                await self._handle_translation_language_callback(callback, callback_data)
+        # Показываем статистику игр в кости
+        stats = await self._cached_game_data((user_id, "dice_stats"), game_service.get_dice_stats, user_id)
 
-            # Быстрый доступ к меню
-            elif callback_data == "show_main_menu":
-                current_persona = persona_manager.get_current_persona()
-                is_admin = callback.from_user.id == config.ADMIN_USER_ID
-                menu_text = (
-                    "🤖 <b>Главное меню</b>\n\n"
-                    f"🎭 <b>Текущий режим:</b> {current_persona.name}\n\n"
-                    "🎮 <b>Выбери, чем займемся:</b>"
+        if stats['total_games'] == 0:
+            stats_text = "📊 <b>Статистика игр в кости</b>\n\n" \
+                       "🎲 Ты еще не играл в кости!\n" \
+                       "🪨 Начни игру, чтобы увидеть статистику."
+        else:
+            # Эмодзи для результатов
+            trophy = "🏆" if stats['win_rate'] >= 60 else "🎯" if stats['win_rate'] >= 40 else "💪"
+
+            stats_text = f"📊 <b>Статистика игр в кости</b>\n\n" \
+                       f"🎲 <b>Всего игр:</b> {stats['total_games']}\n" \
+                       f"🏆 <b>Побед:</b> {stats['user_wins']}\n" \
+                       f"😢 <b>Поражений:</b> {stats['bot_wins']}\n" \
+                       f"🤝 <b>Ничьих:</b> {stats['draws']}\n" \
+                       f"{trophy} <b>Процент побед:</b> {stats['win_rate']}%\n\n" \
+                       f"📈 <b>Средний бросок:</b>\n" \
+                       f"🎯 Ты: {stats['user_avg_dice']}\n" \
+                       f"🤖 Бот: {stats['bot_avg_dice']}\n\n"
+
+            # Добавляем любимые числа
+            if stats['user_favorite_numbers']:
+                favorites = stats['user_favorite_numbers'].most_common(3)
+                stats_text += "<b>Твои любимые числа:</b>\n" + "".join(
+                    f"{_DICE_FACES.get(num, '🎲')} {num}: {count} раз\n"
+                    for num, count in favorites
                 )
-                await self._safe_edit_message(callback, menu_text, keyboard_manager.get_main_menu(is_admin))
 
-            # Админ-панель
-            elif callback_data == "admin_panel":
-                if callback.from_user.id == config.ADMIN_USER_ID:
-                    admin_text = "👑 <b>Админ-панель</b>\n\nВыберите действие для управления ботом:"
-                    await self._safe_edit_message(callback, admin_text, keyboard_manager.get_admin_menu())
-                else:
-                    await callback.answer("❌ У вас нет доступа к админ-панели")
+        return await self._safe_edit_message(callback, stats_text, keyboard_manager.get_dice_stats_menu())
+
+    async def _cb_dice_history(self, callback: types.CallbackQuery):
+        """История игр в кости."""
+        user_id = callback.from_user.id
+
+        # Показываем историю последних игр в кости
+        history = await self._cached_game_data((user_id, "dice_history", 10), game_service.get_dice_history, user_id, limit=10)
+
+        if not history:
+            history_text = "📚 <b>История игр в кости</b>\n\n" \
+                         "🎲 Ты еще не играл в кости!\n" \
+                         "🪨 Начни игру, чтобы создать историю."
+        else:
+            history_text = f"📚 <b>Последние {len(history)} игр в кости</b>\n\n" + "".join(
+                f"{i}. {_DICE_FACES.get(game.get('user_dice', 0), '🎲')} vs "
+                f"{_DICE_FACES.get(game.get('bot_dice', 0), '🎲')} {_RESULT_EMOJI.get(game['result'], '❓')}"
+                f"{_time_suffix(game.get('timestamp'))}\n"
+                for i, game in enumerate(history, 1)
+            )
+
+        return await self._safe_edit_message(callback, history_text, keyboard_manager.get_dice_history_menu())
+
+    async def _cb_game_guess(self, callback: types.CallbackQuery):
+        """Выбор сложности игры угадай число."""
+        new_text = "🔢 <b>Угадай число</b>\n\nВыбери сложность:"
+        return await self._safe_edit_message(callback, new_text, keyboard_manager.get_guess_difficulty_menu())
+
+    async def _cb_guess_difficulty(self, callback: types.CallbackQuery, arg: str):
+        """Начало игры угадай число с выбранной сложностью."""
+        user_id = callback.from_user.id
+
+        difficulty = arg
+        message_text, target_number = game_service.guess_number_game(difficulty)
+
+        # Устанавливаем активную игру и сохраняем данные
+        memory_manager.set_user_active_game(user_id, "guess_number", {
+            'target_number': target_number,
+            'difficulty': difficulty
+        })
+
+        result_text = f"🎮 {message_text}\n\n🎯 <b>Просто напиши число!</b> (без команд)"
+        return await self._safe_edit_message(callback, result_text, keyboard_manager.get_games_menu())
+
+    async def _cb_game_quiz(self, callback: types.CallbackQuery):
+        """Меню настроек викторины."""
+        user_id = callback.from_user.id
+
+        # Показываем меню настроек викторины
+        settings_text = _QUIZ_SETTINGS_TEXT
+
+        # Инициализируем настройки викторины по умолчанию
+        memory_manager.set_user_active_game(user_id, "quiz_setup", {
+            'industry': 'случайная',
+            'question_count': 10,
+            'current_question': 0,
+            'correct_answers': 0,
+            'total_questions': 0,
+            'questions': [],
+            'start_time': None
+        })
+
+        return await self._safe_edit_message(callback, settings_text, keyboard_manager.get_quiz_settings_menu())
+
+    async def _cb_game_ball(self, callback: types.CallbackQuery):
+        """Запуск волшебного шара."""
+        user_id = callback.from_user.id
+
+        # Устанавливаем активную игру волшебный шар
+        memory_manager.set_user_active_game(user_id, "magic_ball")
 
-            elif callback_data == "admin_main":
-                if callback.from_user.id == config.ADMIN_USER_ID:
-                    admin_text = "👑 <b>Админ-панель</b>\n\nВыберите действие для управления ботом:"
-                    await self._safe_edit_message(callback, admin_text, keyboard_manager.get_admin_menu())
+        ball_text = "🎱 <b>Волшебный шар</b>\n\n🎯 <b>Просто задай вопрос!</b>\nНапример: 'Будет ли завтра дождь?' или 'Стоит ли мне учиться?'"
+        return await self._safe_edit_message(callback, ball_text, keyboard_manager.get_games_menu())
+
+    async def _cb_quiz_answer(self, callback: types.CallbackQuery, arg: str):
+        """Ответ на вопрос викторины."""
+        user_id = callback.from_user.id
+
+        # Обработка ответа на викторину
+        user_answer = arg  # Номер ответа (1, 2, 3, 4)
+        quiz_session = memory_manager.get_user_game_data(user_id)
+
+        if quiz_session and quiz_session.get('current_question') is not None:
+            current_q = quiz_session['current_question']
+            questions = quiz_session.get('questions', [])
+
+            if current_q < len(questions):
+                question_data = questions[current_q]
+                options = question_data['options']
+                correct_answer = int(question_data['correct_answer'])  # В старых сессиях номер хранился строкой
+
+                # Проверяем ответ
+                is_correct = user_answer == str(correct_answer)
+
+                if is_correct:
+                    result_emoji = "✅"
+                    result_text = "Правильно!"
                 else:
-                    await callback.answer("❌ У вас нет доступа к админ-панели")
+                    result_emoji = "❌"
+                    result_text = f"Неправильно!\n\n💡 Правильный ответ: {options[correct_answer - 1]}"
+
+                # Обновляем сессию одной записью
+                def record_answer(session):
+                    if is_correct:
+                        session['correct_answers'] += 1
+                    session['current_question'] += 1
+
+                quiz_session = memory_manager.mutate_user_game_data(user_id, record_answer)
+
+                # Показываем результат и переходим к следующему вопросу или завершаем
+                if quiz_session['current_question'] >= quiz_session['total_questions']:
+                    # Викторина завершена - показываем финальные результаты
+                    total_questions = quiz_session['total_questions']
+                    correct_answers = quiz_session['correct_answers']
+                    percentage = correct_answers * 100 / total_questions if total_questions else 0.0
+                    grade = _quiz_grade(percentage)[0]
+
+                    final_text = f"🏁 <b>Викторина завершена!</b>\n\n" \
+                               f"📊 <b>Результаты:</b>\n" \
+                               f"✅ Правильных ответов: <b>{correct_answers}/{total_questions}</b>\n" \
+                               f"📈 Процент правильных: <b>{percentage:.1f}%</b>\n\n" \
+                               f"🎉 <b>{grade}</b>\n\n" \
+                               f"🎮 Хочешь сыграть еще раз?"
+
+                    answered = await self._safe_edit_message(callback, final_text, self._menu_button)
+
+                    # Очищаем викторину
+                    memory_manager.clear_user_active_game(user_id)
 
-            elif callback_data.startswith("admin_"):
-                if callback.from_user.id == config.ADMIN_USER_ID:
-                    await self._handle_admin_callback(callback, callback_data)
+                    # Логируем статистику в фоне
+                    self._queue_db_write(user_id, None, "total_quiz_games")
+                    return answered
                 else:
-                    await callback.answer("❌ У вас нет доступа к админ-панели")
+                    # Показываем результат и генерируем следующий вопрос через задержку
+                    # Сначала показываем результат
+                    result_display_text = f"{result_emoji} <b>{result_text}</b>\n\n⏳ <i>Загружаем следующий вопрос...</i>"
+
+                    # Обновляем сообщение с результатом
+                    answered = await self._safe_edit_message(callback, result_display_text, None)
+
+                    # Готовим следующий вопрос, пока виден результат (не меньше секунды)
+                    await asyncio.gather(self._prepare_next_quiz_question(user_id), asyncio.sleep(1.0))
 
-            # Неизвестная callback
+                    # Показываем следующий вопрос
+                    return await self._show_next_quiz_question(callback, answered)
             else:
-                await callback.answer("❓ Неизвестная команда")
+                await callback.answer("❌ Ошибка: вопрос не найден")
+                return True
+        else:
+            await callback.answer(_ERR_QUIZ_INACTIVE)
+            return True
 
-            # Отвечаем на callback query
-            await callback.answer()
+    async def _cb_quiz_hint(self, callback: types.CallbackQuery):
+        """Подсказка в викторине."""
+        user_id = callback.from_user.id
 
-        except Exception as e:
-            log_error(f"Ошибка при обработке callback {callback_data}: {str(e)}", user_id, e)
-            await callback.answer("❌ Произошла ошибка")
+        # Показываем подсказку для викторины
+        quiz_session = memory_manager.get_user_game_data(user_id)
+
+        if not quiz_session or quiz_session.get('current_question') is None:
+            await callback.answer(_ERR_QUIZ_INACTIVE)
+            return True
+
+        current_q = quiz_session['current_question']
+        questions = quiz_session.get('questions', [])
+        total_questions = quiz_session.get('total_questions', 0)
+
+        # Лимит подсказок считается при старте викторины
+        max_hints = quiz_session.get('max_hints')
+        if max_hints is None:
+            max_hints = _quiz_max_hints(total_questions)
+        used_hints = quiz_session.get('used_hints', 0)
+
+        if max_hints <= 0:
+            await callback.answer(f"❌ В викторине на {total_questions} вопросов подсказки недоступны!")
+            return True
+
+        if used_hints >= max_hints:
+            await callback.answer(f"❌ Все подсказки использованы! ({used_hints}/{max_hints})")
+            return True
+
+        if current_q >= len(questions):
+            await callback.answer("❌ Вопрос недоступен")
+            return True
+
+        # Получаем текущий вопрос
+        question_data = questions[current_q]
+        question = question_data.get('question', '')
+        hint = question_data.get('hint', 'Подсказка недоступна')
+        options = question_data.get('options', [])
+
+        if not question or not hint:
+            await callback.answer("❌ Подсказка недоступна для этого вопроса")
+            return True
+
+        # Увеличиваем счетчик использованных подсказок
+        memory_manager.mutate_user_game_data(user_id, lambda session: session.update(used_hints=used_hints + 1))
+
+        remaining_hints = max_hints - (used_hints + 1)
+
+        # Пока подсказки остаются, показываем подсказку всплывающим окном без правки сообщения
+        alert_text = f"💡 Подсказка: {hint}\n\nОсталось подсказок: {remaining_hints}"
+        if remaining_hints > 0 and len(alert_text) <= _CALLBACK_ALERT_LIMIT:
+            await callback.answer(alert_text, show_alert=True)
+            return True
+
+        # Последняя подсказка (или слишком длинная для окна): перерисовываем вопрос
+        progress_text = f"📊 <b>Вопрос {current_q + 1}/{total_questions}</b>\n💡 <b>Подсказки:</b> {remaining_hints} осталось\n\n"
+        hint_text = f"❓ {question}\n\n💡 <b>Подсказка:</b> {hint}\n\n🎯 <b>Выбери правильный ответ:</b>"
+
+        combined_text = progress_text + hint_text
+
+        # Обновляем сообщение с подсказкой
+        if not await self._safe_edit_message(callback, combined_text, keyboard_manager.get_quiz_answers_menu(options, total_questions, used_hints + 1)):
+            await callback.answer(f"💡 Подсказка использована! Осталось: {remaining_hints}")
+        return True
+
+    async def _cb_quiz_settings(self, callback: types.CallbackQuery):
+        """Возврат к настройкам викторины."""
+        # Возврат к настройкам викторины
+        settings_text = _QUIZ_SETTINGS_TEXT
 
-    async def _handle_weather_region_callback(self, callback: types.CallbackQuery, callback_data: str):
-        """Обработка выбора области Узбекистана для погоды."""
+        return await self._safe_edit_message(callback, settings_text, keyboard_manager.get_quiz_settings_menu())
+
+    async def _cb_quiz_select_industry(self, callback: types.CallbackQuery):
+        """Меню выбора отрасли викторины."""
+        # Выбор отрасли
+        industry_text = _QUIZ_INDUSTRY_TEXT
+
+        return await self._safe_edit_message(callback, industry_text, keyboard_manager.get_quiz_industry_menu())
+
+    async def _cb_quiz_select_count(self, callback: types.CallbackQuery):
+        """Меню выбора количества вопросов."""
+        # Выбор количества вопросов
+        count_text = _QUIZ_COUNT_TEXT
+
+        return await self._safe_edit_message(callback, count_text, keyboard_manager.get_quiz_count_menu())
+
+    async def _cb_quiz_industry(self, callback: types.CallbackQuery, arg: str):
+        """Выбор отрасли викторины."""
         user_id = callback.from_user.id
 
-        # Словарь соответствия callback_data и названий городов/областей
-        region_map = {
-            "weather_tashkent": "Ташкент",
-            "weather_andijan": "Андижан",
-            "weather_bukhara": "Бухара",
-            "weather_jizzakh": "Джизак",
-            "weather_karakalpakstan": "Нукус",  # Столица Каракалпакстана
-            "weather_kashkadarya": "Карши",
-            "weather_namangan": "Наманган",
-            "weather_navoi": "Навои",
-            "weather_samarkand": "Самарканд",
-            "weather_surkhondarya": "Термез",
-            "weather_syrdarya": "Гулистан",
-            "weather_tashkent_region": "Чирчик",  # Крупный город Ташкентской области
-            "weather_fergana": "Фергана",
-            "weather_khorezm": "Ургенч"
-        }
+        # Выбор отрасли
+        industry = arg
+        game_data = memory_manager.get_user_game_data(user_id)
 
-        region_name = region_map.get(callback_data, callback_data.replace("weather_", "").title())
+        if game_data:
+            game_data['industry'] = industry
+            memory_manager.update_user_game_data(user_id, "quiz_setup", game_data)
 
-        # Получаем погоду
-        weather_info = weather_service.get_weather(region_name)
 
-        if weather_info:
-            # Показываем погоду и возвращаемся к меню областей
-            weather_text = f"🌤️ <b>Погода в {region_name}</b>\n\n{weather_info}\n\nВыберите другую область:"
-            await self._safe_edit_message(callback, weather_text, keyboard_manager.get_uzbekistan_weather_menu())
-            log_info(f"Показана погода для {region_name}", user_id)
+            selected_name = _INDUSTRY_NAMES.get(industry, industry.capitalize())
+
+            settings_text = f"✅ <b>Отрасль выбрана:</b> {selected_name}\n\n" \
+                           "🎯 Выберите остальные параметры или начните игру!"
+
+            return await self._safe_edit_message(callback, settings_text, keyboard_manager.get_quiz_settings_menu())
+
+    async def _cb_quiz_count(self, callback: types.CallbackQuery, arg: str):
+        """Выбор количества вопросов викторины."""
+        user_id = callback.from_user.id
+
+        # Выбор количества вопросов
+        if arg == "custom":
+            # Запрос пользовательского количества
+            custom_text = "✏️ <b>Введите количество вопросов</b>\n\n" \
+                         "📝 <b>Правила:</b>\n" \
+                         "• Минимум: 1 вопрос\n" \
+                         "• Максимум: 50 вопросов\n" \
+                         "• Только цифры\n\n" \
+                         "🎯 <b>Пример:</b> введите число от 1 до 50"
+
+            memory_manager.set_user_active_game(user_id, "quiz_custom_count", {})
+            return await self._safe_edit_message(callback, custom_text, keyboard_manager.get_games_menu())
+
+        count = int(arg)
+        game_data = memory_manager.get_user_game_data(user_id)
+
+        if game_data:
+            game_data['question_count'] = count
+            memory_manager.update_user_game_data(user_id, "quiz_setup", game_data)
+
+            settings_text = f"✅ <b>Количество вопросов:</b> {count}\n\n" \
+                           "🎯 Выберите остальные параметры или начните игру!"
+
+            return await self._safe_edit_message(callback, settings_text, keyboard_manager.get_quiz_settings_menu())
+
+    async def _cb_quiz_start(self, callback: types.CallbackQuery):
+        """Начало викторины."""
+        user_id = callback.from_user.id
+
+        # Начало викторины
+        game_data = memory_manager.get_user_game_data(user_id)
+
+        if game_data:
+            # Инициализируем викторину
+            industry = game_data.get('industry', 'случайная')
+            question_count = game_data.get('question_count', 10)
+
+            # Создаем сессию викторины
+            started_at = time.time()
+            quiz_session = {
+                'industry': industry,
+                'question_count': question_count,
+                'current_question': 0,
+                'correct_answers': 0,
+                'total_questions': question_count,
+                'questions': [],
+                'used_hints': 0,  # Счетчик использованных подсказок
+                'max_hints': _quiz_max_hints(question_count),
+                'start_time': started_at,
+                'question_start_time': started_at
+            }
+
+            memory_manager.set_user_active_game(user_id, "quiz_active", quiz_session)
+
+            # Показываем первый вопрос
+            return await self._show_next_quiz_question(callback)
         else:
-            # Ошибка получения погоды
-            error_text = f"❌ Не удалось получить погоду для {region_name}.\n\nПопробуйте выбрать другую область:"
-            await self._safe_edit_message(callback, error_text, keyboard_manager.get_uzbekistan_weather_menu())
-            log_error(f"Ошибка получения погоды для {region_name}", user_id)
+            await callback.answer("❌ Ошибка настройки викторины")
+            return True
 
-    async def _handle_translation_language_callback(self, callback: types.CallbackQuery, callback_data: str):
-        """Обработка выбора языка для перевода."""
+    async def _cb_quiz_finish(self, callback: types.CallbackQuery):
+        """Принудительное завершение викторины."""
         user_id = callback.from_user.id
 
-        # Словарь соответствия callback_data и кодов языков
-        lang_map = {
-            "lang_uz": "uz",
-            "lang_ru": "ru",
-            "lang_en": "en",
-            "lang_es": "es",
-            "lang_fr": "fr",
-            "lang_de": "de",
-            "lang_it": "it",
-            "lang_pt": "pt",
-            "lang_zh": "zh",
-            "lang_ja": "ja",
-            "lang_ko": "ko"
-        }
+        # Принудительное завершение викторины
+        quiz_session = memory_manager.get_user_game_data(user_id)
+        if quiz_session:
+            await self._finish_quiz(callback, quiz_session)
+        else:
+            await callback.answer("❌ Викторина не найдена")
+            return True
 
-        # Словарь соответствия кодов языков и названий
-        lang_names = {
-            "uz": "🇺🇿 узбекский",
-            "ru": "🇷🇺 русский",
-            "en": "🇺🇸 английский",
-            "es": "🇪🇸 испанский",
-            "fr": "🇫🇷 французский",
-            "de": "🇩🇪 немецкий",
-            "it": "🇮🇹 итальянский",
-            "pt": "🇵🇹 португальский",
-            "zh": "🇨🇳 китайский",
-            "ja": "🇯🇵 японский",
-            "ko": "🇰🇷 корейский"
-        }
+    async def _cb_tool_calc(self, callback: types.CallbackQuery):
+        """Справка по калькулятору."""
+        calc_text = _CALC_TEXT
+        return await self._safe_edit_message(callback, calc_text, keyboard_manager.get_tools_menu())
 
-        target_lang = lang_map.get(callback_data)
-        lang_name = lang_names.get(target_lang, callback_data.replace("lang_", "").title())
+    async def _cb_tool_weather(self, callback: types.CallbackQuery):
+        """Меню выбора области для погоды."""
+        weather_text = "🌤️ <b>Выберите область Узбекистана</b>\n\nВыберите область для получения прогноза погоды:"
+        return await self._safe_edit_message(callback, weather_text, keyboard_manager.get_uzbekistan_weather_menu())
 
-        if target_lang:
-            # Сохраняем выбранный язык в памяти пользователя
-            memory_manager.set_user_active_game(user_id, f"translate_{target_lang}", {})
+    async def _cb_tool_translate(self, callback: types.CallbackQuery):
+        """Меню выбора языка перевода."""
+        translate_text = "🌐 <b>Выберите язык для перевода</b>\n\nВыберите целевой язык и затем введите текст для перевода:"
+        return await self._safe_edit_message(callback, translate_text, keyboard_manager.get_translation_languages_menu())
 
-            # Показываем сообщение о выборе языка
-            translate_text = f"🌐 <b>Выбран язык:</b> {lang_name}\n\n<i>Теперь просто введите текст для перевода!</i>\n\nПример: Привет мир"
-            await self._safe_edit_message(callback, translate_text, keyboard_manager.get_translation_languages_menu())
+    async def _cb_fun_joke(self, callback: types.CallbackQuery):
+        """Случайная шутка."""
+        return await self._edit_with_fresh_fun(callback, fun_service.get_random_joke, "🤣 <b>Шутка:</b>\n\n{}")
+
+    async def _cb_fun_quote(self, callback: types.CallbackQuery):
+        """Мотивационная цитата."""
+        return await self._edit_with_fresh_fun(callback, fun_service.get_motivational_quote, "💡 <b>Мотивационная цитата:</b>\n\n{}")
 
-            log_info(f"Пользователь {user_id} выбрал язык для перевода: {target_lang}", user_id)
+    async def _cb_fun_fact(self, callback: types.CallbackQuery):
+        """Интересный факт."""
+        return await self._edit_with_fresh_fun(callback, fun_service.get_random_fact)
+
+    async def _edit_with_fresh_fun(self, callback: types.CallbackQuery, producer, template: str = "{}"):
+        """Показывает новый текст развлечения, повторяя генерацию (до 3 раз), если он совпал с текущим."""
+        key = (callback.message.chat.id, callback.message.message_id)
+        markup = keyboard_manager.get_tools_menu()
+        for _ in range(3):
+            text = template.format(await self._gemini_call(producer))
+            if self._last_view.get(key) != self._view_digest(text, markup):
+                break
+        return await self._safe_edit_message(callback, text, markup)
+
+    async def _cb_stats(self, callback: types.CallbackQuery):
+        """Статистика общения пользователя."""
+        user_id = callback.from_user.id
+
+        stats = memory_manager.get_user_statistics(user_id)
+        if stats:
+            stats_text = (f"📊 <b>Статистика твоего общения со мной:</b>\n\n"
+                        f"💬 Всего сообщений: {stats['total_messages']}\n"
+                        f"🗂️ Сохранено в памяти: {stats['current_messages']}\n"
+                        f"📅 Начали общаться: {stats['created_at'].strftime('%d.%m.%Y %H:%M')}\n"
+                        f"⏰ Времени прошло: {stats['duration_text']}")
+            return await self._safe_edit_message(callback, stats_text, self._main_menu)
         else:
-            await callback.answer("❌ Ошибка выбора языка")
+            return await self._safe_edit_message(callback, _ERR_STATS_UNAVAILABLE, self._main_menu)
+
+    async def _cb_clear_memory(self, callback: types.CallbackQuery):
+        """Запрос подтверждения очистки памяти."""
+        confirm_text = (
+            "🧠 <b>Очистка памяти</b>\n\n"
+            "⚠️ Это действие удалит всю историю нашего разговора!\n\n"
+            "Ты уверен, что хочешь очистить память?"
+        )
+        return await self._safe_edit_message(callback, confirm_text, keyboard_manager.get_confirmation_menu("clear_memory", "confirm_clear_memory"))
 
-    async def _handle_admin_callback(self, callback: types.CallbackQuery, callback_data: str):
-        """Обработка админских callback'ов."""
+    async def _cb_confirm_clear_memory(self, callback: types.CallbackQuery):
+        """Очистка памяти пользователя."""
         user_id = callback.from_user.id
 
-        try:
-            if callback_data == "admin_users":
-                users_text = "👥 <b>Управление пользователями</b>\n\nВыберите действие:"
-                await self._safe_edit_message(callback, users_text, keyboard_manager.get_admin_users_menu())
+        if memory_manager.clear_user_memory(user_id):
+            success_text = ("🧠 <b>Память очищена!</b>\n\n"
+                          "✅ История нашего разговора удалена\n"
+                          "🔄 Теперь мы можем начать с чистого листа!\n\n"
+                          "Используй /start для главного меню")
+            return await self._safe_edit_message(callback, success_text, self._main_menu)
+        else:
+            return await self._safe_edit_message(callback, _ERR_MEMORY_CLEAR, self._main_menu)
+
+    async def _cb_help(self, callback: types.CallbackQuery):
+        """Справка по кнопкам."""
+        current_persona = persona_manager.get_current_persona()
+        return await self._safe_edit_message(callback, _help_buttons_text(current_persona.name), self._main_menu)
 
-            elif callback_data == "admin_stats":
-                stats_text = "📊 <b>Просмотр статистики</b>\n\nВыберите тип статистики:"
-                await self._safe_edit_message(callback, stats_text, keyboard_manager.get_admin_stats_menu())
+    async def _cb_cancel(self, callback: types.CallbackQuery):
+        """Отмена действия."""
+        return await self._safe_edit_message(callback, "❌ Действие отменено", self._main_menu)
 
-            elif callback_data == "admin_search":
-                search_text = "🔍 <b>Поиск пользователей</b>\n\nВыберите способ поиска:"
-                await self._safe_edit_message(callback, search_text, keyboard_manager.get_admin_search_menu())
+    async def _cb_weather_region(self, callback: types.CallbackQuery, arg: str):
+        """Выбор области для погоды."""
+        return await self._handle_weather_region_callback(callback, arg)
 
-            elif callback_data == "admin_users_list":
-                await self._show_users_list(callback)
+    async def _cb_translation_language(self, callback: types.CallbackQuery, arg: str):
+        """Выбор языка для перевода."""
+        return await self._handle_translation_language_callback(callback, arg)
 
-            elif callback_data == "admin_top_users":
-                await self._show_top_users(callback)
+    async def _cb_show_main_menu(self, callback: types.CallbackQuery):
+        """Быстрый доступ к главному меню."""
+        current_persona = persona_manager.get_current_persona()
+        is_admin = callback.from_user.id == config.ADMIN_USER_ID
+        return await self._safe_edit_message(callback, _main_menu_text(current_persona.name), self._main_menu_admin if is_admin else self._main_menu)
+
+    async def _cb_admin(self, callback: types.CallbackQuery, arg: str):
+        """Действия админ-панели."""
+        if callback.from_user.id == config.ADMIN_USER_ID:
+            return await self._handle_admin_callback(callback, callback.data)
+        await callback.answer("❌ У вас нет доступа к админ-панели")
+        return True
 
-            elif callback_data == "admin_stats_general":
-                await self._show_general_stats(callback)
+    async def _cb_confirm_clear_all(self, callback: types.CallbackQuery):
+        """Подтверждение очистки всей статистики (без префикса "admin_")."""
+        return await self._cb_admin(callback, callback.data)
 
-            elif callback_data == "admin_stats_games":
-                await self._show_games_stats(callback)
+    async def _handle_weather_region_callback(self, callback: types.CallbackQuery, region: str):
+        """Обработка выбора области Узбекистана для погоды (region - суффикс после "weather_")."""
+        user_id = callback.from_user.id
 
-            elif callback_data == "admin_stats_messages":
-                await self._show_messages_stats(callback)
+        region_name = _WEATHER_REGIONS.get(region)
+        if region_name is None:
+            # Все кнопки меню есть в таблице: неизвестная область - ошибка в клавиатуре
+            log_warning("Неизвестная область погоды: %s", region, user_id=user_id)
+            await callback.answer("❌ Неизвестная область")
+            return True
 
-            elif callback_data.startswith("admin_clear_user"):
-                await self._handle_clear_user(callback)
+        # Получаем погоду
+        weather_info = await asyncio.to_thread(weather_service.get_weather, region_name)
+
+        if weather_info:
+            # Показываем погоду и возвращаемся к меню областей
+            weather_text = f"🌤️ <b>Погода в {region_name}</b>\n\n{weather_info}\n\nВыберите другую область:"
+            answered = await self._safe_edit_message(callback, weather_text, keyboard_manager.get_uzbekistan_weather_menu())
+            log_info("Показана погода для %s", region_name, user_id=user_id)
+        else:
+            # Ошибка получения погоды
+            error_text = f"❌ Не удалось получить погоду для {region_name}.\n\nПопробуйте выбрать другую область:"
+            answered = await self._safe_edit_message(callback, error_text, keyboard_manager.get_uzbekistan_weather_menu())
+            log_error("Ошибка получения погоды для %s", region_name, user_id=user_id)
+        return answered
 
-            elif callback_data == "admin_clear_all":
-                await self._handle_clear_all_users(callback)
+    async def _handle_translation_language_callback(self, callback: types.CallbackQuery, lang_code: str):
+        """Обработка выбора языка для перевода (lang_code - суффикс после "lang_")."""
+        user_id = callback.from_user.id
 
-            elif callback_data == "confirm_clear_all":
-                await self._confirm_clear_all_users(callback)
+        if (translate_text := _TRANSLATION_SELECTED_TEXT.get(lang_code)) is not None:
+            # Сохраняем выбранный язык в памяти пользователя
+            memory_manager.set_user_active_game(user_id, f"translate_{lang_code}", {})
 
-            elif callback_data.startswith("admin_ban_user"):
-                await self._handle_ban_user(callback)
+            # Показываем сообщение о выборе языка
+            answered = await self._safe_edit_message(callback, translate_text, keyboard_manager.get_translation_languages_menu())
 
-            elif callback_data.startswith("admin_unban_user"):
-                await self._handle_unban_user(callback)
+            log_info("Выбран язык для перевода: %s", lang_code, user_id=user_id)
+            return answered
+        await callback.answer("❌ Ошибка выбора языка")
+        return True
 
-            else:
-                await callback.answer("❓ Неизвестная админская команда")
+    async def _handle_admin_callback(self, callback: types.CallbackQuery, callback_data: str):
+        """Обработка админских callback'ов (возвращает True, если callback уже отвечен)."""
+        try:
+            if (handler := self._admin_routes.get(callback_data)) is not None:
+                return await handler(callback)
+            await callback.answer("❓ Неизвестная админская команда")
+            return True
 
         except Exception as e:
-            log_error(f"Ошибка при обработке админской команды {callback_data}: {str(e)}")
+            log_error("Ошибка при обработке админской команды %s: %s", callback_data, e)
             await callback.answer("❌ Произошла ошибка при обработке команды")
+            return True
+
+    async def _show_admin_menu(self, text: str, menu_factory, callback: types.CallbackQuery):
+        """Показать подменю админ-панели."""
+        return await self._safe_edit_message(callback, text, menu_factory())
 
     async def _show_users_list(self, callback: types.CallbackQuery):
         """Показать список пользователей."""
         try:
-            users = self.db.get_all_users(limit=20)
+            users = await self._db_call(self.db.get_all_users, limit=20)
 
             if not users:
                 text = "👥 <b>Список пользователей</b>\n\nПользователи не найдены."
             else:
-                text = "👥 <b>Список пользователей</b>\n\n"
+                parts = ["👥 <b>Список пользователей</b>\n\n"]
                 for user in users:
                     status = "🚫" if user.get('banned_until') else "✅"
                     username = f"@{user['username']}" if user['username'] else "без username"
-                    text += f"{status} <code>{user['id']}</code> - {user['first_name']} ({username})\n"
-                    text += f"   📊 Сообщений: {user['total_messages']} | 🎮 Игр: {user['total_games']}\n\n"
+                    parts.append(
+                        f"{status} <code>{user['id']}</code> - {user['first_name']} ({username})\n"
+                        f"   📊 Сообщений: {user['total_messages']} | 🎮 Игр: {user['total_games']}\n\n"
+                    )
 
-                text += f"Всего пользователей: {len(users)}"
+                parts.append(f"Всего пользователей: {len(users)}")
+                text = "".join(parts)
 
-            await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
+            return await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
 
         except Exception as e:
-            log_error(f"Ошибка получения списка пользователей: {str(e)}")
+            log_error("Ошибка получения списка пользователей: %s", e)
             await callback.answer("❌ Ошибка загрузки списка пользователей")
+            return True
 
     async def _show_top_users(self, callback: types.CallbackQuery):
         """Показать топ пользователей по различным метрикам."""
         try:
             # Получить топ пользователей по сообщениям
-            users = self.db.get_all_users(limit=10)
+            users = await self._db_call(self.db.get_all_users, limit=10)
 
             if not users:
                 text = "👑 <b>Топ пользователей</b>\n\nПользователи не найдены."
             else:
-                text = "👑 <b>Топ 10 активных пользователей</b>\n\n"
+                parts = ["👑 <b>Топ 10 активных пользователей</b>\n\n"]
 
-                for i, user in enumerate(users[:10], 1):
-                    medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "⭐"
+                for i, (medal, user) in enumerate(zip(_TOP_MEDALS, users), 1):
                     username = f"@{user['username']}" if user['username'] else "без username"
-                    text += f"{medal} <b>{i}.</b> <code>{user['id']}</code>\n"
-                    text += f"   👤 {user['first_name']} ({username})\n"
-                    text += f"   📊 Сообщений: {user['total_messages']}\n"
-                    text += f"   🎮 Игр: {user['total_games']} | 🌐 Переводов: {user['total_translations']}\n\n"
+                    parts.append(
+                        f"{medal} <b>{i}.</b> <code>{user['id']}</code>\n"
+                        f"   👤 {user['first_name']} ({username})\n"
+                        f"   📊 Сообщений: {user['total_messages']}\n"
+                        f"   🎮 Игр: {user['total_games']} | 🌐 Переводов: {user['total_translations']}\n\n"
+                    )
 
-            await self._safe_edit_message(callback, text, keyboard_manager.get_admin_search_menu())
+                text = "".join(parts)
+
+            return await self._safe_edit_message(callback, text, keyboard_manager.get_admin_search_menu())
 
         except Exception as e:
-            log_error(f"Ошибка получения топ пользователей: {str(e)}")
+            log_error("Ошибка получения топ пользователей: %s", e)
             await callback.answer("❌ Ошибка загрузки топ пользователей")
+            return True
 
     async def _show_general_stats(self, callback: types.CallbackQuery):
         """Показать общую статистику."""
         try:
-            stats = self.db.get_system_stats()
+            stats = await self._db_call(self.db.get_system_stats)
 
-            text = "📊 <b>Общая статистика бота</b>\n\n"
-            text += f"👥 Пользователей: {stats['total_users']}\n"
-            text += f"💬 Сообщений: {stats['total_messages']}\n"
-            text += f"🎮 Игровых сессий: {stats['total_games']}\n\n"
+            text = (
+                "📊 <b>Общая статистика бота</b>\n\n"
+                f"👥 Пользователей: {stats['total_users']}\n"
+                f"💬 Сообщений: {stats['total_messages']}\n"
+                f"🎮 Игровых сессий: {stats['total_games']}\n\n"
+                "<b>Типы сообщений:</b>\n"
+            ) + "".join(f"• {msg_type}: {count}\n" for msg_type, count in stats['message_types'].items())
 
-            text += "<b>Типы сообщений:</b>\n"
-            for msg_type, count in stats['message_types'].items():
-                text += f"• {msg_type}: {count}\n"
-
-            await self._safe_edit_message(callback, text, keyboard_manager.get_admin_stats_menu())
+            return await self._safe_edit_message(callback, text, keyboard_manager.get_admin_stats_menu())
 
         except Exception as e:
-            log_error(f"Ошибка получения общей статистики: {str(e)}")
+            log_error("Ошибка получения общей статистики: %s", e)
             await callback.answer("❌ Ошибка загрузки статистики")
+            return True
 
     async def _show_games_stats(self, callback: types.CallbackQuery):
         """Показать статистику игр."""
         try:
-            text = "🎮 <b>Статистика игр</b>\n\n"
-            text += "Функция находится в разработке...\n"
-            text += "Пока что доступна только общая статистика в разделе '📊 Общая статистика'"
+            text = (
+                "🎮 <b>Статистика игр</b>\n\n"
+                "Функция находится в разработке...\n"
+                "Пока что доступна только общая статистика в разделе '📊 Общая статистика'"
+            )
 
-            await self._safe_edit_message(callback, text, keyboard_manager.get_admin_stats_menu())
+            return await self._safe_edit_message(callback, text, keyboard_manager.get_admin_stats_menu())
 
         except Exception as e:
-            log_error(f"Ошибка получения статистики игр: {str(e)}")
+            log_error("Ошибка получения статистики игр: %s", e)
             await callback.answer("❌ Ошибка загрузки статистики игр")
+            return True
 
     async def _show_messages_stats(self, callback: types.CallbackQuery):
         """Показать статистику сообщений."""
         try:
-            text = "💬 <b>Статистика сообщений</b>\n\n"
-            text += "Функция находится в разработке...\n"
-            text += "Пока что доступна только общая статистика в разделе '📊 Общая статистика'"
+            text = (
+                "💬 <b>Статистика сообщений</b>\n\n"
+                "Функция находится в разработке...\n"
+                "Пока что доступна только общая статистика в разделе '📊 Общая статистика'"
+            )
 
-            await self._safe_edit_message(callback, text, keyboard_manager.get_admin_stats_menu())
+            return await self._safe_edit_message(callback, text, keyboard_manager.get_admin_stats_menu())
 
         except Exception as e:
-            log_error(f"Ошибка получения статистики сообщений: {str(e)}")
+            log_error("Ошибка получения статистики сообщений: %s", e)
             await callback.answer("❌ Ошибка загрузки статистики сообщений")
+            return True
 
     async def _handle_clear_user(self, callback: types.CallbackQuery):
         """Обработка очистки статистики пользователя."""
-        text = "🧹 <b>Очистка статистики пользователя</b>\n\n"
-        text += "Введите ID пользователя, статистику которого нужно очистить:\n\n"
-        text += "<i>Пример: 123456789</i>\n\n"
-        text += "После ввода ID будет предложено подтверждение."
+        text = (
+            "🧹 <b>Очистка статистики пользователя</b>\n\n"
+            "Введите ID пользователя, статистику которого нужно очистить:\n\n"
+            "<i>Пример: 123456789</i>\n\n"
+            "После ввода ID будет предложено подтверждение."
+        )
 
-        await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
+        return await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
 
     async def _handle_clear_all_users(self, callback: types.CallbackQuery):
         """Обработка очистки статистики всех пользователей."""
-        text = "🗑️ <b>Очистка ВСЕЙ статистики</b>\n\n"
-        text += "⚠️ <b>ВНИМАНИЕ!</b> Это действие нельзя отменить!\n\n"
-        text += "Будут удалены:\n"
-        text += "• Вся статистика пользователей\n"
-        text += "• История сообщений\n"
-        text += "• Данные игровых сессий\n"
-        text += "• Настройки пользователей\n\n"
-        text += "Вы действительно хотите продолжить?"
+        text = (
+            "🗑️ <b>Очистка ВСЕЙ статистики</b>\n\n"
+            "⚠️ <b>ВНИМАНИЕ!</b> Это действие нельзя отменить!\n\n"
+            "Будут удалены:\n"
+            "• Вся статистика пользователей\n"
+            "• История сообщений\n"
+            "• Данные игровых сессий\n"
+            "• Настройки пользователей\n\n"
+            "Вы действительно хотите продолжить?"
+        )
 
         confirm_markup = keyboard_manager.get_confirmation_menu("Очистить всю статистику", "confirm_clear_all")
-        await self._safe_edit_message(callback, text, confirm_markup)
+        return await self._safe_edit_message(callback, text, confirm_markup)
 
     async def _handle_ban_user(self, callback: types.CallbackQuery):
         """Обработка бана пользователя."""
-        text = "🚫 <b>Блокировка пользователя</b>\n\n"
-        text += "Введите ID пользователя для блокировки:\n\n"
-        text += "<i>Пример: 123456789</i>\n\n"
-        text += "Пользователь сможет использовать бота только через 24 часа."
+        text = (
+            "🚫 <b>Блокировка пользователя</b>\n\n"
+            "Введите ID пользователя для блокировки:\n\n"
+            "<i>Пример: 123456789</i>\n\n"
+            "Пользователь сможет использовать бота только через 24 часа."
+        )
 
-        await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
+        return await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
 
     async def _handle_unban_user(self, callback: types.CallbackQuery):
         """Обработка разбана пользователя."""
-        text = "✅ <b>Разблокировка пользователя</b>\n\n"
-        text += "Введите ID пользователя для разблокировки:\n\n"
-        text += "<i>Пример: 123456789</i>"
+        text = (
+            "✅ <b>Разблокировка пользователя</b>\n\n"
+            "Введите ID пользователя для разблокировки:\n\n"
+            "<i>Пример: 123456789</i>"
+        )
 
-        await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
+        return await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
 
     async def _confirm_clear_all_users(self, callback: types.CallbackQuery):
         """Подтверждение очистки всех данных пользователей."""
         try:
-            # Выполняем очистку
-            self.db.clear_all_users_stats()
-
-            text = "✅ <b>Очистка завершена!</b>\n\n"
-            text += "🗑️ Статистика всех пользователей была успешно очищена:\n"
-            text += "• Сообщения\n"
-            text += "• Игровые сессии\n"
-            text += "• История переводов\n"
-            text += "• Данные калькулятора\n"
-            text += "• Факты и шутки\n\n"
-            text += "📊 <b>Примечание:</b> Пользователи остаются в системе"
+            # Выполняем очистку и сбрасываем кэш уже удаленной статистики игр
+            await self._db_call(self.db.clear_all_users_stats)
+            self._stats_cache.clear()
+
+            text = (
+                "✅ <b>Очистка завершена!</b>\n\n"
+                "🗑️ Статистика всех пользователей была успешно очищена:\n"
+                "• Сообщения\n"
+                "• Игровые сессии\n"
+                "• История переводов\n"
+                "• Данные калькулятора\n"
+                "• Факты и шутки\n\n"
+                "📊 <b>Примечание:</b> Пользователи остаются в системе"
+            )
 
-            await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
+            return await self._safe_edit_message(callback, text, keyboard_manager.get_admin_users_menu())
 
         except Exception as e:
-            log_error(f"Ошибка при очистке всех данных: {str(e)}")
-            error_text = "❌ <b>Ошибка при очистке данных</b>\n\n"
-            error_text += f"Произошла ошибка: {str(e)}\n\n"
-            error_text += "Попробуйте еще раз или обратитесь к разработчику"
+            log_error("Ошибка при очистке всех данных: %s", e)
+            error_text = (
+                "❌ <b>Ошибка при очистке данных</b>\n\n"
+                f"Произошла ошибка: {str(e)}\n\n"
+                "Попробуйте еще раз или обратитесь к разработчику"
+            )
 
-            await self._safe_edit_message(callback, error_text, keyboard_manager.get_admin_users_menu())
+            return await self._safe_edit_message(callback, error_text, keyboard_manager.get_admin_users_menu())
 
-    def _is_same_markup(self, markup1, markup2) -> bool:
-        """Проверяет, одинаковые ли клавиатуры."""
-        if not markup1 or not markup2:
-            return False
-        try:
-            return (markup1.inline_keyboard == markup2.inline_keyboard)
-        except:
-            return False
+    async def _safe_edit_message(self, callback, text: str, reply_markup=None, answered: bool = False) -> bool:
+        """Безопасное редактирование сообщения с проверкой изменений.
+
+        Правки одного сообщения объединяются: если правка уже выполняется,
+        запоминается только последнее состояние, и оно применяется следующим.
+
+        Возвращает True, если callback уже отвечен (здесь или раньше - answered),
+        чтобы обработчик не отвечал на него повторно.
+        """
+        key = (callback.message.chat.id, callback.message.message_id)
+        pending = self._pending_edits
+        in_flight = key in pending
+
+        # Повторное нажатие на уже показанное: отвечаем сразу, не занимая слот правки чата
+        if not in_flight and self._last_view.get(key) == self._view_digest(text, reply_markup):
+            if not answered:
+                await callback.answer("Уже открыто")
+            return True
 
-    async def _safe_edit_message(self, callback, text: str, reply_markup=None):
-        """Безопасное редактирование сообщения с проверкой изменений."""
+        pending[key] = (text, reply_markup)
+        if in_flight:
+            return answered
+
+        try:
+            while True:
+                await self._wait_edit_slot(key[0])
+                payload = pending[key]
+                answered = await self._apply_edit(callback, *payload, answered=answered)
+
+                # Пока шла правка, могло прийти более новое состояние
+                if pending[key] is payload:
+                    break
+        finally:
+            pending.pop(key, None)
+        return answered
+
+    async def _wait_edit_slot(self, chat_id: int):
+        """Ограничивает частоту правок сообщений лимитами Telegram (на чат и общим)."""
+        # В одном чате - не чаще раза в CHAT_EDIT_INTERVAL; новые нажатия за это время
+        # объединяются в _safe_edit_message, и применяется только последнее состояние.
+        # Слот резервируем до ожидания, чтобы правки разных сообщений чата не заняли его одновременно
+        now = time.monotonic()
+        start = max(now, self._next_chat_edit_at.get(chat_id, 0.0))
+        if len(self._next_chat_edit_at) >= _LAST_VIEW_LIMIT:
+            self._next_chat_edit_at.clear()
+        self._next_chat_edit_at[chat_id] = start + config.CHAT_EDIT_INTERVAL
+        if start > now:
+            await asyncio.sleep(start - now)
+
+        now = time.monotonic()
+        delay = self._next_edit_at - now
+        self._next_edit_at = max(now, self._next_edit_at) + self._edit_interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _view_digest(text: str, reply_markup=None) -> bytes:
+        """Короткий хэш текста и клавиатуры сообщения."""
+        return hashlib.blake2b(f"{text}\0{reply_markup!r}".encode(), digest_size=8).digest()
+
+    def _remember_view(self, key: tuple[int, int], view):
+        """Запоминает, что показано в сообщении (с ограничением размера таблицы)."""
+        if len(self._last_view) >= _LAST_VIEW_LIMIT:
+            self._last_view.clear()
+        self._last_view[key] = view
+
+    async def _apply_edit(self, callback, text: str, reply_markup=None, answered: bool = False) -> bool:
+        """Редактирует сообщение, если текст или клавиатура изменились.
+
+        Возвращает True, если callback отвечен (уведомлением здесь или раньше).
+        """
+        notice = None
         try:
-            current_text = callback.message.text or ""
-            current_markup = callback.message.reply_markup
+            key = (callback.message.chat.id, callback.message.message_id)
+            digest = self._view_digest(text, reply_markup)
 
-            # Проверяем, нужно ли обновлять
-            if current_text != text or not self._is_same_markup(current_markup, reply_markup):
-                await callback.message.edit_text(text, reply_markup=reply_markup)
+            # То же самое мы уже отправляли в это сообщение - запрос к Telegram не нужен
+            if self._last_view.get(key) == digest:
+                notice = "Уже открыто"
             else:
-                await callback.answer("Уже открыто")
+                # Сравнивать HTML с текущим текстом сообщения бессмысленно (там текст без разметки),
+                # поэтому правим сразу, а "не изменилось" узнаем из ответа Telegram
+                try:
+                    await callback.message.edit_text(text, reply_markup=reply_markup)
+                except TelegramBadRequest as e:
+                    if "message is not modified" not in str(e):
+                        raise
+                    notice = "Уже открыто"
+                self._remember_view(key, digest)
         except Exception as e:
-            log_error(f"Ошибка при редактировании сообщения: {str(e)}")
-            await callback.answer("Ошибка обновления")
+            log_error("Ошибка при редактировании сообщения: %s", e)
+            notice = "Ошибка обновления"
+
+        # На callback можно ответить только один раз
+        if notice and not answered:
+            await callback.answer(notice)
+            return True
+        return answered
 
     async def show_main_menu(self, message: types.Message):
         """Показать главное меню с кнопками."""
         user_id = message.from_user.id
-        log_info("Показ главного меню", user_id)
+        log_info("Показ главного меню", user_id=user_id)
 
         current_persona = persona_manager.get_current_persona()
 
-        welcome_text = (
-            "🤖 <b>Главное меню</b>\n\n"
-            f"🎭 <b>Текущий режим:</b> {current_persona.name}\n\n"
-            "🎮 <b>Выбери, чем займемся:</b>"
-        )
-
         await message.reply(
-            welcome_text,
-            reply_markup=keyboard_manager.get_main_menu()
+            _main_menu_text(current_persona.name),
+            reply_markup=self._main_menu
         )
 
     async def handle_text_message(self, message: types.Message):
@@ -1901,7 +2226,7 @@ class AIBot:
         user_id = message.from_user.id
         text = message.text.strip()
 
-        log_info(f"Получено текстовое сообщение: {text[:100]}...", user_id)
+        log_info("Получено текстовое сообщение: %.100s...", text, user_id=user_id)
 
         # Проверяем, не является ли сообщение запросом к инструменту
         tool_response = await self._check_tool_request(user_id, text, message)
@@ -1930,35 +2255,31 @@ class AIBot:
             else:
                 enhanced_text = text
 
-            response = gemini_client.generate_text_response(enhanced_text)
+            response = await self._gemini_call(gemini_client.generate_text_response, enhanced_text)
 
             if response:
                 # Ограничиваем длину ответа (Telegram имеет лимит)
                 if len(response) > 4000:
                     response = response[:4000] + "...\n\n<i>Ответ был обрезан из-за ограничений Telegram</i>"
 
-                await message.reply(response, reply_markup=keyboard_manager.get_menu_button())
-                log_info("Отправлен ответ на текстовое сообщение", user_id)
+                await message.reply(response, reply_markup=self._menu_button)
+                log_info("Отправлен ответ на текстовое сообщение", user_id=user_id)
 
-                # Логируем статистику в БД
-                try:
-                    self.db.log_message(user_id, "text", content=text, response=response)
-                    self.db.update_user_stats(user_id, "total_messages")
-                except Exception as e:
-                    log_error(f"Ошибка логирования сообщения пользователя {user_id}: {str(e)}")
+                # Логируем статистику в БД в фоне
+                self._queue_db_write(user_id, "text", "total_messages", content=text, response=response)
 
                 # Сохраняем ответ ассистента в память
                 memory_manager.add_assistant_message(user_id, response, 'text')
             else:
                 error_msg = "❌ Извините, не удалось обработать ваш запрос. Попробуйте позже."
                 await message.reply(error_msg)
-                log_error("Не удалось сгенерировать ответ на текстовое сообщение", user_id)
+                log_error("Не удалось сгенерировать ответ на текстовое сообщение", user_id=user_id)
 
                 # Сохраняем сообщение об ошибке в память
                 memory_manager.add_assistant_message(user_id, error_msg, 'text')
 
         except Exception as e:
-            log_error(f"Ошибка при обработке текстового сообщения: {str(e)}", user_id, e)
+            log_error("Ошибка при обработке текстового сообщения: %s", e, user_id=user_id, exc=e)
             error_msg = "❌ Произошла ошибка при обработке вашего сообщения."
             await message.reply(error_msg)
 
@@ -1973,161 +2294,173 @@ class AIBot:
             return False
 
         try:
-            if active_game == "guess_number":
-                # Проверяем, является ли текст числом
-                if text.isdigit():
-                    guess = int(text)
-                    game_data = memory_manager.get_user_game_data(user_id)
-                    target_number = game_data.get('target_number')
-
-                    if target_number:
-                        result = game_service.check_guess(guess, target_number)
-
-                        if "Правильно" in result:
-                            # Игра окончена
-                            memory_manager.clear_user_active_game(user_id)
-                            await message.reply(f"🎉 {result}\n\nХочешь сыграть еще раз? Нажми на кнопку '🔢 Угадай число' в меню!", reply_markup=keyboard_manager.get_menu_button())
-
-                            # Логируем статистику в БД
-                            try:
-                                self.db.update_user_stats(user_id, "total_games")
-                            except Exception as e:
-                                log_error(f"Ошибка логирования угадай числа пользователя {user_id}: {str(e)}")
-
-                            return True  # Завершаем обработку игры
-                        else:
-                            await message.reply(f"🎯 {result}", reply_markup=keyboard_manager.get_menu_button())
-                            return True  # Важно вернуть True, чтобы игра продолжилась
-
-            elif active_game == "quiz":
-                # Проверяем, является ли текст числом от 1 до 4
-                if text.isdigit() and 1 <= int(text) <= 4:
-                    game_data = memory_manager.get_user_game_data(user_id)
-                    correct_answer = game_data.get('correct_answer')
-                    question = game_data.get('question', '')
-
-                    if correct_answer:
-                        result = game_service.check_quiz_answer(question, text, correct_answer)
-
-                        if "Правильно" in result:
-                            # Викторина окончена
-                            memory_manager.clear_user_active_game(user_id)
-                            await callback.message.reply(f"🧠 {result}\n\nХочешь ответить на еще один вопрос? Нажми на кнопку '🧠 Викторина' в меню!", reply_markup=keyboard_manager.get_menu_button())
-
-                            # Логируем статистику в БД
-                            try:
-                                self.db.update_user_stats(user_id, "total_quiz_games")
-                            except Exception as e:
-                                log_error(f"Ошибка логирования викторины пользователя {user_id}: {str(e)}")
-
-                            return True  # Завершаем обработку викторины
-                        else:
-                            # Для викторины с кнопками - показываем подсказку и даем выбрать другой ответ
-                            game_data = memory_manager.get_user_game_data(user_id)
-                            hint = game_data.get('hint', 'Подсказка недоступна') if game_data else 'Подсказка недоступна'
-                            options = game_data.get('options', []) if game_data else []
-
-                            if options:
-                                # Если есть данные викторины, показываем кнопки для повторного выбора
-                                wrong_text = f"❌ <b>Неправильно!</b>\n\n💡 <b>Подсказка:</b> {hint}\n\n🎯 <b>Попробуй выбрать другой ответ:</b>"
-                                await message.reply(wrong_text, reply_markup=keyboard_manager.get_quiz_answers_menu(options))
-                            else:
-                                # Fallback для старого формата
-                                await message.reply(f"📚 {result}", reply_markup=keyboard_manager.get_menu_button())
-                        return True
-
-            elif active_game == "dice_waiting":
-                # Если пользователь отправил текст вместо dice эмодзи
-                if text.strip() == "🎲":
-                    await message.reply("🎲 Используй настоящий эмодзи кубика: просто отправь 🎲 (без текста)!", reply_markup=keyboard_manager.get_dice_game_menu())
-                    return True
+            # Сначала точное совпадение типа игры, затем семейство translate_<язык>
+            if (handler := self._game_text_routes.get(active_game)) is not None:
+                return await handler(user_id, text, message)
 
-            elif active_game == "rps":
-                # Проверяем выбор в камень-ножницы-бумага
-                choices = ['камень', 'ножницы', 'бумага']
-                if text.lower() in choices:
-                    result_text, game_data = game_service.play_rps(text.lower(), user_id)
-                    memory_manager.clear_user_active_game(user_id)
+            family, _, target_lang = active_game.partition("_")
+            if family == "translate":
+                return await self._game_text_translate(user_id, text, message, target_lang)
 
-                    # Показываем результат и меню для продолжения
-                    continue_menu = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="🪨 Сыграть еще", callback_data="game_rps")],
-                        [InlineKeyboardButton(text="📊 Статистика", callback_data="rps_stats")],
-                        [InlineKeyboardButton(text="📚 История", callback_data="rps_history")],
-                        [InlineKeyboardButton(text="⬅️ В меню", callback_data="menu_main")]
-                    ])
+        except Exception as e:
+            log_error("Ошибка при обработке ответа на игру %s: %s", active_game, e, user_id=user_id)
+            await message.reply("❌ Произошла ошибка. Попробуй начать заново!")
 
-                    await message.reply(f"🎮 <b>Результат игры:</b>\n\n{result_text}\n\nХочешь сыграть еще?", reply_markup=continue_menu)
-                    return True
+        return False
 
-            elif active_game == "magic_ball":
-                # Любой текст считается вопросом к волшебному шару
-                if len(text.strip()) > 0:
-                    answer = game_service.get_magic_ball_answer(text.strip())
-                    memory_manager.clear_user_active_game(user_id)
-                    await message.reply(f"❓ <b>Твой вопрос:</b> {text}\n\n{answer}\n\nХочешь спросить еще? Нажми '🎱 Волшебный шар'!", reply_markup=keyboard_manager.get_menu_button())
-
-                    # Логируем статистику в БД
-                    try:
-                        self.db.log_message(user_id, "magic_ball", content=text.strip(), response=answer)
-                        # Волшебный шар можно считать как мини-игру, но не добавляем в total_games
-                    except Exception as e:
-                        log_error(f"Ошибка логирования волшебного шара пользователя {user_id}: {str(e)}")
-                    return True
+    async def _game_text_guess_number(self, user_id: int, text: str, message: types.Message) -> bool:
+        """Ответ в игре "Угадай число"."""
+        # Проверяем, является ли текст числом
+        try:
+            guess = int(text)
+        except ValueError:
+            return False
 
-            elif active_game.startswith("translate_"):
-                # Обработка текста для перевода
-                if len(text.strip()) > 0:
-                    target_lang = active_game.replace("translate_", "")
-                    translation = translator.translate_text(text, target_lang)
+        game_data = memory_manager.get_user_game_data(user_id) or {}
+        target_number = game_data.get('target_number')
 
-                    if translation:
-                        memory_manager.clear_user_active_game(user_id)
-                        await message.reply(f"🌐 <b>Перевод на {translator.SUPPORTED_LANGUAGES.get(target_lang, target_lang)}:</b>\n\n{translation}\n\nХочешь перевести еще текст? Выбери язык в меню '🌐 Переводчик'!", reply_markup=keyboard_manager.get_menu_button())
-                        log_info(f"Выполнен перевод на {target_lang}: {text[:50]}...", user_id)
-                    else:
-                        await message.reply("❌ Не удалось выполнить перевод. Попробуйте другой текст.")
-                        log_error(f"Ошибка перевода текста на {target_lang}: {text}", user_id)
-                    return True
+        if target_number:
+            result = game_service.check_guess(guess, target_number)
 
-            elif active_game == "quiz_custom_count":
-                # Обработка пользовательского количества вопросов
-                if len(text.strip()) > 0:
-                    try:
-                        count = int(text.strip())
-                        if 1 <= count <= 50:
-                            game_data = memory_manager.get_user_game_data(user_id)
-                            if game_data:
-                                game_data['question_count'] = count
-                                memory_manager.update_user_game_data(user_id, "quiz_setup", game_data)
-
-                            settings_text = f"✅ <b>Количество вопросов:</b> {count}\n\n🎯 Теперь нажми '🎮 Начать викторину'!"
-                            await message.reply(settings_text, reply_markup=keyboard_manager.get_quiz_settings_menu())
-
-                            memory_manager.clear_user_active_game(user_id)
-                            return True
-                        else:
-                            await message.reply("❌ Количество вопросов должно быть от 1 до 50!")
-                    except ValueError:
-                        await message.reply("❌ Введите число от 1 до 50!")
-                return True
+            if "Правильно" in result:
+                # Игра окончена
+                memory_manager.clear_user_active_game(user_id)
+                await message.reply(f"🎉 {result}\n\nХочешь сыграть еще раз? Нажми на кнопку '🔢 Угадай число' в меню!", reply_markup=self._menu_button)
 
-        except Exception as e:
-            log_error(f"Ошибка при обработке ответа на игру {active_game}: {str(e)}", user_id)
-            await message.reply("❌ Произошла ошибка. Попробуй начать заново!")
+                # Логируем статистику в БД в фоне
+                self._queue_db_write(user_id, None, "total_games")
+
+                return True  # Завершаем обработку игры
+            else:
+                await message.reply(f"🎯 {result}", reply_markup=self._menu_button)
+                return True  # Важно вернуть True, чтобы игра продолжилась
+        return False
+
+    async def _game_text_quiz(self, user_id: int, text: str, message: types.Message) -> bool:
+        """Ответ на вопрос викторины номером варианта."""
+        # Проверяем, является ли текст числом от 1 до 4
+        try:
+            answer_num = int(text)
+        except ValueError:
+            return False
+        if not 1 <= answer_num <= 4:
+            return False
+
+        game_data = memory_manager.get_user_game_data(user_id) or {}
+        correct_answer = game_data.get('correct_answer')
+        question = game_data.get('question', '')
+
+        if correct_answer:
+            result = game_service.check_quiz_answer(question, text, correct_answer)
+
+            if "Правильно" in result:
+                # Викторина окончена
+                memory_manager.clear_user_active_game(user_id)
+                await message.reply(f"🧠 {result}\n\nХочешь ответить на еще один вопрос? Нажми на кнопку '🧠 Викторина' в меню!", reply_markup=self._menu_button)
 
+                # Логируем статистику в БД в фоне
+                self._queue_db_write(user_id, None, "total_quiz_games")
+
+                return True  # Завершаем обработку викторины
+            else:
+                # Для викторины с кнопками - показываем подсказку и даем выбрать другой ответ
+                hint = game_data.get('hint', 'Подсказка недоступна')
+                options = game_data.get('options', [])
+
+                if options:
+                    # Если есть данные викторины, показываем кнопки для повторного выбора
+                    wrong_text = f"❌ <b>Неправильно!</b>\n\n💡 <b>Подсказка:</b> {hint}\n\n🎯 <b>Попробуй выбрать другой ответ:</b>"
+                    await message.reply(wrong_text, reply_markup=keyboard_manager.get_quiz_answers_menu(options))
+                else:
+                    # Fallback для старого формата
+                    await message.reply(f"📚 {result}", reply_markup=self._menu_button)
+            return True
+        return False
+
+    async def _game_text_dice_waiting(self, user_id: int, text: str, message: types.Message) -> bool:
+        """Текст вместо броска в игре в кости."""
+        # Если пользователь отправил текст вместо dice эмодзи
+        if text.strip() == "🎲":
+            await message.reply("🎲 Используй настоящий эмодзи кубика: просто отправь 🎲 (без текста)!", reply_markup=keyboard_manager.get_dice_game_menu())
+            return True
+        return False
+
+    async def _game_text_rps(self, user_id: int, text: str, message: types.Message) -> bool:
+        """Ход в игре "Камень, ножницы, бумага"."""
+        # Проверяем выбор в камень-ножницы-бумага
+        if (choice := text.lower()) in _CHOICE_EMOJI:
+            result_text, game_data = game_service.play_rps(choice, user_id)
+            memory_manager.clear_user_active_game(user_id)
+
+            # Показываем результат и меню для продолжения
+            await message.reply(f"🎮 <b>Результат игры:</b>\n\n{result_text}\n\nХочешь сыграть еще?", reply_markup=keyboard_manager.get_rps_result_menu())
+            return True
+        return False
+
+    async def _game_text_magic_ball(self, user_id: int, text: str, message: types.Message) -> bool:
+        """Вопрос волшебному шару."""
+        # Любой текст считается вопросом к волшебному шару
+        if len(text.strip()) > 0:
+            answer = game_service.get_magic_ball_answer(text.strip())
+            memory_manager.clear_user_active_game(user_id)
+            await message.reply(f"❓ <b>Твой вопрос:</b> {text}\n\n{answer}\n\nХочешь спросить еще? Нажми '🎱 Волшебный шар'!", reply_markup=self._menu_button)
+
+            # Логируем статистику в БД в фоне
+            # Волшебный шар можно считать как мини-игру, но не добавляем в total_games
+            self._queue_db_write(user_id, "magic_ball", content=text.strip(), response=answer)
+            return True
+        return False
+
+    async def _game_text_translate(self, user_id: int, text: str, message: types.Message, target_lang: str) -> bool:
+        """Текст для перевода на выбранный язык."""
+        # Обработка текста для перевода
+        if len(text.strip()) > 0:
+            translation = await asyncio.to_thread(translator.translate_text, text, target_lang)
+
+            if translation:
+                memory_manager.clear_user_active_game(user_id)
+                await message.reply(f"🌐 <b>Перевод на {translator.SUPPORTED_LANGUAGES.get(target_lang, target_lang)}:</b>\n\n{translation}\n\nХочешь перевести еще текст? Выбери язык в меню '🌐 Переводчик'!", reply_markup=self._menu_button)
+                log_info("Выполнен перевод на %s: %.50s...", target_lang, text, user_id=user_id)
+            else:
+                await message.reply("❌ Не удалось выполнить перевод. Попробуйте другой текст.")
+                log_error("Ошибка перевода текста на %s: %s", target_lang, text, user_id=user_id)
+            return True
         return False
 
+    async def _game_text_quiz_custom_count(self, user_id: int, text: str, message: types.Message) -> bool:
+        """Ввод своего количества вопросов викторины."""
+        # Обработка пользовательского количества вопросов
+        if len(text.strip()) > 0:
+            try:
+                count = int(text.strip())
+                if 1 <= count <= 50:
+                    game_data = memory_manager.get_user_game_data(user_id)
+                    if game_data:
+                        game_data['question_count'] = count
+                        memory_manager.update_user_game_data(user_id, "quiz_setup", game_data)
+
+                    settings_text = f"✅ <b>Количество вопросов:</b> {count}\n\n🎯 Теперь нажми '🎮 Начать викторину'!"
+                    await message.reply(settings_text, reply_markup=keyboard_manager.get_quiz_settings_menu())
+
+                    memory_manager.clear_user_active_game(user_id)
+                    return True
+                else:
+                    await message.reply("❌ Количество вопросов должно быть от 1 до 50!")
+            except ValueError:
+                await message.reply("❌ Введите число от 1 до 50!")
+        return True
+
     async def _check_tool_request(self, user_id: int, text: str, message: types.Message) -> bool:
         """Проверяет, является ли сообщение запросом к инструменту (без команды)."""
-        text_lower = text.lower().strip()
+        # Категории всех найденных ключевых слов за один проход
+        text_lower = text.lower()
+        found = {_TOOL_KEYWORDS[keyword] for keyword in _TOOL_KEYWORDS_RE.findall(text_lower)}
 
         try:
             # Проверка на запрос погоды
-            weather_keywords = ['погода', 'погодка', 'какая погода', 'weather', 'температура', 'прогноз']
-            if any(keyword in text_lower for keyword in weather_keywords):
+            if 'weather' in found:
                 # Извлекаем город из текста
-                city = self._extract_city_from_weather_request(text)
+                city = self._extract_city_from_weather_request(text_lower)
                 if city:
                     return await self._process_weather_request(user_id, city, message)
                 else:
@@ -2137,8 +2470,7 @@ class AIBot:
                     return True
 
             # Проверка на запрос перевода
-            translate_keywords = ['переведи', 'перевод', 'translate', 'translation']
-            if any(keyword in text_lower for keyword in translate_keywords):
+            if 'translate' in found:
                 # Извлекаем язык и текст для перевода
                 lang, text_to_translate = self._extract_translation_from_request(text)
                 if lang and text_to_translate:
@@ -2157,26 +2489,22 @@ class AIBot:
                 return await self._process_calc_request(user_id, text, message)
 
             # Проверка на запрос фактов/шуток/цитат
-            fun_keywords = ['факт', 'шутка', 'цитата', 'fact', 'joke', 'quote', 'интересное', 'интересный факт']
-            if any(keyword in text_lower for keyword in fun_keywords):
-                return await self._process_fun_request(user_id, text, message)
+            kind = next((kind for kind in _FUN_REQUESTS if kind in found), None)
+            if kind:
+                return await self._process_fun_request(user_id, kind, message)
 
             return False
 
         except Exception as e:
-            log_error(f"Ошибка при обработке запроса инструмента: {str(e)}", user_id)
+            log_error("Ошибка при обработке запроса инструмента: %s", e, user_id=user_id)
             await message.reply("❌ Произошла ошибка при обработке запроса.")
             return True
 
-    def _extract_city_from_weather_request(self, text: str) -> Optional[str]:
-        """Извлекает название города из запроса погоды."""
-        # Удаляем ключевые слова и оставляем только город
-        text = text.lower()
-        for keyword in ['погода', 'погодка', 'какая погода', 'weather', 'температура', 'прогноз', 'в', 'на', 'во']:
-            text = text.replace(keyword, '')
-
-        # Удаляем лишние пробелы и знаки препинания
-        city = text.strip(' ,.!?').title()
+    def _extract_city_from_weather_request(self, text_lower: str) -> Optional[str]:
+        """Извлекает название города из запроса погоды (текст уже в нижнем регистре)."""
+        # Убираем целые слова запроса (не буквы внутри названия) и знаки препинания
+        words = (word.strip(',.!?') for word in text_lower.split())
+        city = ' '.join(word for word in words if word and word not in _WEATHER_STOPWORDS).title()
 
         if len(city) > 1:
             return city
@@ -2184,40 +2512,32 @@ class AIBot:
 
     async def _process_weather_request(self, user_id: int, city: str, message: types.Message) -> bool:
         """Обрабатывает запрос погоды."""
-        weather_info = weather_service.get_weather(city)
+        weather_info = await asyncio.to_thread(weather_service.get_weather, city)
 
         if weather_info:
-            await message.reply(weather_info, reply_markup=keyboard_manager.get_menu_button())
-            log_info(f"Отправлена погода для города: {city}", user_id)
+            await message.reply(weather_info, reply_markup=self._menu_button)
+            log_info("Отправлена погода для города: %s", city, user_id=user_id)
 
-            # Логируем статистику в БД
-            try:
-                self.db.log_message(user_id, "weather", content=city, response=weather_info)
-                self.db.update_user_stats(user_id, "total_weather_requests")
-            except Exception as e:
-                log_error(f"Ошибка логирования погоды пользователя {user_id}: {str(e)}")
+            # Логируем статистику в БД в фоне
+            self._queue_db_write(user_id, "weather", "total_weather_requests", content=city, response=weather_info)
         else:
             await message.reply(f"❌ Не удалось получить погоду для города '{city}'. Попробуйте другой город.")
-            log_error(f"Не удалось получить погоду для города: {city}", user_id)
+            log_error("Не удалось получить погоду для города: %s", city, user_id=user_id)
 
         return True
 
     def _extract_translation_from_request(self, text: str) -> Tuple[Optional[str], Optional[str]]:
         """Извлекает язык и текст для перевода."""
-        text_lower = text.lower()
-
-        # Ищем паттерн "переведи на [язык] [текст]"
-        import re
-
+        # Паттерны без учета регистра, поэтому текст для перевода сохраняет исходный регистр
         # Русский паттерн
-        ru_match = re.search(r'переведи\s+на\s+(\w+)\s+(.+)', text_lower, re.IGNORECASE)
+        ru_match = _RU_TRANSLATE_RE.search(text)
         if ru_match:
             lang = ru_match.group(1).lower()
             text_to_translate = ru_match.group(2).strip()
             return lang, text_to_translate
 
         # Английский паттерн
-        en_match = re.search(r'translate\s+to\s+(\w+)\s+(.+)', text_lower, re.IGNORECASE)
+        en_match = _EN_TRANSLATE_RE.search(text)
         if en_match:
             lang = en_match.group(1).lower()
             text_to_translate = en_match.group(2).strip()
@@ -2229,113 +2549,69 @@ class AIBot:
         """Обрабатывает запрос перевода."""
         if lang not in translator.SUPPORTED_LANGUAGES:
             await message.reply(f"❌ Неподдерживаемый язык: {lang}\n"
-                              f"Доступные: {', '.join(translator.SUPPORTED_LANGUAGES.keys())}")
+                              f"Доступные: {_SUPPORTED_LANGUAGES_TEXT}")
             return True
 
-        translation = translator.translate_text(text_to_translate, lang)
+        translation = await asyncio.to_thread(translator.translate_text, text_to_translate, lang)
 
         if translation:
-            await message.reply(translation, reply_markup=keyboard_manager.get_menu_button())
-            log_info(f"Переведен текст на {lang}: {text_to_translate[:50]}...", user_id)
+            await message.reply(translation, reply_markup=self._menu_button)
+            log_info("Переведен текст на %s: %.50s...", lang, text_to_translate, user_id=user_id)
 
-            # Логируем статистику в БД
-            try:
-                self.db.log_message(user_id, "translation", content=text_to_translate, response=translation)
-                self.db.update_user_stats(user_id, "total_translations")
-            except Exception as e:
-                log_error(f"Ошибка логирования перевода пользователя {user_id}: {str(e)}")
+            # Логируем статистику в БД в фоне
+            self._queue_db_write(user_id, "translation", "total_translations", content=text_to_translate, response=translation)
         else:
             await message.reply("❌ Не удалось выполнить перевод.")
-            log_error(f"Ошибка перевода текста: {text_to_translate}", user_id)
+            log_error("Ошибка перевода текста: %s", text_to_translate, user_id=user_id)
 
         return True
 
     def _is_math_expression(self, text: str) -> bool:
         """Проверяет, является ли текст математическим выражением."""
-        # Удаляем пробелы
-        text = text.replace(' ', '')
-
-        # Проверяем на наличие цифр и математических операторов
-        has_digits = any(c.isdigit() for c in text)
-        has_operators = any(c in '+-*/^()' for c in text)
-
-        return has_digits and has_operators and len(text) > 1
+        # Один проход: нужны цифра и оператор (а значит, не меньше двух символов кроме пробелов)
+        has_digits = has_operators = False
+        for c in text:
+            if c.isdigit():
+                has_digits = True
+            elif c in _MATH_OPERATORS:
+                has_operators = True
+            else:
+                continue
+            if has_digits and has_operators:
+                return True
+        return False
 
     async def _process_calc_request(self, user_id: int, expression: str, message: types.Message) -> bool:
         """Обрабатывает математический запрос."""
-        result = calculator.calculate(expression)
+        result = await asyncio.to_thread(calculator.evaluate_expression, expression)
 
-        if result:
-            await message.reply(f"🧮 <b>Результат:</b>\n\n{expression} = {result}", reply_markup=keyboard_manager.get_menu_button())
-            log_info(f"Выполнен расчет: {expression} = {result}", user_id)
+        if result is not None:
+            await message.reply(f"🧮 <b>Результат:</b>\n\n{expression} = {result}", reply_markup=self._menu_button)
+            log_info("Выполнен расчет: %s = %s", expression, result, user_id=user_id)
 
-            # Логируем статистику в БД
-            try:
-                self.db.log_message(user_id, "calculator", content=expression, response=str(result))
-                self.db.update_user_stats(user_id, "total_calculations")
-            except Exception as e:
-                log_error(f"Ошибка логирования калькулятора пользователя {user_id}: {str(e)}")
+            # Логируем статистику в БД в фоне
+            self._queue_db_write(user_id, "calculator", "total_calculations", content=expression, response=str(result))
         else:
-            await message.reply("❌ Не удалось вычислить выражение. Попробуйте другое.", reply_markup=keyboard_manager.get_menu_button())
-            log_error(f"Ошибка вычисления: {expression}", user_id)
+            await message.reply("❌ Не удалось вычислить выражение. Попробуйте другое.", reply_markup=self._menu_button)
+            log_error("Ошибка вычисления: %s", expression, user_id=user_id)
 
         return True
 
-    async def _process_fun_request(self, user_id: int, text: str, message: types.Message) -> bool:
-        """Обрабатывает запрос фактов/шуток/цитат."""
-        text_lower = text.lower()
-
-        if 'шутка' in text_lower or 'joke' in text_lower:
-            joke = fun_service.get_random_joke()
-            await message.reply(f"😂 <b>Шутка:</b>\n\n{joke}", reply_markup=keyboard_manager.get_menu_button())
-            log_info("Отправлена шутка", user_id)
-
-            # Логируем статистику в БД
-            try:
-                self.db.log_message(user_id, "joke", response=joke)
-                self.db.update_user_stats(user_id, "total_jokes")
-            except Exception as e:
-                log_error(f"Ошибка логирования шутки пользователя {user_id}: {str(e)}")
-
-        elif 'факт' in text_lower or 'fact' in text_lower:
-            fact = fun_service.get_random_fact()
-            await message.reply(f"🧠 <b>Интересный факт:</b>\n\n{fact}", reply_markup=keyboard_manager.get_menu_button())
-            log_info("Отправлен факт", user_id)
-
-            # Логируем статистику в БД
-            try:
-                self.db.log_message(user_id, "fact", response=fact)
-                self.db.update_user_stats(user_id, "total_facts")
-            except Exception as e:
-                log_error(f"Ошибка логирования факта пользователя {user_id}: {str(e)}")
-
-        elif 'цитата' in text_lower or 'quote' in text_lower:
-            quote = fun_service.get_random_quote()
-            await message.reply(f"💭 <b>Цитата:</b>\n\n{quote}", reply_markup=keyboard_manager.get_menu_button())
-            log_info("Отправлена цитата", user_id)
-
-            # Логируем статистику в БД
-            try:
-                self.db.log_message(user_id, "quote", response=quote)
-                self.db.update_user_stats(user_id, "total_quotes")
-            except Exception as e:
-                log_error(f"Ошибка логирования цитаты пользователя {user_id}: {str(e)}")
-
-        else:
-            # По умолчанию отправляем факт
-            fact = fun_service.get_random_fact()
-            await message.reply(f"🧠 <b>Интересный факт:</b>\n\n{fact}", reply_markup=keyboard_manager.get_menu_button())
-            log_info("Отправлен факт", user_id)
+    async def _process_fun_request(self, user_id: int, kind: str, message: types.Message) -> bool:
+        """Обрабатывает запрос фактов/шуток/цитат (kind - ключ _FUN_REQUESTS)."""
+        producer, template, log_text, message_type, stat_type = _FUN_REQUESTS[kind]
+        content = await self._gemini_call(producer)
+        await message.reply(template.format(content), reply_markup=self._menu_button)
+        log_info(log_text, user_id=user_id)
 
+        # Логируем статистику в БД в фоне
+        self._queue_db_write(user_id, message_type, stat_type, response=content)
         return True
 
     async def handle_photo_message(self, message: types.Message):
         """Обработчик сообщений с изображениями."""
         user_id = message.from_user.id
-        log_info("Получено сообщение с изображением", user_id)
-
-        # Отправляем индикатор "загружает фото"
-        await message.bot.send_chat_action(message.chat.id, "upload_photo")
+        log_info("Получено сообщение с изображением", user_id=user_id)
 
         try:
             # Получаем самое большое изображение
@@ -2343,11 +2619,16 @@ class AIBot:
 
             # Проверяем размер файла
             if photo.file_size > config.MAX_FILE_SIZE:
-                await message.reply("❌ Файл слишком большой. Максимальный размер: 20MB")
+                await message.reply(_ERR_FILE_TOO_LARGE)
                 return
 
+            # Индикатор "загружает фото" и путь к файлу запрашиваем одновременно
+            _, file_info = await asyncio.gather(
+                message.bot.send_chat_action(message.chat.id, "upload_photo"),
+                message.bot.get_file(photo.file_id),
+            )
+
             # Скачиваем изображение
-            file_info = await message.bot.get_file(photo.file_id)
             image_data = await message.bot.download_file(file_info.file_path)
 
             # Анализируем изображение
@@ -2357,79 +2638,84 @@ class AIBot:
             if message.caption:
                 prompt = message.caption
 
-            response = gemini_client.analyze_image(image_data.read(), prompt)
+            # getbuffer() отдает содержимое без копирования (base64 принимает memoryview)
+            response = await self._gemini_call(gemini_client.analyze_image, image_data.getbuffer(), prompt)
 
             if response:
                 await message.reply(response)
-                log_info("Отправлен анализ изображения", user_id)
+                log_info("Отправлен анализ изображения", user_id=user_id)
             else:
                 await message.reply("❌ Не удалось проанализировать изображение. Попробуйте другое фото.")
-                log_error("Не удалось проанализировать изображение", user_id)
+                log_error("Не удалось проанализировать изображение", user_id=user_id)
 
         except Exception as e:
-            log_error(f"Ошибка при обработке изображения: {str(e)}", user_id, e)
+            log_error("Ошибка при обработке изображения: %s", e, user_id=user_id, exc=e)
             await message.reply("❌ Произошла ошибка при обработке изображения.")
 
     async def handle_voice_message(self, message: types.Message):
         """Обработчик голосовых сообщений."""
         user_id = message.from_user.id
-        log_info("Получено голосовое сообщение", user_id)
-
-        # Отправляем индикатор "загружает голосовое сообщение"
-        await message.bot.send_chat_action(message.chat.id, "record_voice")
+        log_info("Получено голосовое сообщение", user_id=user_id)
 
         try:
             # Проверяем размер файла
             if message.voice.file_size > config.MAX_FILE_SIZE:
-                await message.reply("❌ Файл слишком большой. Максимальный размер: 20MB")
+                await message.reply(_ERR_FILE_TOO_LARGE)
                 return
 
+            # Индикатор "записывает голосовое" и путь к файлу запрашиваем одновременно
+            _, file_info = await asyncio.gather(
+                message.bot.send_chat_action(message.chat.id, "record_voice"),
+                message.bot.get_file(message.voice.file_id),
+            )
+
             # Скачиваем голосовое сообщение
-            file_info = await message.bot.get_file(message.voice.file_id)
             audio_data = await message.bot.download_file(file_info.file_path)
 
             # Распознаем текст через Gemini API
-            recognized_text = gemini_client.transcribe_audio_with_gemini(audio_data.read())
+            recognized_text = await self._gemini_call(gemini_client.transcribe_audio_with_gemini, audio_data.getbuffer())
 
             if recognized_text:
-                log_info(f"Распознан текст из голосового через Gemini: {recognized_text[:100]}...", user_id)
+                log_info("Распознан текст из голосового через Gemini: %.100s...", recognized_text, user_id=user_id)
 
-                # Отправляем распознанный текст пользователю
-                await message.reply(f"🎵 <i>Распознанный текст:</i> {recognized_text}")
-
-                # Генерируем ответ через Gemini
-                response = gemini_client.generate_text_response(recognized_text)
+                # Показываем распознанный текст, пока Gemini готовит ответ
+                _, response = await asyncio.gather(
+                    message.reply(f"🎵 <i>Распознанный текст:</i> {recognized_text}"),
+                    self._gemini_call(gemini_client.generate_text_response, recognized_text),
+                )
 
                 if response:
                     await message.reply(response)
-                    log_info("Отправлен ответ на голосовое сообщение", user_id)
+                    log_info("Отправлен ответ на голосовое сообщение", user_id=user_id)
                 else:
-                    await message.reply("❌ Не удалось обработать распознанный текст.")
-                    log_error("Не удалось сгенерировать ответ на голосовое сообщение", user_id)
+                    await message.reply(_ERR_RECOGNIZED_TEXT)
+                    log_error("Не удалось сгенерировать ответ на голосовое сообщение", user_id=user_id)
             else:
                 await message.reply("❌ Не удалось распознать текст в голосовом сообщении. Попробуйте говорить четче или отправьте текстовое сообщение.")
-                log_error("Не удалось распознать текст в голосовом сообщении", user_id)
+                log_error("Не удалось распознать текст в голосовом сообщении", user_id=user_id)
 
         except Exception as e:
-            log_error(f"Ошибка при обработке голосового сообщения: {str(e)}", user_id, e)
+            log_error("Ошибка при обработке голосового сообщения: %s", e, user_id=user_id, exc=e)
             await message.reply("❌ Произошла ошибка при обработке голосового сообщения.")
 
     async def handle_audio_message(self, message: types.Message):
         """Обработчик аудио файлов."""
         user_id = message.from_user.id
-        log_info("Получен аудио файл", user_id)
-
-        # Отправляем индикатор "загружает аудио"
-        await message.bot.send_chat_action(message.chat.id, "upload_voice")
+        log_info("Получен аудио файл", user_id=user_id)
 
         try:
             # Проверяем размер файла
             if message.audio.file_size > config.MAX_FILE_SIZE:
-                await message.reply("❌ Файл слишком большой. Максимальный размер: 20MB")
+                await message.reply(_ERR_FILE_TOO_LARGE)
                 return
 
+            # Индикатор "загружает аудио" и путь к файлу запрашиваем одновременно
+            _, file_info = await asyncio.gather(
+                message.bot.send_chat_action(message.chat.id, "upload_voice"),
+                message.bot.get_file(message.audio.file_id),
+            )
+
             # Скачиваем аудио файл
-            file_info = await message.bot.get_file(message.audio.file_id)
             audio_data = await message.bot.download_file(file_info.file_path)
 
             # Определяем MIME-тип на основе расширения файла
@@ -2443,72 +2729,81 @@ class AIBot:
                     mime_type = "audio/wav"
 
             # Распознаем текст через Gemini API
-            recognized_text = gemini_client.transcribe_audio_with_gemini(audio_data.read(), mime_type)
+            recognized_text = await self._gemini_call(gemini_client.transcribe_audio_with_gemini, audio_data.getbuffer(), mime_type)
 
             if recognized_text:
-                log_info(f"Распознан текст из аудио файла через Gemini: {recognized_text[:100]}...", user_id)
-
-                # Отправляем распознанный текст пользователю
-                await message.reply(f"🎵 <i>Распознанный текст:</i> {recognized_text}")
+                log_info("Распознан текст из аудио файла через Gemini: %.100s...", recognized_text, user_id=user_id)
 
-                # Генерируем ответ через Gemini
-                response = gemini_client.generate_text_response(recognized_text)
+                # Показываем распознанный текст, пока Gemini готовит ответ
+                _, response = await asyncio.gather(
+                    message.reply(f"🎵 <i>Распознанный текст:</i> {recognized_text}"),
+                    self._gemini_call(gemini_client.generate_text_response, recognized_text),
+                )
 
                 if response:
                     await message.reply(response)
-                    log_info("Отправлен ответ на аудио файл", user_id)
+                    log_info("Отправлен ответ на аудио файл", user_id=user_id)
                 else:
-                    await message.reply("❌ Не удалось обработать распознанный текст.")
-                    log_error("Не удалось сгенерировать ответ на аудио файл", user_id)
+                    await message.reply(_ERR_RECOGNIZED_TEXT)
+                    log_error("Не удалось сгенерировать ответ на аудио файл", user_id=user_id)
             else:
                 await message.reply("❌ Не удалось распознать текст в аудио файле. Попробуйте другой формат файла.")
-                log_error("Не удалось распознать текст в аудио файле", user_id)
+                log_error("Не удалось распознать текст в аудио файле", user_id=user_id)
 
         except Exception as e:
-            log_error(f"Ошибка при обработке аудио файла: {str(e)}", user_id, e)
+            log_error("Ошибка при обработке аудио файла: %s", e, user_id=user_id, exc=e)
             await message.reply("❌ Произошла ошибка при обработке аудио файла.")
 
-    async def _show_next_quiz_question(self, callback):
-        """Показывает следующий вопрос викторины."""
-        user_id = callback.from_user.id
+    async def _prepare_next_quiz_question(self, user_id: int) -> bool:
+        """Генерирует текущий вопрос викторины, если его еще нет в сессии."""
         quiz_session = memory_manager.get_user_game_data(user_id)
 
         if not quiz_session or quiz_session.get('current_question') is None:
-            await callback.answer("❌ Викторина не активна")
-            return
+            return False
 
-        current_q = quiz_session['current_question']
-        total_q = quiz_session['total_questions']
+        questions = quiz_session.setdefault('questions', [])
+        if quiz_session['current_question'] < len(questions):
+            return True
+
+        # Генерируем вопрос по выбранной отрасли
         industry = quiz_session.get('industry', 'случайная')
+        if industry == 'случайная':
+            # Выбираем случайную отрасль
+            selected_industry = _RANDOM_QUIZ_INDUSTRIES[self._rng.randrange(len(_RANDOM_QUIZ_INDUSTRIES))]
+        else:
+            selected_industry = industry
 
-        # Генерируем новый вопрос, если его нет в списке
-        if current_q >= len(quiz_session.get('questions', [])):
-            # Генерируем вопрос по выбранной отрасли
-            if industry == 'случайная':
-                # Выбираем случайную отрасль
-                industries = [
-                    "программирование", "искусственный интеллект", "кибербезопасность",
-                    "история", "наука", "география", "искусство", "спорт", "кино",
-                    "литература", "музыка", "философия", "психология", "экономика",
-                    "биология", "физика", "химия", "математика", "медицина"
-                ]
-                selected_industry = random.choice(industries)
-            else:
-                selected_industry = industry
+        # Генерируем вопрос
+        quiz_data = await self._gemini_call(game_service.generate_quiz_question_specific, selected_industry)
 
-            # Генерируем вопрос
-            quiz_data = game_service.generate_quiz_question_specific(selected_industry)
+        if not quiz_data:
+            # Fallback на общий генератор
+            quiz_data = await self._gemini_call(game_service.generate_quiz_question)
 
-            if not quiz_data:
-                # Fallback на общий генератор
-                quiz_data = game_service.generate_quiz_question()
+        if not quiz_data:
+            return False
 
-            if quiz_data:
-                quiz_session['questions'].append(quiz_data)
-                memory_manager.update_user_game_data(user_id, "quiz_active", quiz_session)
-            else:
-                await callback.message.reply("❌ Не удалось сгенерировать вопрос викторины")
-                return
+        # Сохраняется вместе со временем начала вопроса
+        questions.append(quiz_data)
+        return True
+
+    async def _show_next_quiz_question(self, callback, answered: bool = False) -> bool:
+        """Показывает следующий вопрос викторины (возвращает True, если callback уже отвечен)."""
+        user_id = callback.from_user.id
+        quiz_session = memory_manager.get_user_game_data(user_id)
+
+        if not quiz_session or quiz_session.get('current_question') is None:
+            if not answered:
+                await callback.answer(_ERR_QUIZ_INACTIVE)
+            return True
+
+        # Генерируем новый вопрос, если его нет в списке
+        if not await self._prepare_next_quiz_question(user_id):
+            await callback.message.reply("❌ Не удалось сгенерировать вопрос викторины")
+            return answered
+
+        current_q = quiz_session['current_question']
+        total_q = quiz_session['total_questions']
 
         # Получаем текущий вопрос
         question_data = quiz_session['questions'][current_q]
@@ -2519,14 +2814,12 @@ class AIBot:
         progress_text += "🎯 <b>Выбери правильный ответ:</b>"
 
         # Обновляем время начала вопроса
-        quiz_session['question_start_time'] = datetime.now()
-        memory_manager.update_user_game_data(user_id, "quiz_active", quiz_session)
+        memory_manager.mutate_user_game_data(user_id, lambda session: session.update(question_start_time=time.time()))
 
-        # Получаем информацию о подсказках для кнопки
+        # Кнопка подсказки зависит от числа вопросов и использованных подсказок
         used_hints = quiz_session.get('used_hints', 0)
-        total_questions = quiz_session.get('total_questions', 10)
 
-        await self._safe_edit_message(callback, progress_text, keyboard_manager.get_quiz_answers_menu(question_data['options'], total_questions, used_hints))
+        return await self._safe_edit_message(callback, progress_text, keyboard_manager.get_quiz_answers_menu(question_data['options'], total_q, used_hints), answered)
 
     async def _finish_quiz(self, callback, quiz_session):
         """Завершает викторину и показывает результаты."""
@@ -2535,32 +2828,21 @@ class AIBot:
         total = quiz_session.get('total_questions', 0)
         start_time = quiz_session.get('start_time')
 
-        # Вычисляем время прохождения
-        end_time = datetime.now()
+        # Вычисляем время прохождения (сессии до обновления хранят datetime)
+        if isinstance(start_time, datetime):
+            start_time = start_time.timestamp()
         if start_time:
-            duration = end_time - start_time
-            minutes = duration.seconds // 60
-            seconds = duration.seconds % 60
+            elapsed = max(0, int(time.time() - start_time))
+            minutes, seconds = divmod(elapsed, 60)
             time_text = f"{minutes}:{seconds:02d}"
         else:
             time_text = "неизвестно"
 
         # Вычисляем процент правильных ответов
-        percentage = (correct / total * 100) if total > 0 else 0
+        percentage = correct * 100 / total if total else 0.0
 
         # Определяем оценку
-        if percentage >= 90:
-            grade = "🎓 Отлично! Ты эксперт!"
-            emoji = "🏆"
-        elif percentage >= 75:
-            grade = "👍 Хорошо! Продолжай в том же духе!"
-            emoji = "👏"
-        elif percentage >= 50:
-            grade = "🤔 Неплохо! Можно лучше!"
-            emoji = "💪"
-        else:
-            grade = "📚 Нужно подучить материал!"
-            emoji = "📖"
+        _, grade, emoji = _quiz_grade(percentage)
 
         result_text = f"🏁 <b>Викторина завершена!</b>\n\n"
         result_text += f"📊 <b>Результаты:</b>\n"
@@ -2573,22 +2855,70 @@ class AIBot:
         # Очищаем викторину
         memory_manager.clear_user_active_game(user_id)
 
-        # Логируем статистику
-        try:
-            self.db.update_user_stats(user_id, "total_quiz_games")
-        except Exception as e:
-            log_error(f"Ошибка логирования викторины пользователя {user_id}: {str(e)}")
+        # Логируем статистику в фоне
+        self._queue_db_write(user_id, None, "total_quiz_games")
 
-        await callback.message.reply(result_text, reply_markup=keyboard_manager.get_menu_button())
+        await callback.message.reply(result_text, reply_markup=self._menu_button)
 
     async def start_polling(self):
         """Запускает бота в режиме polling."""
         log_info("Запуск бота в режиме polling")
+        # Вебхук, оставшийся от запуска в режиме webhook, блокирует getUpdates (409 Conflict)
+        await self.bot.delete_webhook()
         await self.dp.start_polling(self.bot)
 
+    async def start_webhook(self):
+        """Запускает бота в режиме webhook на aiohttp сервере."""
+        log_info("Запуск бота в режиме webhook: %s", config.WEBHOOK_URL)
+        # Telegram присылает только типы обновлений, для которых есть обработчики
+        await self.bot.set_webhook(
+            config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=self.dp.resolve_used_update_types()
+        )
+
+        app = web.Application()
+        # Telegram получает ответ 200 сразу, а обновление обрабатывается в фоне:
+        # долгие запросы к Gemini не задерживают подтверждение и не вызывают повторную доставку.
+        # Метод API, возвращенный обработчиком (message.reply(...) без await), отправляется обычным запросом
+        SimpleRequestHandler(
+            dispatcher=self.dp,
+            bot=self.bot,
+            handle_in_background=True,
+            secret_token=config.WEBHOOK_SECRET
+        ).register(app, path=config.WEBHOOK_PATH)
+        setup_application(app, self.dp, bot=self.bot)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host=config.WEBAPP_HOST, port=config.WEBAPP_PORT).start()
+        try:
+            # Сервер работает до вызова request_stop (или отмены задачи)
+            await self._stop_event.wait()
+        finally:
+            await runner.cleanup()
+
+    def request_stop(self):
+        """Просит webhook-сервер завершить работу."""
+        self._stop_event.set()
+
     async def stop(self):
         """Останавливает бота."""
         log_info("Остановка бота")
+
+        # Дописываем в БД статистику, оставшуюся в очереди
+        if self._db_writer_task is not None:
+            self._db_writer_task.cancel()
+            try:
+                await self._db_writer_task
+            except asyncio.CancelledError:
+                pass
+        pending = []
+        while not self._db_write_queue.empty():
+            pending.append(self._db_write_queue.get_nowait())
+        if pending:
+            await self._flush_db_writes(pending)
+
         await self.bot.session.close()
 
 
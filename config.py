@@ -39,6 +39,30 @@ class Config:
     REQUEST_TIMEOUT: int = 30
     WHISPER_TIMEOUT: int = 60
 
+    # Ограничение одновременных обращений к внешним ресурсам
+    DB_CONCURRENCY: int = int(os.getenv("DB_CONCURRENCY", "16"))
+    GEMINI_CONCURRENCY: int = int(os.getenv("GEMINI_CONCURRENCY", "8"))
+
+    # Пакетная запись статистики в БД: окно накопления (секунды) и максимум записей в пачке
+    DB_BATCH_WINDOW: float = float(os.getenv("DB_BATCH_WINDOW", "0.05"))
+    DB_BATCH_SIZE: int = int(os.getenv("DB_BATCH_SIZE", "200"))
+
+    # Лимит правок сообщений в секунду (глобальный лимит Telegram - 30)
+    EDIT_RATE_LIMIT: int = int(os.getenv("EDIT_RATE_LIMIT", "30"))
+    # Минимальный интервал между правками в одном чате (секунды, лимит Telegram ~1 в секунду)
+    CHAT_EDIT_INTERVAL: float = float(os.getenv("CHAT_EDIT_INTERVAL", "0.8"))
+
+    # Кэш статистики и истории игр (секунды жизни и максимум записей)
+    STATS_CACHE_TTL: float = float(os.getenv("STATS_CACHE_TTL", "10"))
+    STATS_CACHE_SIZE: int = int(os.getenv("STATS_CACHE_SIZE", "4096"))
+
+    # Webhook (если WEBHOOK_URL не задан, бот работает через polling)
+    WEBHOOK_URL: Optional[str] = os.getenv("WEBHOOK_URL")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: Optional[str] = os.getenv("WEBHOOK_SECRET")
+    WEBAPP_HOST: str = os.getenv("WEBAPP_HOST", "0.0.0.0")
+    WEBAPP_PORT: int = int(os.getenv("PORT", "8080"))
+
     @classmethod
     def validate_config(cls) -> bool:
         """
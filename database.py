@@ -5,7 +5,7 @@
 
 import os
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, JSON, Boolean, BigInteger, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
@@ -151,7 +151,7 @@ class DatabaseManager:
                 user = User(id=user_id, **user_data)
                 session.add(user)
                 session.commit()
-                log_info(f"Создан новый пользователь: {user_id}")
+                log_info("Создан новый пользователь: %s", user_id)
             else:
                 # Обновляем данные пользователя
                 for key, value in user_data.items():
@@ -222,7 +222,7 @@ class DatabaseManager:
                 session.query(UserSettings).filter(UserSettings.user_id == user_id).delete()
                 session.commit()
 
-                log_info(f"Статистика пользователя {user_id} очищена")
+                log_info("Статистика пользователя %s очищена", user_id)
 
     def clear_all_users_stats(self):
         """Очистить статистику всех пользователей."""
@@ -256,7 +256,7 @@ class DatabaseManager:
             if user:
                 user.banned_until = datetime.utcnow() + timedelta(hours=ban_duration_hours)
                 session.commit()
-                log_info(f"Пользователь {user_id} забанен на {ban_duration_hours} часов")
+                log_info("Пользователь %s забанен на %s часов", user_id, ban_duration_hours)
 
     def unban_user(self, user_id: int):
         """Разбанить пользователя."""
@@ -265,7 +265,7 @@ class DatabaseManager:
             if user:
                 user.banned_until = None
                 session.commit()
-                log_info(f"Пользователь {user_id} разбанен")
+                log_info("Пользователь %s разбанен", user_id)
 
     def is_user_banned(self, user_id: int) -> bool:
         """Проверить, забанен ли пользователь."""
@@ -345,6 +345,52 @@ class DatabaseManager:
             session.add(message_log)
             session.commit()
 
+    def log_message_with_stat(self, user_id: int, message_type: str, stat_type: str,
+                              content: str = None, response: str = None, increment: int = 1):
+        """Залогировать сообщение и увеличить счетчик пользователя одной транзакцией."""
+        with self.get_session() as session:
+            session.add(MessageLog(
+                user_id=user_id,
+                message_type=message_type,
+                content=content,
+                response=response
+            ))
+            user = session.query(User).filter(User.id == user_id).first()
+            if user and hasattr(user, stat_type):
+                setattr(user, stat_type, (getattr(user, stat_type) or 0) + increment)
+            session.commit()
+
+    def log_messages_with_stats(self, entries: List[Tuple[int, Optional[str], Optional[str], Optional[str], Optional[str]]]):
+        """
+        Записать пачку сообщений и счетчиков пользователей одной транзакцией.
+
+        Args:
+            entries: Кортежи (user_id, тип сообщения, поле статистики, content, response);
+                     без типа сообщения запись в лог не создается, без поля - счетчик не меняется
+        """
+        increments: Dict[Tuple[int, str], int] = {}
+        with self.get_session() as session:
+            for user_id, message_type, stat_type, content, response in entries:
+                if message_type:
+                    session.add(MessageLog(
+                        user_id=user_id,
+                        message_type=message_type,
+                        content=content,
+                        response=response
+                    ))
+                if stat_type:
+                    increments[(user_id, stat_type)] = increments.get((user_id, stat_type), 0) + 1
+
+            if increments:
+                user_ids = {user_id for user_id, _ in increments}
+                users = {user.id: user for user in session.query(User).filter(User.id.in_(user_ids))}
+                for (user_id, stat_type), increment in increments.items():
+                    user = users.get(user_id)
+                    if user and hasattr(user, stat_type):
+                        setattr(user, stat_type, (getattr(user, stat_type) or 0) + increment)
+
+            session.commit()
+
     # Системная статистика
 
     def get_system_stats(self) -> Dict[str, Any]:
@@ -55,7 +55,7 @@ class GeminiClient:
     def _prepare_multimodal_request(
         self,
         text: str,
-        image_data: bytes,
+        image_data: Union[bytes, memoryview],
         mime_type: str = "image/jpeg"
     ) -> Dict[str, Any]:
         """
@@ -114,7 +114,7 @@ class GeminiClient:
                 "Content-Type": "application/json"
             }
 
-            log_info(f"Отправка запроса к Gemini API: {url}")
+            log_info("Отправка запроса к Gemini API: %s", url)
 
             response = requests.post(
                 url=url,
@@ -162,7 +162,7 @@ class GeminiClient:
         Returns:
             str: Ответ от Gemini или None при ошибке
         """
-        log_info(f"Генерация ответа на текстовый запрос: {text[:100]}...")
+        log_info("Генерация ответа на текстовый запрос: %.100s...", text)
 
         payload = self._prepare_text_request(text)
         response = self._make_request(payload)
@@ -174,7 +174,7 @@ class GeminiClient:
 
         return response
 
-    def analyze_image(self, image_data: bytes, prompt: str = "Опиши это изображение") -> Optional[str]:
+    def analyze_image(self, image_data: Union[bytes, memoryview], prompt: str = "Опиши это изображение") -> Optional[str]:
         """
         Анализирует изображение с помощью Gemini.
 
@@ -185,7 +185,7 @@ class GeminiClient:
         Returns:
             str: Описание изображения или None при ошибке
         """
-        log_info(f"Анализ изображения, размер: {len(image_data)} байт")
+        log_info("Анализ изображения, размер: %d байт", len(image_data))
 
         try:
             payload = self._prepare_multimodal_request(prompt, image_data)
@@ -202,7 +202,7 @@ class GeminiClient:
             log_error(f"Ошибка при анализе изображения: {str(e)}")
             return None
 
-    def transcribe_audio_with_gemini(self, audio_data: bytes, mime_type: str = "audio/ogg") -> Optional[str]:
+    def transcribe_audio_with_gemini(self, audio_data: Union[bytes, memoryview], mime_type: str = "audio/ogg") -> Optional[str]:
         """
         Распознает речь из аудио файла с помощью Gemini API.
 
@@ -213,7 +213,7 @@ class GeminiClient:
         Returns:
             str: Распознанный текст или None при ошибке
         """
-        log_info(f"Распознавание речи через Gemini, размер: {len(audio_data)} байт")
+        log_info("Распознавание речи через Gemini, размер: %d байт", len(audio_data))
 
         try:
             # Кодируем аудио в base64
@@ -273,7 +273,7 @@ class GeminiClient:
         Returns:
             str: Ответ от Gemini или None при ошибке
         """
-        log_info(f"Генерация ответа с изображением, текст: {text[:100]}...")
+        log_info("Генерация ответа с изображением, текст: %.100s...", text)
 
         try:
             payload = self._prepare_multimodal_request(text, image_data, mime_type)
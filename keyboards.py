@@ -2,16 +2,22 @@
 Модуль для создания интерактивных клавиатур (кнопок) в Telegram боте.
 """
 
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from personas import persona_manager, PersonaType
 
 
 class KeyboardManager:
-    """Менеджер клавиатур для бота."""
+    """Менеджер клавиатур для бота.
+
+    Клавиатуры статичны, поэтому фабрики кэшируются: объект разметки
+    строится один раз и переиспользуется (не изменяйте его на месте).
+    """
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_main_menu(is_admin: bool = False) -> InlineKeyboardMarkup:
         """Главная клавиатура с основными функциями."""
         builder = InlineKeyboardBuilder()
@@ -39,6 +45,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_personas_menu() -> InlineKeyboardMarkup:
         """Меню выбора режима общения."""
         builder = InlineKeyboardBuilder()
@@ -69,6 +76,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_games_menu() -> InlineKeyboardMarkup:
         """Меню игр."""
         builder = InlineKeyboardBuilder()
@@ -86,6 +94,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_rps_choice_menu() -> InlineKeyboardMarkup:
         """Клавиатура выбора для игры камень-ножницы-бумага."""
         builder = InlineKeyboardBuilder()
@@ -104,6 +113,13 @@ class KeyboardManager:
     @staticmethod
     def get_quiz_answers_menu(options: List[str], total_questions: int = 10, used_hints: int = 0) -> InlineKeyboardMarkup:
         """Клавиатура с вариантами ответов викторины."""
+        # Один и тот же вопрос показывается повторно (подсказки, неверные ответы) - кэшируем
+        return KeyboardManager._quiz_answers_menu(tuple(options), total_questions, used_hints)
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _quiz_answers_menu(options: Tuple[str, ...], total_questions: int, used_hints: int) -> InlineKeyboardMarkup:
+        """Строит клавиатуру вариантов ответа (options - кортеж для ключа кэша)."""
         builder = InlineKeyboardBuilder()
 
         # Рассчитываем доступные подсказки
@@ -131,6 +147,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_quiz_settings_menu() -> InlineKeyboardMarkup:
         """Меню настроек викторины."""
         builder = InlineKeyboardBuilder()
@@ -144,6 +161,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_quiz_industry_menu() -> InlineKeyboardMarkup:
         """Меню выбора отрасли для викторины."""
         builder = InlineKeyboardBuilder()
@@ -179,6 +197,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_quiz_count_menu() -> InlineKeyboardMarkup:
         """Меню выбора количества вопросов."""
         builder = InlineKeyboardBuilder()
@@ -196,6 +215,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=128)
     def get_quiz_progress_menu(correct: int, total: int, time_left: int = 0) -> InlineKeyboardMarkup:
         """Меню прогресса викторины."""
         builder = InlineKeyboardBuilder()
@@ -214,6 +234,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_tools_menu() -> InlineKeyboardMarkup:
         """Меню инструментов."""
         builder = InlineKeyboardBuilder()
@@ -232,6 +253,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_dice_start_menu() -> InlineKeyboardMarkup:
         """Меню начала игры в кости."""
         builder = InlineKeyboardBuilder()
@@ -247,6 +269,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_dice_game_menu() -> InlineKeyboardMarkup:
         """Меню во время игры в кости."""
         builder = InlineKeyboardBuilder()
@@ -259,6 +282,23 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
+    def get_dice_result_menu() -> InlineKeyboardMarkup:
+        """Меню после завершения игры в кости."""
+        builder = InlineKeyboardBuilder()
+
+        builder.button(text="🎲 Сыграть еще", callback_data="dice_throw_again")
+        builder.button(text="📊 Статистика костей", callback_data="dice_stats")
+        builder.button(text="📚 История костей", callback_data="dice_history")
+
+        builder.button(text="⬅️ В меню", callback_data="menu_main")
+
+        builder.adjust(1, 2, 1)
+
+        return builder.as_markup()
+
+    @staticmethod
+    @lru_cache(maxsize=None)
     def get_dice_waiting_menu() -> InlineKeyboardMarkup:
         """Меню ожидания броска кубика."""
         builder = InlineKeyboardBuilder()
@@ -273,6 +313,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_dice_user_turn_menu() -> InlineKeyboardMarkup:
         """Меню хода пользователя."""
         builder = InlineKeyboardBuilder()
@@ -287,6 +328,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_dice_stats_menu() -> InlineKeyboardMarkup:
         """Меню статистики для игры в кости."""
         builder = InlineKeyboardBuilder()
@@ -299,6 +341,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_dice_history_menu() -> InlineKeyboardMarkup:
         """Меню истории для игры в кости."""
         builder = InlineKeyboardBuilder()
@@ -311,6 +354,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_guess_difficulty_menu() -> InlineKeyboardMarkup:
         """Меню выбора сложности для игры угадай число."""
         builder = InlineKeyboardBuilder()
@@ -326,6 +370,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_rps_menu() -> InlineKeyboardMarkup:
         """Меню выбора для игры камень-ножницы-бумага."""
         builder = InlineKeyboardBuilder()
@@ -341,6 +386,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_rps_stats_menu() -> InlineKeyboardMarkup:
         """Меню статистики для игры камень-ножницы-бумага."""
         builder = InlineKeyboardBuilder()
@@ -353,6 +399,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_rps_history_menu() -> InlineKeyboardMarkup:
         """Меню истории для игры камень-ножницы-бумага."""
         builder = InlineKeyboardBuilder()
@@ -365,6 +412,21 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
+    def get_rps_result_menu() -> InlineKeyboardMarkup:
+        """Меню после хода в игре камень-ножницы-бумага."""
+        builder = InlineKeyboardBuilder()
+
+        builder.button(text="🪨 Сыграть еще", callback_data="game_rps")
+        builder.button(text="📊 Статистика", callback_data="rps_stats")
+        builder.button(text="📚 История", callback_data="rps_history")
+        builder.button(text="⬅️ В меню", callback_data="menu_main")
+
+        builder.adjust(1)
+        return builder.as_markup()
+
+    @staticmethod
+    @lru_cache(maxsize=None)
     def get_calc_menu() -> InlineKeyboardMarkup:
         """Клавиатура калькулятора."""
         builder = InlineKeyboardBuilder()
@@ -395,6 +457,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_uzbekistan_weather_menu() -> InlineKeyboardMarkup:
         """Меню выбора областей Узбекистана для погоды."""
         builder = InlineKeyboardBuilder()
@@ -427,6 +490,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_translation_languages_menu() -> InlineKeyboardMarkup:
         """Меню выбора языков для перевода."""
         builder = InlineKeyboardBuilder()
@@ -456,6 +520,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_menu_button() -> InlineKeyboardMarkup:
         """Кнопка для быстрого доступа к главному меню."""
         builder = InlineKeyboardBuilder()
@@ -465,6 +530,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_admin_menu() -> InlineKeyboardMarkup:
         """Админ-панель для управления ботом."""
         builder = InlineKeyboardBuilder()
@@ -480,6 +546,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_admin_users_menu() -> InlineKeyboardMarkup:
         """Меню управления пользователями."""
         builder = InlineKeyboardBuilder()
@@ -496,6 +563,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_admin_stats_menu() -> InlineKeyboardMarkup:
         """Меню просмотра статистики."""
         builder = InlineKeyboardBuilder()
@@ -511,6 +579,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_admin_search_menu() -> InlineKeyboardMarkup:
         """Меню поиска пользователей."""
         builder = InlineKeyboardBuilder()
@@ -526,6 +595,7 @@ class KeyboardManager:
         return builder.as_markup()
 
     @staticmethod
+    @lru_cache(maxsize=128)
     def get_confirmation_menu(action: str, callback_data: str) -> InlineKeyboardMarkup:
         """Меню подтверждения действия."""
         builder = InlineKeyboardBuilder()
@@ -3,7 +3,10 @@
 Настраивает логирование в консоль и файл.
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 from pathlib import Path
 from typing import Optional
@@ -47,12 +50,14 @@ class BotLogger:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
 
+        handlers = []
+
         # Обработчик для консоли
         if log_to_console:
             console_handler = logging.StreamHandler(sys.stdout)
             console_handler.setLevel(level)
             console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
+            handlers.append(console_handler)
 
         # Обработчик для файла
         if log_to_file:
@@ -63,7 +68,16 @@ class BotLogger:
             )
             file_handler.setLevel(level)
             file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            handlers.append(file_handler)
+
+        # Запись в консоль и файл выполняется в фоновом потоке,
+        # чтобы логирование не блокировало цикл событий
+        if handlers:
+            log_queue = queue.SimpleQueue()
+            logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)
 
         return logger
 
@@ -71,33 +85,35 @@ class BotLogger:
 # Создаем глобальный логгер для бота
 logger = BotLogger.setup_logger()
 
-# Функции для удобного логирования
-def log_info(message: str, user_id: Optional[int] = None) -> None:
+# Функции для удобного логирования.
+# Аргументы подставляются в сообщение лениво (%-форматирование),
+# только если уровень логирования включен.
+def _with_user(message: str, user_id: Optional[int]) -> str:
+    """Добавляет к сообщению префикс с ID пользователя."""
+    return f"[User {user_id}] {message}" if user_id else message
+
+
+def log_info(message: str, *args, user_id: Optional[int] = None) -> None:
     """Логирует информационное сообщение."""
-    if user_id:
-        message = f"[User {user_id}] {message}"
-    logger.info(message)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(_with_user(message, user_id), *args)
 
 
-def log_error(message: str, user_id: Optional[int] = None, exc: Optional[Exception] = None) -> None:
+def log_error(message: str, *args, user_id: Optional[int] = None, exc: Optional[Exception] = None) -> None:
     """Логирует сообщение об ошибке."""
-    if user_id:
-        message = f"[User {user_id}] {message}"
     if exc:
-        logger.error(message, exc_info=exc)
+        logger.error(_with_user(message, user_id), *args, exc_info=exc)
     else:
-        logger.error(message)
+        logger.error(_with_user(message, user_id), *args)
 
 
-def log_warning(message: str, user_id: Optional[int] = None) -> None:
+def log_warning(message: str, *args, user_id: Optional[int] = None) -> None:
     """Логирует предупреждение."""
-    if user_id:
-        message = f"[User {user_id}] {message}"
-    logger.warning(message)
+    if logger.isEnabledFor(logging.WARNING):
+        logger.warning(_with_user(message, user_id), *args)
 
 
-def log_debug(message: str, user_id: Optional[int] = None) -> None:
+def log_debug(message: str, *args, user_id: Optional[int] = None) -> None:
     """Логирует отладочное сообщение."""
-    if user_id:
-        message = f"[User {user_id}] {message}"
-    logger.debug(message)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(_with_user(message, user_id), *args)
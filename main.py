@@ -9,6 +9,13 @@ import signal
 import sys
 from typing import Optional
 
+try:
+    import uvloop
+    # Более быстрый цикл событий на базе libuv (если установлен)
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
 from config import config
 from logger import logger, log_info, log_error
 from database import init_database, get_db_manager
@@ -25,6 +32,7 @@ class BotRunner:
         """Инициализирует runner."""
         self.running = False
         self.task: Optional[asyncio.Task] = None
+        self.stop_task: Optional[asyncio.Task] = None
 
     async def start_bot(self):
         """Запускает бота."""
@@ -40,7 +48,10 @@ class BotRunner:
                 log_info("Бот успешно создан")
 
             self.running = True
-            await ai_bot.start_polling()
+            if config.WEBHOOK_URL:
+                await ai_bot.start_webhook()
+            else:
+                await ai_bot.start_polling()
         except Exception as e:
             log_error(f"Ошибка при запуске бота: {str(e)}", exc=e)
             raise
@@ -55,7 +66,11 @@ class BotRunner:
         self.running = False
 
         if self.task and not self.task.done():
-            self.task.cancel()
+            if config.WEBHOOK_URL and ai_bot:
+                # Webhook-сервер завершается сам, закрыв соединения
+                ai_bot.request_stop()
+            else:
+                self.task.cancel()
             try:
                 await self.task
             except asyncio.CancelledError:
@@ -66,8 +81,9 @@ class BotRunner:
 
     def signal_handler(self, signum, frame):
         """Обработчик сигналов системы."""
-        log_info(f"Получен сигнал: {signum}")
-        asyncio.create_task(self.stop_bot())
+        log_info("Получен сигнал: %s", signum)
+        if self.stop_task is None:
+            self.stop_task = asyncio.create_task(self.stop_bot())
 
     async def run(self):
         """Основной метод запуска."""
@@ -112,6 +128,9 @@ class BotRunner:
             self.task = asyncio.create_task(self.start_bot())
             await self.task
 
+        except asyncio.CancelledError:
+            # Задачу бота отменил stop_bot по сигналу
+            pass
         except KeyboardInterrupt:
             log_info("Получен KeyboardInterrupt")
             await self.stop_bot()
@@ -120,6 +139,11 @@ class BotRunner:
             await self.stop_bot()
             sys.exit(1)
 
+        # Дожидаемся остановки, запущенной по сигналу: иначе asyncio.run отменит ее,
+        # и статистика из очереди не запишется, а сессия бота не закроется
+        if self.stop_task is not None:
+            await self.stop_task
+
 
 def main():
     """Главная функция."""
@@ -6,7 +6,7 @@
 import json
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from collections import defaultdict
 
 from logger import log_info, log_error
@@ -50,7 +50,7 @@ class ConversationMemory:
         if len(self.messages) > self.max_messages:
             self.messages = self.messages[-self.max_messages:]
 
-        log_info(f"Добавлено сообщение в память пользователя {self.user_id}: {role} - {content[:50]}...")
+        log_info("Добавлено сообщение в память пользователя %s: %s - %.50s...", self.user_id, role, content)
 
     def get_recent_messages(self, limit: int = 10) -> List[Dict]:
         """Получить последние сообщения из истории."""
@@ -83,12 +83,15 @@ class ConversationMemory:
 
     def get_statistics(self) -> Dict:
         """Получить статистику разговора."""
+        duration = (self.metadata['last_updated'] - self.metadata['created_at']).total_seconds()
+        hours, rest = divmod(int(duration), 3600)
         return {
             'total_messages': self.metadata['total_messages'],
             'current_messages': len(self.messages),
             'created_at': self.metadata['created_at'],
             'last_updated': self.metadata['last_updated'],
-            'conversation_duration': (self.metadata['last_updated'] - self.metadata['created_at']).total_seconds()
+            'conversation_duration': duration,
+            'duration_text': f"{hours} ч {rest // 60} мин"
         }
 
     def set_persona(self, persona_name: str) -> None:
@@ -210,7 +213,7 @@ class MemoryManager:
 
                     self.memories[user_id] = memory
 
-                log_info(f"Загружены воспоминания для {len(self.memories)} пользователей")
+                log_info("Загружены воспоминания для %d пользователей", len(self.memories))
         except Exception as e:
             log_error(f"Ошибка при загрузке воспоминаний: {str(e)}")
 
@@ -335,7 +338,7 @@ class MemoryManager:
         """Получить или создать память для пользователя."""
         if user_id not in self.memories:
             self.memories[user_id] = ConversationMemory(user_id)
-            log_info(f"Создана новая память для пользователя {user_id}")
+            log_info("Создана новая память для пользователя %s", user_id)
 
         return self.memories[user_id]
 
@@ -361,7 +364,7 @@ class MemoryManager:
         if user_id in self.memories:
             del self.memories[user_id]
             self._save_memories()
-            log_info(f"Очищена память пользователя {user_id}")
+            log_info("Очищена память пользователя %s", user_id)
             return True
         return False
 
@@ -376,7 +379,7 @@ class MemoryManager:
 
         if cleaned_count > 0:
             self._save_memories()
-            log_info(f"Очищено {cleaned_count} старых воспоминаний")
+            log_info("Очищено %d старых воспоминаний", cleaned_count)
 
         return cleaned_count
 
@@ -482,6 +485,31 @@ class MemoryManager:
         memory.update_game_data(key, value)
         self._save_memories()
 
+    def mutate_user_game_data(self, user_id: int, mutator: Callable[[Dict], Any]) -> Dict:
+        """
+        Изменяет данные игры пользователя на месте и сохраняет их одной записью.
+
+        Args:
+            user_id: ID пользователя
+            mutator: Функция, изменяющая словарь данных игры
+
+        Returns:
+            Dict: Обновленные данные игры
+        """
+        memory = self.get_memory(user_id)
+        # Убедимся, что game_state инициализирован
+        if 'game_state' not in memory.metadata:
+            memory.metadata['game_state'] = {
+                'active_game': None,
+                'game_data': {},
+                'last_game_time': None
+            }
+        game_data = memory.get_game_data()
+        mutator(game_data)
+        memory.metadata['last_updated'] = datetime.now()
+        self._save_memories()
+        return game_data
+
 
 # Создаем глобальный экземпляр менеджера памяти
 memory_manager = MemoryManager()
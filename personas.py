@@ -110,12 +110,12 @@ class PersonaManager:
             PersonaType.PROFESSIONAL: professional_persona
         }
 
-    def set_persona(self, persona_type: PersonaType) -> bool:
-        """Установить текущую персону."""
-        if persona_type in self.personas:
+    def set_persona(self, persona_type: PersonaType) -> Optional[Persona]:
+        """Установить текущую персону. Возвращает ее или None, если тип неизвестен."""
+        persona = self.personas.get(persona_type)
+        if persona is not None:
             self.current_persona = persona_type
-            return True
-        return False
+        return persona
 
     def get_current_persona(self) -> Persona:
         """Получить текущую персону."""
@@ -5,7 +5,9 @@
 
 import re
 import random
+import time
 import requests
+from collections import Counter
 from typing import Optional, Tuple, List, Dict, Any
 from datetime import datetime
 
@@ -64,9 +66,18 @@ class Translator:
         'ko': 'корейский'
     }
 
+    # Сколько секунд переиспользуем перевод и максимум хранимых переводов
+    CACHE_TTL = 86400
+    CACHE_SIZE = 1024
+
+    def __init__(self):
+        """Инициализирует переводчик."""
+        # (язык, текст) -> (время перевода, перевод); неудачные переводы не кэшируются
+        self._cache: Dict[Tuple[str, str], Tuple[float, str]] = {}
+
     def translate_text(self, text: str, target_lang: str = 'en') -> Optional[str]:
         """
-        Переводит текст на указанный язык с использованием Google Translate API.
+        Переводит текст на указанный язык с использованием Google Translate API (с кэшем на CACHE_TTL секунд).
 
         Args:
             text: Текст для перевода
@@ -76,17 +87,27 @@ class Translator:
             str: Переведенный текст или None при ошибке
         """
         try:
-            log_info(f"Перевод текста на {target_lang}: {text[:50]}...")
+            log_info("Перевод текста на %s: %.50s...", target_lang, text)
 
             # Проверяем, что язык поддерживается
             if target_lang not in self.SUPPORTED_LANGUAGES:
                 return f"❌ Язык '{target_lang}' не поддерживается."
 
+            key = (target_lang, text.strip())
+            now = time.monotonic()
+            entry = self._cache.get(key)
+            if entry and now - entry[0] < self.CACHE_TTL:
+                return entry[1]
+
             # Для простоты используем Google Translate через бесплатный прокси
             # В продакшене лучше использовать официальный API
             translation = self._translate_with_google(text, target_lang)
 
             if translation:
+                if len(self._cache) >= self.CACHE_SIZE:
+                    # Вытесняем самый старый перевод
+                    self._cache.pop(next(iter(self._cache)), None)
+                self._cache[key] = (now, translation)
                 return translation
             else:
                 # Fallback на mock-перевод
@@ -183,9 +204,18 @@ class WeatherService:
         "джизак": (40.1158, 67.8422),
     }
 
+    # Сколько секунд переиспользуем полученную погоду и максимум хранимых точек
+    CACHE_TTL = 300
+    CACHE_SIZE = 256
+
+    def __init__(self):
+        """Инициализирует сервис погоды."""
+        # Координаты -> (время получения, сводка погоды); ошибки не кэшируются
+        self._cache: Dict[Tuple[float, float], Tuple[float, str]] = {}
+
     def get_weather(self, city: str) -> Optional[str]:
         """
-        Получает реальную информацию о погоде для указанного города через Open-Meteo API.
+        Получает информацию о погоде для города (с кэшем на CACHE_TTL секунд).
 
         Args:
             city: Название города
@@ -193,13 +223,40 @@ class WeatherService:
         Returns:
             str: Информация о погоде или None при ошибке
         """
-        try:
-            log_info(f"Запрос реальной погоды для города: {city}")
+        # Ключ кэша - найденные координаты, а не введенный текст: иначе варианты
+        # написания одного города копились бы отдельными записями
+        coords = self._get_city_coordinates(city)
+        if not coords:
+            return f"❌ Город '{city}' не найден в базе данных.\n\nДоступные города: Ташкент, Самарканд, Бухара, Андижан, Фергана, Наманган, Карши, Термез, Нукус, Ургенч, Навои, Гулистан, Чирчик и другие."
+
+        now = time.monotonic()
+        entry = self._cache.get(coords)
+        if entry and now - entry[0] < self.CACHE_TTL:
+            report = entry[1]
+        else:
+            report = self._fetch_weather(city, coords)
+            if not report or report.startswith("❌"):
+                return report
+            if len(self._cache) >= self.CACHE_SIZE:
+                # Вытесняем самую старую запись
+                self._cache.pop(next(iter(self._cache)), None)
+            self._cache[coords] = (now, report)
 
-            # Получаем координаты города
-            coords = self._get_city_coordinates(city)
-            if not coords:
-                return f"❌ Город '{city}' не найден в базе данных.\n\nДоступные города: Ташкент, Самарканд, Бухара, Андижан, Фергана, Наманган, Карши, Термез, Нукус, Ургенч, Навои, Гулистан, Чирчик и другие."
+        return f"🌤️ <b>Погода в {city.title()}</b>\n\n{report}"
+
+    def _fetch_weather(self, city: str, coords: Tuple[float, float]) -> Optional[str]:
+        """
+        Получает сводку погоды по координатам города через Open-Meteo API.
+
+        Args:
+            city: Название города (для сообщений и логов)
+            coords: (latitude, longitude) города
+
+        Returns:
+            str: Сводка погоды без заголовка или сообщение об ошибке
+        """
+        try:
+            log_info("Запрос реальной погоды для города: %s", city)
 
             latitude, longitude = coords
 
@@ -239,8 +296,7 @@ class WeatherService:
             # Определяем направление ветра
             wind_direction_text = self._get_wind_direction(winddirection)
 
-            return f"🌤️ <b>Погода в {city.title()}</b>\n\n" \
-                   f"🌡️ <b>Температура:</b> {temperature}°C\n" \
+            return f"🌡️ <b>Температура:</b> {temperature}°C\n" \
                    f"🌥️ <b>Состояние:</b> {weather_description}\n" \
                    f"💧 <b>Влажность:</b> {humidity}%\n" \
                    f"💨 <b>Ветер:</b> {windspeed} м/с {wind_direction_text}\n\n" \
@@ -323,6 +379,28 @@ class WeatherService:
 class GameService:
     """Сервис для простых игр."""
 
+    # Ходы КНБ и английские синонимы
+    RPS_CHOICES = ('камень', 'ножницы', 'бумага')
+    RPS_ALIASES = {
+        'rock': 'камень',
+        'scissors': 'ножницы',
+        'paper': 'бумага'
+    }
+
+    # Строки итога игры в сохраненном ответе -> результат
+    GAME_RESULT_MARKERS = (
+        ("🎉 Ты победил", "user_win"),
+        ("😢 Я победил", "bot_win"),
+        ("🤝 Ничья", "draw")
+    )
+
+    def _parse_game_result(self, line: str) -> Optional[str]:
+        """Возвращает результат игры, если строка ответа содержит итог."""
+        for marker, result in self.GAME_RESULT_MARKERS:
+            if marker in line:
+                return result
+        return None
+
     def play_rps(self, user_choice: str, user_id: int = None) -> Tuple[str, Dict[str, Any]]:
         """
         Улучшенная игра камень-ножницы-бумага с умной логикой бота.
@@ -334,21 +412,11 @@ class GameService:
         Returns:
             Tuple[str, Dict[str, Any]]: Результат игры и данные для истории
         """
-        # Преобразование английских названий в русские
-        choice_map = {
-            'rock': 'камень',
-            'scissors': 'ножницы',
-            'paper': 'бумага'
-        }
-
-        # Если передан английский вариант, преобразуем
-        if user_choice.lower() in choice_map:
-            user_choice = choice_map[user_choice.lower()]
-
-        choices = ['камень', 'ножницы', 'бумага']
+        # Если передан английский вариант, преобразуем в русский
         user_choice = user_choice.lower().strip()
+        user_choice = self.RPS_ALIASES.get(user_choice, user_choice)
 
-        if user_choice not in choices:
+        if user_choice not in self.RPS_CHOICES:
             return "❌ Выберите: камень, ножницы или бумага!", {}
 
         # Умный выбор бота
@@ -383,7 +451,7 @@ class GameService:
             str: Выбор бота
         """
         import secrets
-        choices = ['камень', 'ножницы', 'бумага']
+        choices = self.RPS_CHOICES
 
         # Базовые вероятности (умный выбор)
         weights = [1.0, 1.0, 1.0]  # По умолчанию равные
@@ -525,8 +593,7 @@ class GameService:
             history = []
             for game in games:
                 try:
-                    # Парсим данные из JSON в response
-                    import json
+                    # Парсим данные из текста ответа
                     if game.response:
                         # Ищем паттерн в ответе для извлечения данных
                         response_lines = game.response.split('\n')
@@ -539,13 +606,8 @@ class GameService:
                                 user_choice = line.split(":")[-1].strip().lower()
                             elif "Мой выбор:" in line:
                                 bot_choice = line.split(":")[-1].strip().lower()
-                            elif any(x in line for x in ["🎉 Ты победил", "😢 Я победил", "🤝 Ничья"]):
-                                if "🎉 Ты победил" in line:
-                                    result = "user_win"
-                                elif "😢 Я победил" in line:
-                                    result = "bot_win"
-                                else:
-                                    result = "draw"
+                            elif line_result := self._parse_game_result(line):
+                                result = line_result
 
                         if user_choice and bot_choice:
                             history.append({
@@ -946,13 +1008,8 @@ class GameService:
                         elif "Мой бросок:" in line and "×" not in line:
                             # Парсим "Мой бросок: 4"
                             bot_dice = line.split(":")[-1].strip()
-                        elif any(x in line for x in ["🎉 Ты победил", "😢 Я победил", "🤝 Ничья"]):
-                            if "🎉 Ты победил" in line:
-                                result = "user_win"
-                            elif "😢 Я победил" in line:
-                                result = "bot_win"
-                            else:
-                                result = "draw"
+                        elif line_result := self._parse_game_result(line):
+                            result = line_result
 
                     try:
                         user_dice_int = int(user_dice) if user_dice.isdigit() else 0
@@ -990,26 +1047,27 @@ class GameService:
         history = self.get_dice_history(user_id, limit=1000)  # Получаем много игр для статистики
 
         total_games = len(history)
-        user_wins = sum(1 for game in history if game['result'] == 'user_win')
-        bot_wins = sum(1 for game in history if game['result'] == 'bot_win')
-        draws = sum(1 for game in history if game['result'] == 'draw')
+
+        # Результаты и любимые числа считаем за один проход
+        results = Counter()
+        user_favorite_numbers = Counter()
+        bot_favorite_numbers = Counter()
+        for game in history:
+            results[game['result']] += 1
+            user_favorite_numbers[game['user_dice']] += 1
+            bot_favorite_numbers[game['bot_dice']] += 1
+
+        user_wins = results['user_win']
+        bot_wins = results['bot_win']
+        draws = results['draw']
 
         # Средние значения кубиков
-        user_avg = sum(game['user_dice'] for game in history) / total_games if total_games > 0 else 0
-        bot_avg = sum(game['bot_dice'] for game in history) / total_games if total_games > 0 else 0
+        user_avg = sum(n * c for n, c in user_favorite_numbers.items()) / total_games if total_games > 0 else 0
+        bot_avg = sum(n * c for n, c in bot_favorite_numbers.items()) / total_games if total_games > 0 else 0
 
         # Процент побед
         win_rate = (user_wins / total_games * 100) if total_games > 0 else 0
 
-        # Любимые числа
-        user_favorite_numbers = {}
-        bot_favorite_numbers = {}
-        for game in history:
-            user_num = game['user_dice']
-            bot_num = game['bot_dice']
-            user_favorite_numbers[user_num] = user_favorite_numbers.get(user_num, 0) + 1
-            bot_favorite_numbers[bot_num] = bot_favorite_numbers.get(bot_num, 0) + 1
-
         return {
             'total_games': total_games,
             'user_wins': user_wins,
@@ -1085,7 +1143,7 @@ class GameService:
                 lines = response.strip().split('\n')
                 question = ""
                 options = []
-                correct_answer = ""
+                correct_answer = 0
                 hint = ""
 
                 current_section = ""
@@ -1098,7 +1156,10 @@ class GameService:
                         option = line[3:].strip()
                         options.append(option)
                     elif line.startswith('Правильный ответ:'):
-                        correct_answer = line.replace('Правильный ответ:', '').strip()
+                        # Храним номер ответа числом, чтобы не разбирать его на каждом клике
+                        answer = line.replace('Правильный ответ:', '').strip()
+                        if answer and answer[0] in "1234":
+                            correct_answer = int(answer[0])
                     elif line.startswith('Подсказка:'):
                         hint = line.replace('Подсказка:', '').strip()
 
@@ -1153,7 +1214,7 @@ class GameService:
                 lines = response.strip().split('\n')
                 question = ""
                 options = []
-                correct_answer = ""
+                correct_answer = 0
                 hint = ""
 
                 current_section = ""
@@ -1166,7 +1227,10 @@ class GameService:
                         option = line[3:].strip()
                         options.append(option)
                     elif line.startswith('Правильный ответ:'):
-                        correct_answer = line.replace('Правильный ответ:', '').strip()
+                        # Храним номер ответа числом, чтобы не разбирать его на каждом клике
+                        answer = line.replace('Правильный ответ:', '').strip()
+                        if answer and answer[0] in "1234":
+                            correct_answer = int(answer[0])
                     elif line.startswith('Подсказка:'):
                         hint = line.replace('Подсказка:', '').strip()
 
@@ -1188,7 +1252,7 @@ class GameService:
         try:
             answer_num = int(user_answer.strip())
             if 1 <= answer_num <= 4:
-                if str(answer_num) == correct_answer:
+                if str(answer_num) == str(correct_answer):
                     return "🎉 Правильно! Ты умница! 🧠"
                 else:
                     return "❌ Неправильно, но не расстраивайся! Попробуй еще раз."
@@ -1292,24 +1356,75 @@ class GameService:
 class FunService:
     """Сервис для развлекательных функций."""
 
+    # Категории для генерации и запасные ответы (на случай недоступности ИИ)
+    FACT_CATEGORIES = (
+        "наука и открытия",
+        "животные и природа",
+        "космос и астрономия",
+        "история и цивилизации",
+        "технологии и изобретения",
+        "человеческое тело",
+        "океан и моря",
+        "растения и экология",
+        "погода и климат",
+        "археология и древности"
+    )
+
+    FACT_FALLBACKS = (
+        "🧬 ДНК была открыта в 1953 году, но до сих пор ученые изучают только 2% ее функций!",
+        "🐘 Самый большой слон в истории весил целых 12 тонн!",
+        "🌟 Звезды, которые мы видим ночью, могут уже не существовать!",
+        "🏺 Древние римляне использовали мочу как отбеливатель для зубов!",
+        "💡 Первая компьютерная мышь была сделана из дерева в 1964 году!",
+    )
+
+    QUOTE_THEMES = (
+        "успех и достижения",
+        "настойчивость и преодоление трудностей",
+        "мечты и цели",
+        "саморазвитие и обучение",
+        "работа и карьера",
+        "отношения и дружба",
+        "здоровье и спорт",
+        "творчество и искусство",
+        "время и жизнь",
+        "счастье и позитив"
+    )
+
+    QUOTE_FALLBACKS = (
+        "«Успех - это не окончание, неудача - не фатальна: смелость продолжать - вот что важно!»",
+        "«Будущее принадлежит тем, кто верит в красоту своих мечтаний.»",
+        "«Не бойся отказов. Каждый отказ - это шаг ближе к успеху.»",
+        "«Ваше время ограничено, не тратьте его на чужую жизнь.»",
+        "«Единственный способ сделать великую работу - любить то, что делаешь.»",
+    )
+
+    JOKE_CATEGORIES = (
+        "программирование и IT",
+        "повседневная жизнь",
+        "животные и природа",
+        "еда и кулинария",
+        "спорт и здоровье",
+        "школа и образование",
+        "семья и отношения",
+        "путешествия",
+        "техника и гаджеты",
+        "искусство и творчество"
+    )
+
+    JOKE_FALLBACKS = (
+        "🤣 Почему программисты путают Хэллоуин и Рождество?\nПотому что Oct 31 = Dec 25!",
+        "😄 Почему зонт не идет в школу?\nПотому что он уже раскрыт!",
+        "🐘 Почему слон не пользуется компьютером?\nОн боится мышки!",
+        "🍕 Почему пицца никогда не бывает грустной?\nПотому что у нее много друзей сверху!",
+        "⚽ Почему футболисты всегда носят шорты?\nПотому что в длинных штанах не забьешь гол!",
+    )
+
     def get_random_fact(self) -> str:
         """Генерирует уникальный интересный факт с помощью ИИ из разных категорий."""
         try:
             # Выбираем случайную категорию для разнообразия
-            categories = [
-                "наука и открытия",
-                "животные и природа",
-                "космос и астрономия",
-                "история и цивилизации",
-                "технологии и изобретения",
-                "человеческое тело",
-                "океан и моря",
-                "растения и экология",
-                "погода и климат",
-                "археология и древности"
-            ]
-
-            selected_category = random.choice(categories)
+            selected_category = random.choice(self.FACT_CATEGORIES)
 
             prompt = f"""Придумай один уникальный и удивительный факт про {selected_category}.
             Факт должен быть:
@@ -1330,15 +1445,7 @@ class FunService:
                 fact = fact.strip('"\'')
                 return f"🧠 <b>Интересный факт:</b>\n\n{fact}"
             else:
-                # Fallback факты по категориям
-                fallbacks = {
-                    "наука и открытия": "🧬 ДНК была открыта в 1953 году, но до сих пор ученые изучают только 2% ее функций!",
-                    "животные и природа": "🐘 Самый большой слон в истории весил целых 12 тонн!",
-                    "космос и астрономия": "🌟 Звезды, которые мы видим ночью, могут уже не существовать!",
-                    "история и цивилизации": "🏺 Древние римляне использовали мочу как отбеливатель для зубов!",
-                    "технологии и изобретения": "💡 Первая компьютерная мышь была сделана из дерева в 1964 году!",
-                }
-                return f"🧠 <b>Интересный факт:</b>\n\n{random.choice(list(fallbacks.values()))}"
+                return f"🧠 <b>Интересный факт:</b>\n\n{random.choice(self.FACT_FALLBACKS)}"
 
         except Exception as e:
             log_error(f"Ошибка генерации факта: {str(e)}")
@@ -1348,20 +1455,7 @@ class FunService:
         """Генерирует уникальную мотивационную цитату с помощью ИИ из разных категорий."""
         try:
             # Выбираем случайную тему для разнообразия
-            themes = [
-                "успех и достижения",
-                "настойчивость и преодоление трудностей",
-                "мечты и цели",
-                "саморазвитие и обучение",
-                "работа и карьера",
-                "отношения и дружба",
-                "здоровье и спорт",
-                "творчество и искусство",
-                "время и жизнь",
-                "счастье и позитив"
-            ]
-
-            selected_theme = random.choice(themes)
+            selected_theme = random.choice(self.QUOTE_THEMES)
 
             prompt = f"""Создай одну оригинальную мотивационную цитату на русском языке про {selected_theme}.
             Цитата должна быть:
@@ -1381,15 +1475,7 @@ class FunService:
                 quote = quote.strip('"\'')
                 return f"💭 <b>Мотивационная цитата:</b>\n\n«{quote}»"
             else:
-                # Fallback цитаты по темам
-                fallbacks = {
-                    "успех и достижения": "«Успех - это не окончание, неудача - не фатальна: смелость продолжать - вот что важно!»",
-                    "мечты и цели": "«Будущее принадлежит тем, кто верит в красоту своих мечтаний.»",
-                    "настойчивость": "«Не бойся отказов. Каждый отказ - это шаг ближе к успеху.»",
-                    "саморазвитие": "«Ваше время ограничено, не тратьте его на чужую жизнь.»",
-                    "работа": "«Единственный способ сделать великую работу - любить то, что делаешь.»",
-                }
-                return f"💭 <b>Мотивационная цитата:</b>\n\n{random.choice(list(fallbacks.values()))}"
+                return f"💭 <b>Мотивационная цитата:</b>\n\n{random.choice(self.QUOTE_FALLBACKS)}"
 
         except Exception as e:
             log_error(f"Ошибка генерации цитаты: {str(e)}")
@@ -1399,20 +1485,7 @@ class FunService:
         """Генерирует уникальную шутку с помощью ИИ с разнообразными темами."""
         try:
             # Выбираем случайную категорию для разнообразия
-            categories = [
-                "программирование и IT",
-                "повседневная жизнь",
-                "животные и природа",
-                "еда и кулинария",
-                "спорт и здоровье",
-                "школа и образование",
-                "семья и отношения",
-                "путешествия",
-                "техника и гаджеты",
-                "искусство и творчество"
-            ]
-
-            selected_category = random.choice(categories)
+            selected_category = random.choice(self.JOKE_CATEGORIES)
 
             prompt = f"""Придумай одну оригинальную и смешную шутку на русском языке про {selected_category}.
             Шутка должна быть:
@@ -1434,15 +1507,7 @@ class FunService:
                 joke = joke.strip('"\'')
                 return f"😂 <b>Шутка:</b>\n\n{joke}"
             else:
-                # Fallback шутки по категориям
-                fallbacks = {
-                    "программирование и IT": "🤣 Почему программисты путают Хэллоуин и Рождество?\nПотому что Oct 31 = Dec 25!",
-                    "повседневная жизнь": "😄 Почему зонт не идет в школу?\nПотому что он уже раскрыт!",
-                    "животные и природа": "🐘 Почему слон не пользуется компьютером?\nОн боится мышки!",
-                    "еда и кулинария": "🍕 Почему пицца никогда не бывает грустной?\nПотому что у нее много друзей сверху!",
-                    "спорт и здоровье": "⚽ Почему футболисты всегда носят шорты?\nПотому что в длинных штанах не забьешь гол!",
-                }
-                return f"😂 <b>Шутка:</b>\n\n{random.choice(list(fallbacks.values()))}"
+                return f"😂 <b>Шутка:</b>\n\n{random.choice(self.JOKE_FALLBACKS)}"
 
         except Exception as e:
             log_error(f"Ошибка генерации шутки: {str(e)}")